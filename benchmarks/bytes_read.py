@@ -0,0 +1,153 @@
+"""
+Bytes read per event by each processor
+
+Compares the default lazy NanoEvents reads (one request per accessed branch)
+against a bulk read of the branch whitelist declared by each processor ('columns'
+attribute), and lists the branches a processor accessed without declaring them.
+
+usage:
+    python -m benchmarks.bytes_read --file <NanoAOD MC file> --nevents 50000
+"""
+import time
+import uproot
+import argparse
+from coffea.nanoevents import NanoEventsFactory, NanoAODSchema
+from wprime_plus_b.utils.reader import load_events
+from wprime_plus_b.processors.ttbar_analysis import TtbarAnalysis
+from wprime_plus_b.processors.qcd_analysis import QcdAnalysis
+from wprime_plus_b.processors.ztoll_processor import ZToLLProcessor
+from wprime_plus_b.processors.trigger_efficiency_processor import (
+    TriggerEfficiencyProcessor,
+)
+from wprime_plus_b.processors.btag_efficiency_processor import (
+    BTagEfficiencyProcessor,
+)
+
+
+def get_processors(year: str, yearmod: str) -> dict:
+    return {
+        "ttbar": TtbarAnalysis(
+            channel="all",
+            lepton_flavor="all",
+            year=year,
+            yearmod=yearmod,
+            output_type="hist",
+        ),
+        "qcd": QcdAnalysis(
+            channel="all", lepton_flavor="ele", year=year, yearmod=yearmod
+        ),
+        "ztoll": ZToLLProcessor(
+            year=year, yearmod=yearmod, lepton_flavor="ele", output_type="hist"
+        ),
+        "trigger_eff": TriggerEfficiencyProcessor(
+            year=year, yearmod=yearmod, lepton_flavor="ele"
+        ),
+        "btag_eff": BTagEfficiencyProcessor(year=year, yearmod=yearmod),
+    }
+
+
+def run_lazy(processor_instance, fname: str, nevents: int) -> dict:
+    """run the processor over lazily read events and return the read statistics"""
+    access_log = []
+    with uproot.open(fname) as file:
+        events = NanoEventsFactory.from_root(
+            file,
+            entry_stop=nevents,
+            schemaclass=NanoAODSchema,
+            metadata={"dataset": "benchmark"},
+            access_log=access_log,
+        ).events()
+        t0 = time.perf_counter()
+        processor_instance.process(events)
+        elapsed = time.perf_counter() - t0
+        return {
+            "nevents": len(events),
+            "bytesread": file.file.source.num_requested_bytes,
+            "requests": file.file.source.num_requests,
+            "columns": set(access_log),
+            "time": elapsed,
+        }
+
+
+def run_whitelist(processor_instance, fname: str, nevents: int) -> dict:
+    """run the processor over a bulk read of its whitelist and return the read statistics"""
+    t0 = time.perf_counter()
+    events, metadata = load_events(
+        fname,
+        processor_instance.columns,
+        dataset="benchmark",
+        entry_stop=nevents,
+    )
+    processor_instance.process(events)
+    elapsed = time.perf_counter() - t0
+    return {
+        "nevents": metadata["entries"],
+        "bytesread": metadata["bytesread"],
+        "requests": metadata["requests"],
+        "columns": set(metadata["columns"]),
+        "time": elapsed,
+    }
+
+
+def main(args):
+    processors = get_processors(args.year, args.yearmod)
+    names = args.processors.split(",") if args.processors else list(processors)
+    print(f"{args.nevents} events")
+    print(
+        f"{'processor':<12} {'read':<10} {'bytes/event':>12} {'requests':>9} "
+        f"{'branches':>9} {'time [s]':>9}"
+    )
+    for name in names:
+        lazy = run_lazy(processors[name], args.file, args.nevents)
+        whitelist = run_whitelist(processors[name], args.file, args.nevents)
+        for read, stats in [("lazy", lazy), ("whitelist", whitelist)]:
+            print(
+                f"{name:<12} {read:<10} "
+                f"{stats['bytesread'] / max(stats['nevents'], 1):12.1f} "
+                f"{stats['requests']:9d} {len(stats['columns']):9d} {stats['time']:9.3f}"
+            )
+        # branches accessed by the lazy run that the processor does not declare
+        undeclared = sorted(lazy["columns"] - set(processors[name].columns))
+        if undeclared:
+            print(f"{name}: accessed but not declared: {', '.join(undeclared)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--file",
+        dest="file",
+        type=str,
+        required=True,
+        help="NanoAOD MC file",
+    )
+    parser.add_argument(
+        "--nevents",
+        dest="nevents",
+        type=int,
+        default=50000,
+        help="number of events (default 50000)",
+    )
+    parser.add_argument(
+        "--processors",
+        dest="processors",
+        type=str,
+        default="",
+        help="comma separated processors {ttbar, qcd, ztoll, trigger_eff, btag_eff} (default all)",
+    )
+    parser.add_argument(
+        "--year",
+        dest="year",
+        type=str,
+        default="2017",
+        help="year of the data {2016, 2017, 2018} (default 2017)",
+    )
+    parser.add_argument(
+        "--yearmod",
+        dest="yearmod",
+        type=str,
+        default="",
+        help="year modifier {'', 'APV'} (default '')",
+    )
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,163 @@
+"""
+Delta R cross-cleaning and matching throughput
+
+Compares the 'metric_table' implementations (one delta R per object pair, reduced
+with ak.all/ak.any/ak.sum) against the compiled kernel of
+'wprime_plus_b.processors.utils.delta_r' for the cross-cleaning, trigger matching and
+genjet matching done by the processors, on random collections with Poisson
+multiplicities. Checks that both give the same masks and reports events/s (the first
+kernel call, which includes the compilation, is not timed).
+
+usage:
+    python -m benchmarks.delta_r --nevents 200000
+"""
+import time
+import argparse
+import numpy as np
+import awkward as ak
+from coffea.nanoevents.methods import candidate
+from wprime_plus_b.processors.utils.delta_r import delta_r_match_count
+
+
+def make_objects(nevents: int, multiplicity: float, rng) -> ak.Array:
+    """random candidates with a Poisson number of objects per event"""
+    counts = rng.poisson(multiplicity, nevents)
+    nobjects = counts.sum()
+    return ak.zip(
+        {
+            "pt": ak.unflatten(rng.exponential(40, nobjects).astype(np.float32), counts),
+            "eta": ak.unflatten(rng.uniform(-2.5, 2.5, nobjects).astype(np.float32), counts),
+            "phi": ak.unflatten(rng.uniform(-np.pi, np.pi, nobjects).astype(np.float32), counts),
+            "mass": ak.unflatten(np.zeros(nobjects, dtype=np.float32), counts),
+            "charge": ak.unflatten(np.ones(nobjects, dtype=np.int32), counts),
+        },
+        with_name="PtEtaPhiMCandidate",
+        behavior=candidate.behavior,
+    )
+
+
+def cross_cleaning_metric_table(first, second):
+    return ak.all(first.metric_table(second) > 0.4, axis=-1)
+
+
+def cross_cleaning_kernel(first, second):
+    return delta_r_match_count(first, second, 0.4, inclusive=True) == 0
+
+
+def trigger_match_metric_table(first, second):
+    return ak.sum(first.metric_table(second) < 0.1, axis=2) >= 1
+
+
+def trigger_match_kernel(first, second):
+    return delta_r_match_count(first, second, 0.1) >= 1
+
+
+def genjet_match_metric_table(first, second):
+    return ak.flatten(ak.any(first.metric_table(second) < 0.4, axis=-1))
+
+
+def genjet_match_kernel(first, second):
+    return ak.flatten(delta_r_match_count(first, second, 0.4) > 0)
+
+
+def timeit(func, first, second, repeat: int) -> tuple:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func(first, second)
+        times.append(time.perf_counter() - t0)
+    return result, np.array(times)
+
+
+def main(args):
+    rng = np.random.default_rng(seed=0)
+    jets = make_objects(args.nevents, args.njets, rng)
+    leptons = make_objects(args.nevents, args.nleptons, rng)
+    trigobjs = make_objects(args.nevents, args.ntrigobjs, rng)
+    genjets = make_objects(args.nevents, args.ngenjets, rng)
+    benchmarks = {
+        "jet/lepton cleaning": (
+            cross_cleaning_metric_table,
+            cross_cleaning_kernel,
+            jets,
+            leptons,
+        ),
+        "lepton/TrigObj match": (
+            trigger_match_metric_table,
+            trigger_match_kernel,
+            leptons,
+            trigobjs,
+        ),
+        "jet/GenJet match": (
+            genjet_match_metric_table,
+            genjet_match_kernel,
+            jets,
+            genjets,
+        ),
+    }
+    print(
+        f"{args.nevents} events, <njets> = {args.njets}, <nleptons> = {args.nleptons}, "
+        f"<ntrigobjs> = {args.ntrigobjs}, <ngenjets> = {args.ngenjets}"
+    )
+    for name, (metric_table, kernel, first, second) in benchmarks.items():
+        # compile the kernel for the input types
+        kernel(first[:1], second[:1])
+        expected, metric_table_times = timeit(metric_table, first, second, args.repeat)
+        result, kernel_times = timeit(kernel, first, second, args.repeat)
+        agree = ak.all(ak.flatten(expected, axis=None) == ak.flatten(result, axis=None))
+        for method, times in [("metric_table", metric_table_times), ("kernel", kernel_times)]:
+            print(
+                f"{name:<22} {method:<13} {args.nevents / times.mean():12.3e} events/s"
+            )
+        print(
+            f"{name:<22} speedup {metric_table_times.mean() / kernel_times.mean():.1f}x, "
+            f"same masks: {bool(agree)}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--nevents",
+        dest="nevents",
+        type=int,
+        default=200000,
+        help="number of events (default 200000)",
+    )
+    parser.add_argument(
+        "--njets",
+        dest="njets",
+        type=float,
+        default=6,
+        help="mean number of jets per event (default 6)",
+    )
+    parser.add_argument(
+        "--nleptons",
+        dest="nleptons",
+        type=float,
+        default=1.5,
+        help="mean number of leptons per event (default 1.5)",
+    )
+    parser.add_argument(
+        "--ntrigobjs",
+        dest="ntrigobjs",
+        type=float,
+        default=20,
+        help="mean number of trigger objects per event (default 20)",
+    )
+    parser.add_argument(
+        "--ngenjets",
+        dest="ngenjets",
+        type=float,
+        default=8,
+        help="mean number of generator jets per event (default 8)",
+    )
+    parser.add_argument(
+        "--repeat",
+        dest="repeat",
+        type=int,
+        default=5,
+        help="number of repetitions (default 5)",
+    )
+    args = parser.parse_args()
+    main(args)
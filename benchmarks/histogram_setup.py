@@ -0,0 +1,61 @@
+"""
+Per-chunk histogram setup overhead
+
+Compares deep-copying module-level histogram templates (previous behavior)
+against building empty histograms from the shared axis specs, for the
+ttbar, qcd and ztoll histogram sets.
+
+usage:
+    python -m benchmarks.histogram_setup --repeat 1000
+"""
+import copy
+import time
+import argparse
+import numpy as np
+from wprime_plus_b.processors.utils import histograms
+
+HIST_SPECS = {
+    "ttbar": histograms.ttbar_hist_specs,
+    "qcd": histograms.qcd_hist_specs,
+    "ztoll": histograms.ztoll_hist_specs,
+}
+
+
+def timeit(func, repeat: int) -> np.ndarray:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+    return np.array(times)
+
+
+def main(args):
+    print(f"{args.repeat} repetitions (per-chunk setup time)")
+    for name, hist_specs in HIST_SPECS.items():
+        templates = histograms.build_histograms(hist_specs)
+        results = {
+            "deepcopy": timeit(lambda: copy.deepcopy(templates), args.repeat),
+            "build from specs": timeit(
+                lambda: histograms.build_histograms(hist_specs), args.repeat
+            ),
+        }
+        for method, times in results.items():
+            print(
+                f"{name:<6} {method:<17} {times.mean() * 1e6:10.1f} us +/- {times.std() * 1e6:.1f} us"
+            )
+        ratio = results["deepcopy"].mean() / results["build from specs"].mean()
+        print(f"{name:<6} speedup: {ratio:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--repeat",
+        dest="repeat",
+        type=int,
+        default=1000,
+        help="number of repetitions (default 1000)",
+    )
+    args = parser.parse_args()
+    main(args)
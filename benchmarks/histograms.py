@@ -0,0 +1,145 @@
+"""
+Histogram filling throughput
+
+Fills the ttbar histograms ('wprime_plus_b.processors.utils.histograms.ttbar_hist_specs')
+with random features and several weight variations, as done by 'TtbarAnalysis' for
+each region, with one 'hist.fill' per variation, with a single 'hist.fill' for all
+variations ('fill_variations_hist': features tiled across the variations) and with
+the fixed-axis engine ('fill_variations': bin indices computed once and weights
+scatter-added with np.bincount). Checks that every method gives the same sum of
+weights and variances and reports events/s.
+
+usage:
+    python -m benchmarks.histograms --nevents 200000 --nvariations 20
+"""
+import time
+import argparse
+import numpy as np
+from wprime_plus_b.processors.utils.histograms import (
+    ttbar_hist_specs,
+    build_histograms,
+    fill_variations,
+    fill_variations_hist,
+)
+
+
+def make_features(nevents: int, rng) -> dict:
+    """random values for every axis of the ttbar histograms"""
+    features = {}
+    for axes in ttbar_hist_specs.values():
+        for axis in axes:
+            if axis.name == "variation":
+                continue
+            # cover the axis range and some under/overflow
+            low, high = axis.edges[0], axis.edges[-1]
+            margin = 0.1 * (high - low)
+            features[axis.name] = rng.uniform(low - margin, high + margin, nevents)
+    return features
+
+
+def make_variation_weights(nevents: int, nvariations: int, rng) -> dict:
+    """nominal weights and 'nvariations' up/down variations"""
+    nominal = rng.normal(1, 0.1, nevents)
+    variation_weights = {"nominal": nominal}
+    for i in range(nvariations // 2):
+        variation_weights[f"weight{i}Up"] = nominal * rng.normal(1.05, 0.01, nevents)
+        variation_weights[f"weight{i}Down"] = nominal * rng.normal(0.95, 0.01, nevents)
+    return variation_weights
+
+
+def fill_per_variation(histogram, values: dict, variation_weights: dict) -> None:
+    """one 'hist.fill' call per variation"""
+    for variation, weight in variation_weights.items():
+        histogram.fill(**values, variation=variation, weight=weight)
+
+
+def fill_all(fill_function, features: dict, variation_weights: dict) -> dict:
+    """fill every ttbar histogram with 'fill_function'"""
+    histograms = build_histograms(ttbar_hist_specs)
+    for histogram in histograms.values():
+        fill_function(
+            histogram=histogram,
+            values={
+                name: features[name]
+                for name in histogram.axes.name
+                if name != "variation"
+            },
+            variation_weights=variation_weights,
+        )
+    return histograms
+
+
+def timeit(fill_function, features: dict, variation_weights: dict, repeat: int) -> tuple:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        histograms = fill_all(fill_function, features, variation_weights)
+        times.append(time.perf_counter() - t0)
+    return histograms, np.array(times)
+
+
+def same_histograms(first: dict, second: dict) -> bool:
+    """check that two sets of histograms have the same contents for every variation"""
+    for name, histogram in first.items():
+        other = second[name]
+        for variation in histogram.axes["variation"]:
+            a = histogram[{"variation": variation}].view(flow=True)
+            b = other[{"variation": variation}].view(flow=True)
+            if not (
+                np.allclose(a.value, b.value) and np.allclose(a.variance, b.variance)
+            ):
+                return False
+    return True
+
+
+def main(args):
+    rng = np.random.default_rng(seed=0)
+    features = make_features(args.nevents, rng)
+    variation_weights = make_variation_weights(args.nevents, args.nvariations, rng)
+    print(
+        f"{args.nevents} events, {len(variation_weights)} variations, "
+        f"{len(ttbar_hist_specs)} histograms"
+    )
+    methods = {
+        "per variation": fill_per_variation,
+        "hist.fill": fill_variations_hist,
+        "engine": fill_variations,
+    }
+    results = {
+        method: timeit(fill_function, features, variation_weights, args.repeat)
+        for method, fill_function in methods.items()
+    }
+    expected, reference_times = results["per variation"]
+    for method, (histograms, times) in results.items():
+        print(
+            f"{method:<14} {args.nevents / times.mean():12.3e} events/s, "
+            f"speedup {reference_times.mean() / times.mean():5.1f}x, "
+            f"same histograms: {same_histograms(expected, histograms)}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--nevents",
+        dest="nevents",
+        type=int,
+        default=200000,
+        help="number of events (default 200000)",
+    )
+    parser.add_argument(
+        "--nvariations",
+        dest="nvariations",
+        type=int,
+        default=20,
+        help="number of weight variations besides the nominal (default 20)",
+    )
+    parser.add_argument(
+        "--repeat",
+        dest="repeat",
+        type=int,
+        default=5,
+        help="number of repetitions (default 5)",
+    )
+    args = parser.parse_args()
+    main(args)
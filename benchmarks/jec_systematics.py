@@ -0,0 +1,149 @@
+"""
+Per-chunk cost of the JEC/JER systematic shifts
+
+Compares building the corrected jets once per systematic shift (previous behavior)
+against building them once per chunk and taking every shift from the same result,
+and times a full TtbarAnalysis chunk with '--syst nominal' and '--syst full'.
+
+usage:
+    python -m benchmarks.jec_systematics --file <NanoAOD MC file> --nevents 50000
+"""
+import time
+import argparse
+import numpy as np
+import awkward as ak
+from coffea.nanoevents import NanoEventsFactory, NanoAODSchema
+from wprime_plus_b.corrections.jec import jet_corrections, jet_met_shift
+from wprime_plus_b.processors.ttbar_analysis import TtbarAnalysis
+
+SYST_VARIATIONS = [
+    "nominal",
+    "JESUp",
+    "JESDown",
+    "JERUp",
+    "JERDown",
+    "UEUp",
+    "UEDown",
+]
+
+
+def load_events(fname: str, nevents: int):
+    return NanoEventsFactory.from_root(
+        fname,
+        entry_stop=nevents,
+        schemaclass=NanoAODSchema,
+        metadata={"dataset": "benchmark"},
+    ).events()
+
+
+def materialize(jets: ak.Array, met: ak.Array) -> None:
+    ak.to_numpy(ak.flatten(jets.pt))
+    ak.to_numpy(met.pt)
+
+
+def build_per_variation(events, year: str) -> None:
+    """previous behavior: one CorrectedJetsFactory.build per systematic shift"""
+    for syst_var in SYST_VARIATIONS:
+        corrected_jets, corrected_met = jet_corrections(events, year)
+        materialize(*jet_met_shift(corrected_jets, corrected_met, syst_var))
+
+
+def build_once(events, year: str) -> None:
+    """current behavior: one CorrectedJetsFactory.build per chunk"""
+    corrected_jets, corrected_met = jet_corrections(events, year)
+    for syst_var in SYST_VARIATIONS:
+        materialize(*jet_met_shift(corrected_jets, corrected_met, syst_var))
+
+
+def timeit(func, args, repeat: int) -> np.ndarray:
+    times = []
+    for _ in range(repeat):
+        events = load_events(args.file, args.nevents)
+        t0 = time.perf_counter()
+        func(events)
+        times.append(time.perf_counter() - t0)
+    return np.array(times)
+
+
+def main(args):
+    year = args.year + args.yearmod
+    results = {
+        "jec build per variation": timeit(
+            lambda events: build_per_variation(events, year), args, args.repeat
+        ),
+        "jec build once": timeit(
+            lambda events: build_once(events, year), args, args.repeat
+        ),
+    }
+    for syst in ["nominal", "full"]:
+        processor_instance = TtbarAnalysis(
+            channel=args.channel,
+            lepton_flavor=args.lepton_flavor,
+            year=args.year,
+            yearmod=args.yearmod,
+            syst=syst,
+            output_type="hist",
+        )
+        results[f"ttbar chunk ({syst})"] = timeit(
+            processor_instance.process, args, args.repeat
+        )
+    print(f"{args.nevents} events per chunk, {args.repeat} repetitions")
+    for name, times in results.items():
+        print(f"{name:<28} {times.mean():8.3f} s +/- {times.std():.3f} s")
+    ratio = results["ttbar chunk (full)"].mean() / results["ttbar chunk (nominal)"].mean()
+    print(f"full/nominal chunk time ratio: {ratio:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--file",
+        dest="file",
+        type=str,
+        required=True,
+        help="NanoAOD MC file",
+    )
+    parser.add_argument(
+        "--nevents",
+        dest="nevents",
+        type=int,
+        default=50000,
+        help="number of events per chunk (default 50000)",
+    )
+    parser.add_argument(
+        "--repeat",
+        dest="repeat",
+        type=int,
+        default=3,
+        help="number of repetitions (default 3)",
+    )
+    parser.add_argument(
+        "--year",
+        dest="year",
+        type=str,
+        default="2017",
+        help="year of the data {2016, 2017, 2018} (default 2017)",
+    )
+    parser.add_argument(
+        "--yearmod",
+        dest="yearmod",
+        type=str,
+        default="",
+        help="year modifier {'', 'APV'} (default '')",
+    )
+    parser.add_argument(
+        "--channel",
+        dest="channel",
+        type=str,
+        default="2b1l",
+        help="ttbar channel {'2b1l', '1b1e1mu', '1b1l'} (default 2b1l)",
+    )
+    parser.add_argument(
+        "--lepton_flavor",
+        dest="lepton_flavor",
+        type=str,
+        default="mu",
+        help="lepton flavor {'ele', 'mu'} (default mu)",
+    )
+    args = parser.parse_args()
+    main(args)
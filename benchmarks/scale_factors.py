@@ -0,0 +1,167 @@
+"""
+Object scale factor evaluation: time and allocations
+
+Compares the previous per-systematic idiom of the correctors (flatten, mask,
+fill_none with an in-limit value, evaluate every object, ak.where back to 1,
+unflatten and ak.prod, once for each of nominal/up/down) against the shared engine of
+'wprime_plus_b.corrections.utils' ('get_object_sfs' + 'prod_per_event'), which only
+evaluates the in-limit objects, writes every systematic into one preallocated array
+and reduces it per event with a segmented product. A synthetic binned correction
+(flow='error', so out-of-limit objects must be masked) with the inputs of the POG
+lepton corrections is used for each corrector, with its typical multiplicity and
+limits. Reports the time and the peak memory allocated (tracemalloc) per call.
+
+usage:
+    python -m benchmarks.scale_factors --nevents 200000
+"""
+import time
+import argparse
+import tracemalloc
+import numpy as np
+import awkward as ak
+import correctionlib.schemav2 as cs
+from wprime_plus_b.corrections.utils import SYST, get_object_sfs, prod_per_event
+
+SYSTEMATICS = ["sf", "sfup", "sfdown"]
+
+# object multiplicity and (pt, |eta|) limits of the correction of each corrector
+CORRECTORS = {
+    "ElectronCorrector": {"multiplicity": 1.2, "pt": (10.0, 500.0), "eta": 2.5},
+    "MuonCorrector": {"multiplicity": 1.2, "pt": (15.0, 200.0), "eta": 2.4},
+    "TauCorrector": {"multiplicity": 0.8, "pt": (20.0, 500.0), "eta": 2.3},
+    "add_pujetid_weight": {"multiplicity": 6.0, "pt": (20.0, 50.0), "eta": 5.0},
+}
+
+
+def make_correction(pt_limits: tuple, eta_limit: float, rng):
+    """binned (syst, eta, pt) correction that fails outside its limits"""
+    eta_edges = list(np.linspace(-eta_limit, eta_limit, 11))
+    pt_edges = list(np.geomspace(*pt_limits, 11))
+    correction = cs.Correction(
+        name="sf",
+        version=1,
+        inputs=[
+            cs.Variable(name="syst", type="string"),
+            cs.Variable(name="eta", type="real"),
+            cs.Variable(name="pt", type="real"),
+        ],
+        output=cs.Variable(name="weight", type="real"),
+        data=cs.Category(
+            nodetype="category",
+            input="syst",
+            content=[
+                cs.CategoryItem(
+                    key=syst,
+                    value=cs.MultiBinning(
+                        nodetype="multibinning",
+                        inputs=["eta", "pt"],
+                        edges=[eta_edges, pt_edges],
+                        content=list(rng.normal(1, 0.05, 100)),
+                        flow="error",
+                    ),
+                )
+                for syst in SYSTEMATICS
+            ],
+        ),
+    )
+    return correction.to_evaluator()
+
+
+def make_objects(nevents: int, multiplicity: float, rng) -> ak.Array:
+    """random objects with a Poisson number of objects per event"""
+    counts = rng.poisson(multiplicity, nevents)
+    nobjects = counts.sum()
+    return ak.zip(
+        {
+            "pt": ak.unflatten(5 + rng.exponential(40, nobjects), counts),
+            "eta": ak.unflatten(rng.uniform(-3, 3, nobjects), counts),
+        }
+    )
+
+
+def previous_event_sfs(correction, objects, pt_limits, eta_limit) -> list:
+    """previous idiom: one masked evaluation over every object per systematic"""
+    o, n = ak.flatten(objects), ak.num(objects)
+    in_mask = (o.pt > pt_limits[0]) & (o.pt < pt_limits[1]) & (np.abs(o.eta) < eta_limit)
+    in_objects = o.mask[in_mask]
+    pt = ak.fill_none(in_objects.pt, pt_limits[0])
+    eta = ak.fill_none(in_objects.eta, 0.0)
+    event_sfs = []
+    for syst in SYSTEMATICS:
+        sf = correction.evaluate(syst, eta, pt)
+        sf = ak.where(in_mask, sf, ak.ones_like(sf))
+        event_sfs.append(ak.fill_none(ak.prod(ak.unflatten(sf, n), axis=1), value=1))
+    return event_sfs
+
+
+def engine_event_sfs(correction, objects, pt_limits, eta_limit) -> np.ndarray:
+    """shared engine: in-limit objects only, all systematics in one array"""
+    o, n = ak.flatten(objects), ak.num(objects)
+    in_mask = (o.pt > pt_limits[0]) & (o.pt < pt_limits[1]) & (np.abs(o.eta) < eta_limit)
+    sfs = get_object_sfs(
+        correction,
+        inputs=[SYST, o.eta, o.pt],
+        systematics=SYSTEMATICS,
+        in_limit_mask=in_mask,
+    )
+    return prod_per_event(sfs, n)
+
+
+def measure(func, repeat: int, *args) -> tuple:
+    """return the result, the mean time and the peak allocated memory of 'func'"""
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func(*args)
+        times.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, np.mean(times), peak
+
+
+def main(args):
+    rng = np.random.default_rng(seed=0)
+    print(f"{args.nevents} events, {len(SYSTEMATICS)} systematics")
+    print(f"{'corrector':<20} {'method':<10} {'time [ms]':>10} {'peak [MB]':>10}")
+    for name, config in CORRECTORS.items():
+        correction = make_correction(config["pt"], config["eta"], rng)
+        objects = make_objects(args.nevents, config["multiplicity"], rng)
+        inputs = (correction, objects, config["pt"], config["eta"])
+        previous, previous_time, previous_peak = measure(
+            previous_event_sfs, args.repeat, *inputs
+        )
+        engine, engine_time, engine_peak = measure(
+            engine_event_sfs, args.repeat, *inputs
+        )
+        for method, elapsed, peak in [
+            ("previous", previous_time, previous_peak),
+            ("engine", engine_time, engine_peak),
+        ]:
+            print(f"{name:<20} {method:<10} {elapsed * 1e3:10.1f} {peak / 1e6:10.1f}")
+        agree = all(
+            np.allclose(ak.to_numpy(previous[i]), engine[i])
+            for i in range(len(SYSTEMATICS))
+        )
+        print(f"{name:<20} same scale factors: {agree}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--nevents",
+        dest="nevents",
+        type=int,
+        default=200000,
+        help="number of events (default 200000)",
+    )
+    parser.add_argument(
+        "--repeat",
+        dest="repeat",
+        type=int,
+        default=5,
+        help="number of repetitions (default 5)",
+    )
+    args = parser.parse_args()
+    main(args)
@@ -23,5 +23,6 @@ setuptools.setup(
         "coffea>=0.7.2",
         "correctionlib>=2.0.0rc6",
         "awkward",
+        "numba",
     ],
 )
\ No newline at end of file
@@ -4,15 +4,22 @@ import dask
 import pickle
 import argparse
 import datetime
+import tempfile
 import numpy as np
 import wprime_plus_b.utils
 from pathlib import Path
 from coffea import processor
-from utils import get_filesets
+from utils import (
+    get_filesets,
+    get_skim_metadata,
+    write_skim_fileset,
+    manage_processor_args,
+)
 from dask.distributed import Client
 from humanfriendly import format_timespan
 from distributed.diagnostics.plugin import UploadDirectory
 from wprime_plus_b.utils import paths
+from wprime_plus_b.utils.chunking import adaptive_chunksize
 from wprime_plus_b.processors.trigger_efficiency_processor import (
     TriggerEfficiencyProcessor,
 )
@@ -20,6 +27,8 @@ from wprime_plus_b.processors.btag_efficiency_processor import BTagEfficiencyPro
 from wprime_plus_b.processors.ttbar_analysis import TtbarAnalysis
 from wprime_plus_b.processors.ztoll_processor import ZToLLProcessor
 from wprime_plus_b.processors.qcd_analysis import QcdAnalysis
+from wprime_plus_b.processors.skim_processor import SkimProcessor
+from wprime_plus_b.processors.multi_analysis_processor import MultiAnalysisProcessor
 from wprime_plus_b.selections.ttbar.config import (
     ttbar_electron_selection,
     ttbar_muon_selection,
@@ -39,16 +48,82 @@ from wprime_plus_b.selections.qcd.config import (
 )
 
 
-def main(args):
-    args = vars(args)
-    # define processors and executors
-    processors = {
-        "ttbar": TtbarAnalysis,
-        "ztoll": ZToLLProcessor,
-        "qcd": QcdAnalysis,
-        "btag_eff": BTagEfficiencyProcessor,
-        "trigger_eff": TriggerEfficiencyProcessor,
+def get_region_metadata(output_metadata: dict) -> dict:
+    """return the final number of events, cutflow and weight statistics of a region"""
+    metadata = {}
+    # save raw and weighted number of events after selection
+    if "raw_final_nevents" in output_metadata:
+        metadata.update(
+            {"raw_final_nevents": float(output_metadata["raw_final_nevents"])}
+        )
+        metadata.update(
+            {"weighted_final_nevents": float(output_metadata["weighted_final_nevents"])}
+        )
+    else:
+        metadata.update(
+            {"raw_final_nevents": 0.}
+        )
+        metadata.update(
+            {"weighted_final_nevents": 0.}
+        )
+    # save cutflow to metadata
+    for cut_selection, nevents in output_metadata["cutflow"].items():
+        output_metadata["cutflow"][cut_selection] = str(nevents)
+    metadata.update({"cutflow": output_metadata["cutflow"]})
+    if "cutflow_yields" in output_metadata:
+        # cumulative, N-1 and individual yields of every weight variation
+        metadata.update({"cutflow_yields": output_metadata["cutflow_yields"]})
+
+    for weight, statistics in output_metadata["weight_statistics"].items():
+        output_metadata["weight_statistics"][weight] = str(statistics)
+    metadata.update(
+        {"weight_statistics": output_metadata["weight_statistics"]}
+    )
+    if "weights_nbytes" in output_metadata:
+        metadata.update(
+            {"weights_nbytes": get_weights_nbytes(output_metadata["weights_nbytes"])}
+        )
+    return metadata
+
+
+def get_weights_nbytes(nbytes: list) -> dict:
+    """return the mean and maximum memory footprint of the weights container per chunk"""
+    return {"mean": float(sum(nbytes) / len(nbytes)), "max": int(max(nbytes))}
+
+
+def get_ttbar_selections(channel: str, lepton_flavor: str) -> dict:
+    """return the object selections of a ttbar region"""
+    return {
+        "electron_selection": ttbar_electron_selection[channel][lepton_flavor],
+        "muon_selection": ttbar_muon_selection[channel][lepton_flavor],
+        "jet_selection": ttbar_jet_selection[channel][lepton_flavor],
+        "tau_selection": ttbar_tau_selection[channel][lepton_flavor],
     }
+
+
+# available processors
+processors = {
+    "ttbar": TtbarAnalysis,
+    "ztoll": ZToLLProcessor,
+    "qcd": QcdAnalysis,
+    "btag_eff": BTagEfficiencyProcessor,
+    "trigger_eff": TriggerEfficiencyProcessor,
+    "skim": SkimProcessor,
+    "multi": MultiAnalysisProcessor,
+}
+
+
+def get_processor_kwargs(args: dict, output_location: str) -> dict:
+    """
+    return the keyword arguments of the processor 'args["processor"]'
+
+    Parameters:
+    -----------
+        args:
+            submit arguments
+        output_location:
+            directory of the outputs written by the workers (parquet files or skims)
+    """
     processor_args = [
         "year",
         "yearmod",
@@ -58,6 +133,269 @@ def main(args):
         "syst",
     ]
     processor_kwargs = {k: args[k] for k in processor_args if args[k]}
+    if args["output_type"] == "array":
+        # array outputs are written to parquet by the workers
+        processor_kwargs["output_location"] = f"{output_location}/parquet"
+    if args["processor"] == "skim":
+        # skims are written to local disk by the workers
+        processor_kwargs["output_location"] = f"{output_location}/skims"
+    if args["selection_path"] and args["processor"] == "ttbar":
+        # write the selection bits and nominal weights of every event
+        processor_kwargs["selection_location"] = args["selection_path"]
+    if args["cache_path"] and args["processor"] in ["ttbar", "qcd", "ztoll"]:
+        # keep the corrected objects and event weights on disk for later runs
+        processor_kwargs["cache_location"] = args["cache_path"]
+        processor_kwargs["cache_budget"] = args["cache_budget"]
+    if args["processor"] in ["ttbar", "qcd", "ztoll"]:
+        # dtype of the stored event weights
+        processor_kwargs["weights_dtype"] = args["weights_dtype"]
+    return processor_kwargs
+
+
+def get_analysis_args(args: dict, analysis: str) -> dict:
+    """
+    return the submit arguments of an analysis of the multi-analysis processor, as
+    with '--processor <analysis>'. The disk cache is configured by the wrapper
+    """
+    if analysis not in ["ttbar", "qcd", "ztoll"]:
+        raise ValueError(
+            f"Incorrect analysis '{analysis}'. Available analyses are: ['ttbar', 'qcd', 'ztoll']"
+        )
+    return manage_processor_args({**args, "processor": analysis, "cache_path": ""})
+
+
+def build_processor(args: dict, output_location: str) -> processor.ProcessorABC:
+    """
+    return the processor instance of the submit arguments
+
+    Parameters:
+    -----------
+        args:
+            submit arguments
+        output_location:
+            directory of the outputs written by the workers (parquet files or skims).
+            Each analysis of the multi-analysis processor uses its own subdirectory
+    """
+    if args["processor"] != "multi":
+        return processors[args["processor"]](
+            **get_processor_kwargs(args, output_location)
+        )
+    analyses = {
+        analysis: build_processor(
+            get_analysis_args(args, analysis), f"{output_location}/{analysis}"
+        )
+        for analysis in args["analyses"].split(",")
+    }
+    cache_kwargs = {}
+    if args["cache_path"]:
+        # the disk cache is configured once by the wrapper
+        cache_kwargs = {
+            "cache_location": args["cache_path"],
+            "cache_budget": args["cache_budget"],
+        }
+    return MultiAnalysisProcessor(processors=analyses, **cache_kwargs)
+
+
+def save_output(
+    out: dict,
+    metrics: dict,
+    args: dict,
+    sample: str,
+    fileset: dict,
+    chunksize: int,
+    exec_time: str,
+    name: str,
+) -> None:
+    """
+    save the metadata, the parquet manifest and the output of a processor
+
+    Parameters:
+    -----------
+        out:
+            processor output
+        metrics:
+            job metrics
+        args:
+            submit arguments of the processor
+        sample:
+            sample name
+        fileset:
+            fileset of the job
+        chunksize:
+            chunk size of the job
+        exec_time:
+            formatted walltime of the job
+        name:
+            name of the output files
+    """
+    # get metadata
+    metadata = {"walltime": exec_time}
+    metadata.update({"fileset": fileset[sample]})
+    # save bytes read per event and the number of read branches
+    metadata.update(
+        {
+            "bytesread": int(metrics["bytesread"]),
+            "bytes_per_event": float(metrics["bytesread"])
+            / max(float(metrics["entries"]), 1.0),
+            "ncolumns": len(metrics["columns"]),
+        }
+    )
+    if "metadata" in out[sample]:
+        output_metadata = out[sample]["metadata"]
+        # save number of raw initial events
+        metadata.update({"raw_initial_nevents": float(output_metadata["raw_initial_nevents"])})
+        # save number of weighted initial events
+        if args["processor"] == "qcd":
+            if args["channel"] != "all":
+                metadata.update({"sumw": float(output_metadata[args["channel"]]["sumw"])})
+            else:
+                sumws = {}
+                for r in ["A", "B", "C", "D"]:
+                    sumws[r] = float(output_metadata[r]["sumw"])
+                metadata.update({"sumw": sumws})
+        elif args["processor"] == "ttbar" and "all" in [args["channel"], args["lepton_flavor"]]:
+            # one set of metadata for each region
+            regions = [r for r in output_metadata if r != "raw_initial_nevents"]
+            metadata.update(
+                {"sumw": {r: float(output_metadata[r]["sumw"]) for r in regions}}
+            )
+        else:
+            metadata.update({"sumw": float(output_metadata["sumw"])})
+        if args["input"] == "skim":
+            # add the events and weights removed by the skim (common weights only)
+            skim_metadata = get_skim_metadata(sample, args["year"] + args["yearmod"])
+            metadata["raw_initial_nevents"] = float(skim_metadata["raw_initial_nevents"])
+            if isinstance(metadata["sumw"], dict):
+                metadata["sumw"] = {
+                    r: sumw + skim_metadata["rejected_sumw"]
+                    for r, sumw in metadata["sumw"].items()
+                }
+            else:
+                metadata["sumw"] += skim_metadata["rejected_sumw"]
+        if args["processor"] == "skim":
+            # save the skims fileset, to be used with '--input skim'
+            metadata.update(
+                {
+                    "raw_skimmed_nevents": float(output_metadata["raw_skimmed_nevents"]),
+                    "rejected_sumw": float(output_metadata["rejected_sumw"]),
+                }
+            )
+            write_skim_fileset(
+                sample=sample,
+                year=args["year"] + args["yearmod"],
+                manifest=out[sample]["manifest"],
+                metadata=metadata,
+            )
+        # save qcd metadata
+        if args["processor"] in ["qcd"]:
+            metadata.update({"nevents": {}})
+            region = args["channel"]
+            if region != "all":
+                metadata["nevents"].update({region: {}})
+                metadata["nevents"][region]["raw_final_nevents"] = str(
+                    output_metadata[region]["raw_final_nevents"]
+                )
+                metadata["nevents"][region]["weighted_final_nevents"] = str(
+                    output_metadata[region]["weighted_final_nevents"]
+                )
+            elif region == "all":
+                for r in ["A", "B", "C", "D"]:
+                    metadata["nevents"].update({r: {}})
+                    metadata["nevents"][r]["raw_final_nevents"] = str(
+                        output_metadata[r]["raw_final_nevents"]
+                    )
+                    metadata["nevents"][r]["weighted_final_nevents"] = str(
+                        output_metadata[r]["weighted_final_nevents"]
+                    )
+            metadata.update(
+                {
+                    "weights_nbytes": {
+                        r: get_weights_nbytes(output_metadata[r]["weights_nbytes"])
+                        for r in metadata["nevents"]
+                    }
+                }
+            )
+            # save cutflows (cumulative, N-1 and individual yields)
+            metadata.update(
+                {
+                    "cutflow": {
+                        r: output_metadata[r]["cutflow_yields"]
+                        for r in metadata["nevents"]
+                    }
+                }
+            )
+
+        # save ttbar and ztoll metadata
+        if args["processor"] in ["ttbar", "ztoll"]:
+            if args["processor"] == "ttbar" and "all" in [args["channel"], args["lepton_flavor"]]:
+                metadata.update({"regions": {}})
+                for r in regions:
+                    metadata["regions"][r] = get_region_metadata(output_metadata[r])
+            else:
+                metadata.update(get_region_metadata(output_metadata))
+        # save selectios to metadata
+        if args["processor"] == "ttbar": 
+            if "all" in [args["channel"], args["lepton_flavor"]]:
+                selections = {}
+                for r in regions:
+                    channel, lepton_flavor = r.split("_")
+                    selections[r] = get_ttbar_selections(channel, lepton_flavor)
+            else:
+                selections = get_ttbar_selections(
+                    args["channel"], args["lepton_flavor"]
+                )
+            metadata.update({"selections": selections})
+        elif args["processor"] == "ztoll":
+            selections = {
+                "electron_selection": ztoll_electron_selection,
+                "muon_selection": ztoll_muon_selection,
+                "jet_selection": ztoll_jet_selection,
+            }
+            metadata.update({"selections": selections})
+        elif args["processor"] == "qcd":  
+            region = args["channel"]
+            if region != "all":
+                selections = {
+                    "electron_selection": qcd_electron_selection[region][args["lepton_flavor"]],
+                    "muon_selection": qcd_muon_selection[region][args["lepton_flavor"]],
+                    "jet_selection": qcd_jet_selection[region][args["lepton_flavor"]],
+                    "tau_selection": qcd_tau_selection[region][args["lepton_flavor"]],
+                }
+                metadata.update({"selections": selections})
+            elif region == "all":
+                selections = {}
+                for r in ["A", "B", "C", "D"]:
+                    selections[r] = {
+                        "electron_selection": qcd_electron_selection[r][args["lepton_flavor"]],
+                        "muon_selection": qcd_muon_selection[r][args["lepton_flavor"]],
+                        "jet_selection": qcd_jet_selection[r][args["lepton_flavor"]],
+                        "tau_selection": qcd_tau_selection[r][args["lepton_flavor"]],
+                    }
+                    metadata.update({"selections": selections})
+    if "manifest" in out[sample] and args["processor"] != "skim":
+        metadata.update(
+            {"parquet_nrows": sum(entry["nrows"] for entry in out[sample]["manifest"])}
+        )
+    # save args to metadata
+    args_dict = args.copy()
+    metadata.update(args_dict)
+    # save the chunk size actually used
+    metadata.update({"chunksize": chunksize})
+    del out[sample]["metadata"]
+    # save output data and metadata
+    with open(f"{args['output_path']}/metadata/{name}_metadata.json", "w") as f:
+        f.write(json.dumps(metadata))
+    if "manifest" in out[sample]:
+        # save the list of parquet files and their number of rows
+        with open(f"{args['output_path']}/metadata/{name}_manifest.json", "w") as f:
+            f.write(json.dumps(out[sample]["manifest"]))
+    with open(f"{args['output_path']}/{name}.pkl", "wb") as handle:
+        pickle.dump(out, handle, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def main(args):
+    args = vars(args)
+    # define executors
     executors = {
         "iterative": processor.iterative_executor,
         "futures": processor.futures_executor,
@@ -65,6 +403,8 @@ def main(args):
     }
     executor_args = {
         "schema": processor.NanoAODSchema,
+        # keep the bytes read and the accessed branches of the job
+        "savemetrics": True,
     }
     if args["executor"] == "futures":
         executor_args.update({"workers": args["workers"]})
@@ -81,11 +421,11 @@ def main(args):
         except OSError:
             print("Failed to upload the directory")
         
-    # get .json filesets for sample
+    # get .json filesets for sample (skim filesets are written by the skim processor)
     filesets = get_filesets(
         sample=args["sample"],
         year=args["year"] + args["yearmod"],
-        facility=args["facility"],
+        facility="skim" if args["input"] == "skim" else args["facility"],
     )
     for sample, fileset_path in filesets.items():
         if len(args["nsample"]) != 0:
@@ -100,144 +440,67 @@ def main(args):
             if args["nfiles"] != -1:
                 root_file = root_file[: args["nfiles"]]
                 
-        if sample.startswith("Signal"):
+        if args["input"] == "skim":
+            fileset[sample] = root_file
+        elif sample.startswith("Signal"):
             fileset[sample] = [f"root://eoscms.cern.ch//eos/cms/" + file for file in root_file]
         elif args["facility"] == "coffea-casa":
             fileset[sample] = [f"root://xcache/" + file for file in root_file]
         else:
             fileset[sample] = root_file
             
+        # set chunk size
+        chunksize = args["chunksize"]
+        if args["chunking"] == "adaptive":
+            # the probe runs without disk cache and selection store, and its outputs
+            # (parquet files or skims) are written to a temporary directory
+            probe_args = {**args, "selection_path": "", "cache_path": ""}
+            with tempfile.TemporaryDirectory() as probe_location:
+                chunksize = adaptive_chunksize(
+                    processor_instance=build_processor(probe_args, probe_location),
+                    fname=fileset[sample][0],
+                    dataset=sample,
+                    chunk_time=args["chunk_time"],
+                    chunk_memory=args["chunk_memory"],
+                )
+        print(f"Chunk size: {chunksize}")
+        
         # run processor
         t0 = time.monotonic()
-        out = processor.run_uproot_job(
+        out, metrics = processor.run_uproot_job(
             fileset,
             treename="Events",
-            processor_instance=processors[args["processor"]](**processor_kwargs),
+            processor_instance=build_processor(args, args["output_path"]),
             executor=executors[args["executor"]],
             executor_args=executor_args,
+            chunksize=chunksize,
         )
         exec_time = format_timespan(time.monotonic() - t0)
 
-        # get metadata
-        metadata = {"walltime": exec_time}
-        metadata.update({"fileset": fileset[sample]})
-        if "metadata" in out[sample]:
-            output_metadata = out[sample]["metadata"]
-            # save number of raw initial events
-            metadata.update({"raw_initial_nevents": float(output_metadata["raw_initial_nevents"])})
-            # save number of weighted initial events
-            if args["processor"] == "qcd":
-                if args["channel"] != "all":
-                    metadata.update({"sumw": float(output_metadata[args["channel"]]["sumw"])})
-                else:
-                    sumws = {}
-                    for r in ["A", "B", "C", "D"]:
-                        sumws[r] = float(output_metadata[r]["sumw"])
-                    metadata.update({"sumw": sumws})
-            else:
-                metadata.update({"sumw": float(output_metadata["sumw"])})
-            # save qcd metadata
-            if args["processor"] in ["qcd"]:
-                metadata.update({"nevents": {}})
-                region = args["channel"]
-                if region != "all":
-                    metadata["nevents"].update({region: {}})
-                    metadata["nevents"][region]["raw_final_nevents"] = str(
-                        output_metadata[region]["raw_final_nevents"]
-                    )
-                    metadata["nevents"][region]["weighted_final_nevents"] = str(
-                        output_metadata[region]["weighted_final_nevents"]
-                    )
-                elif region == "all":
-                    for r in ["A", "B", "C", "D"]:
-                        metadata["nevents"].update({r: {}})
-                        metadata["nevents"][r]["raw_final_nevents"] = str(
-                            output_metadata[r]["raw_final_nevents"]
-                        )
-                        metadata["nevents"][r]["weighted_final_nevents"] = str(
-                            output_metadata[r]["weighted_final_nevents"]
-                        )
-                        
-            # save ttbar and ztoll metadata
-            if args["processor"] in ["ttbar", "ztoll"]:
-                # save raw and weighted number of events after selection
-                if "raw_final_nevents" in output_metadata:
-                    metadata.update(
-                        {"raw_final_nevents": float(output_metadata["raw_final_nevents"])}
-                    )
-                    metadata.update(
-                        {"weighted_final_nevents": float(output_metadata["weighted_final_nevents"])}
-                    )
-                else:
-                    metadata.update(
-                        {"raw_final_nevents": 0.}
-                    )
-                    metadata.update(
-                        {"weighted_final_nevents": 0.}
-                    )
-                # save cutflow to metadata
-                for cut_selection, nevents in output_metadata["cutflow"].items():
-                    output_metadata["cutflow"][cut_selection] = str(nevents)
-                metadata.update({"cutflow": output_metadata["cutflow"]})
-
-                for weight, statistics in output_metadata["weight_statistics"].items():
-                    output_metadata["weight_statistics"][weight] = str(statistics)
-                metadata.update(
-                    {"weight_statistics": output_metadata["weight_statistics"]}
+        if args["processor"] == "multi":
+            # one set of outputs for each analysis, as with '--processor <analysis>'
+            for analysis, analysis_output in out[sample].items():
+                save_output(
+                    out={sample: analysis_output},
+                    metrics=metrics,
+                    args=manage_processor_args({**args, "processor": analysis}),
+                    sample=sample,
+                    fileset=fileset,
+                    chunksize=chunksize,
+                    exec_time=exec_time,
+                    name=f"{sample}_{analysis}",
                 )
-            # save selectios to metadata
-            if args["processor"] == "ttbar": 
-                selections = {
-                    "electron_selection": ttbar_electron_selection[args["channel"]][
-                        args["lepton_flavor"]
-                    ],
-                    "muon_selection": ttbar_muon_selection[args["channel"]][
-                        args["lepton_flavor"]
-                    ],
-                    "jet_selection": ttbar_jet_selection[args["channel"]][
-                        args["lepton_flavor"]
-                    ],
-                    "tau_selection": ttbar_tau_selection[args["channel"]][
-                        args["lepton_flavor"]
-                    ]
-                }
-                metadata.update({"selections": selections})
-            elif args["processor"] == "ztoll":
-                selections = {
-                    "electron_selection": ztoll_electron_selection,
-                    "muon_selection": ztoll_muon_selection,
-                    "jet_selection": ztoll_jet_selection,
-                }
-                metadata.update({"selections": selections})
-            elif args["processor"] == "qcd":  
-                region = args["channel"]
-                if region != "all":
-                    selections = {
-                        "electron_selection": qcd_electron_selection[region][args["lepton_flavor"]],
-                        "muon_selection": qcd_muon_selection[region][args["lepton_flavor"]],
-                        "jet_selection": qcd_jet_selection[region][args["lepton_flavor"]],
-                        "tau_selection": qcd_tau_selection[region][args["lepton_flavor"]],
-                    }
-                    metadata.update({"selections": selections})
-                elif region == "all":
-                    selections = {}
-                    for r in ["A", "B", "C", "D"]:
-                        selections[r] = {
-                            "electron_selection": qcd_electron_selection[r][args["lepton_flavor"]],
-                            "muon_selection": qcd_muon_selection[r][args["lepton_flavor"]],
-                            "jet_selection": qcd_jet_selection[r][args["lepton_flavor"]],
-                            "tau_selection": qcd_tau_selection[r][args["lepton_flavor"]],
-                        }
-                        metadata.update({"selections": selections})
-        # save args to metadata
-        args_dict = args.copy()
-        metadata.update(args_dict)
-        del out[sample]["metadata"]
-        # save output data and metadata
-        with open(f"{args['output_path']}/metadata/{sample}_metadata.json", "w") as f:
-            f.write(json.dumps(metadata))
-        with open(f"{args['output_path']}/{sample}.pkl", "wb") as handle:
-            pickle.dump(out, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        else:
+            save_output(
+                out=out,
+                metrics=metrics,
+                args=args,
+                sample=sample,
+                fileset=fileset,
+                chunksize=chunksize,
+                exec_time=exec_time,
+                name=sample,
+            )
 
 
 if __name__ == "__main__":
@@ -248,7 +511,7 @@ if __name__ == "__main__":
         dest="processor",
         type=str,
         default="",
-        help="processor to be used {ttbar, ztoll, qcd, trigger_eff, btag_eff} (default ttbar)",
+        help="processor to be used {ttbar, ztoll, qcd, trigger_eff, btag_eff, skim, multi} (default ttbar)",
     )
     parser.add_argument(
         "--channel",
@@ -318,7 +581,28 @@ if __name__ == "__main__":
         dest="chunksize",
         type=int,
         default=50000,
-        help="number of chunks to process",
+        help="number of events per chunk (default 50000)",
+    )
+    parser.add_argument(
+        "--chunking",
+        dest="chunking",
+        type=str,
+        default="fixed",
+        help="chunking mode {fixed, adaptive}. 'adaptive' sets the chunk size from a probe chunk (default fixed)",
+    )
+    parser.add_argument(
+        "--chunk_time",
+        dest="chunk_time",
+        type=float,
+        default=60,
+        help="target duration of a single chunk in seconds, used with '--chunking adaptive' (default 60)",
+    )
+    parser.add_argument(
+        "--chunk_memory",
+        dest="chunk_memory",
+        type=float,
+        default=1800,
+        help="memory ceiling in MB, used with '--chunking adaptive' (default 1800)",
     )
     parser.add_argument(
         "--output_type",
@@ -348,6 +632,48 @@ if __name__ == "__main__":
         default="",
         help="tag to reference output files directory",
     )
+    parser.add_argument(
+        "--input",
+        dest="input",
+        type=str,
+        default="nanoaod",
+        help="input files {nanoaod, skim}. 'skim' reads the skims written with '--processor skim' (default nanoaod)",
+    )
+    parser.add_argument(
+        "--cache_path",
+        dest="cache_path",
+        type=str,
+        default="",
+        help="directory of the disk cache of corrected objects and event weights (disabled by default)",
+    )
+    parser.add_argument(
+        "--cache_budget",
+        dest="cache_budget",
+        type=float,
+        default=10,
+        help="disk budget of the cache in GB (default 10)",
+    )
+    parser.add_argument(
+        "--selection_path",
+        dest="selection_path",
+        type=str,
+        default="",
+        help="selection store directory of the ttbar processor (disabled by default)",
+    )
+    parser.add_argument(
+        "--weights_dtype",
+        dest="weights_dtype",
+        type=str,
+        default="float64",
+        help="dtype of the stored event weights of the ttbar, qcd and ztoll processors {float64, float32} (default float64)",
+    )
+    parser.add_argument(
+        "--analyses",
+        dest="analyses",
+        type=str,
+        default="ttbar,ztoll",
+        help="comma-separated analyses run by the multi processor {ttbar, qcd, ztoll} (default ttbar,ztoll)",
+    )
     parser.add_argument(
         "--output_path",
         dest="output_path",
@@ -24,14 +24,14 @@ if __name__ == "__main__":
         dest="processor",
         type=str,
         default="",
-        help="processor to be used {ttbar, ztoll, qcd, trigger_eff, btag_eff} (default ttbar)",
+        help="processor to be used {ttbar, ztoll, qcd, trigger_eff, btag_eff, skim} (default ttbar)",
     )
     parser.add_argument(
         "--channel",
         dest="channel",
         type=str,
         default="",
-        help="channel to be processed {'2b1l', '1b1e1mu', '1b1l'}",
+        help="channel to be processed {'2b1l', '1b1e1mu', '1b1l', 'all'}",
     )
     parser.add_argument(
         "--lepton_flavor",
@@ -117,6 +117,13 @@ if __name__ == "__main__":
         default="",
         help="tag to reference output files directory",
     )
+    parser.add_argument(
+        "--input",
+        dest="input",
+        type=str,
+        default="nanoaod",
+        help="input files {nanoaod, skim}. 'skim' reads the skims written with '--processor skim' (default nanoaod)",
+    )
     args = parser.parse_args()
     main(args)
     
\ No newline at end of file
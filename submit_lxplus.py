@@ -3,6 +3,7 @@ import argparse
 import subprocess
 from pathlib import Path
 from wprime_plus_b.utils.load_config import load_dataset_config
+from wprime_plus_b.utils.chunking import condor_flavor_budgets
 from utils import get_command, run_checker, build_filesets, manage_processor_args, build_output_directories
 
 
@@ -99,6 +100,14 @@ def submit_condor(args: dict, cmd:str, flavor: str) -> None:
     subprocess.run(["condor_submit", local_condor])
 
 
+def set_chunk_budget(args: dict, flavor: str) -> dict:
+    """return a copy of args with the adaptive chunking budget of the condor job flavour"""
+    args = args.copy()
+    if args["chunking"] == "adaptive":
+        args.update(condor_flavor_budgets[flavor])
+    return args
+
+
 def main(args):
     args = manage_processor_args(vars(args))
     run_checker(args)
@@ -111,13 +120,15 @@ def main(args):
     dataset_config = load_dataset_config(config_name=args["sample"])
     # run job for each partition
     if dataset_config.nsplit == 1:
-        cmd = get_command(args)
-        submit_condor(args, cmd, flavor="microcentury")
+        flavor = "microcentury"
+        cmd = get_command(set_chunk_budget(args, flavor))
+        submit_condor(args, cmd, flavor=flavor)
     else:
+        flavor = "longlunch"
         for nsplit in range(1, dataset_config.nsplit + 1):
             args["nsample"] = nsplit
-            cmd = get_command(args)
-            submit_condor(args, cmd, flavor="longlunch")
+            cmd = get_command(set_chunk_budget(args, flavor))
+            submit_condor(args, cmd, flavor=flavor)
 
 
 if __name__ == "__main__":
@@ -207,5 +218,19 @@ if __name__ == "__main__":
         default="",
         help="partitions to run (--nsample 1,2,3 will only run partitions 1,2 and 3)",
     )
+    parser.add_argument(
+        "--chunksize",
+        dest="chunksize",
+        type=int,
+        default=50000,
+        help="number of events per chunk (default 50000)",
+    )
+    parser.add_argument(
+        "--chunking",
+        dest="chunking",
+        type=str,
+        default="fixed",
+        help="chunking mode {fixed, adaptive}. 'adaptive' sets the chunk size to fit the condor job flavour budget (default fixed)",
+    )
     args = parser.parse_args()
     main(args)
\ No newline at end of file
@@ -125,12 +125,48 @@ def get_filesets(sample: str, year: str, facility: str) -> dict:
     return filesets
 
 
+def get_skim_fileset_path(year: str) -> Path:
+    """return the directory with the skim filesets of a given year (plus year modifier)"""
+    return Path(f"{Path.cwd()}/wprime_plus_b/fileset/{year}/skim")
+
+
+def write_skim_fileset(sample: str, year: str, manifest: list, metadata: dict) -> None:
+    """
+    write the fileset of the skims of a sample (read by 'get_filesets' with the 'skim'
+    facility) and the skim metadata needed to normalize the analysis of the skims
+
+    Parameters:
+    -----------
+        sample:
+            sample key (including the partition number)
+        year:
+            year of the dataset plus year modifier
+        manifest:
+            list with the path and number of rows of the skim files
+        metadata:
+            skim metadata (number of initial events, sum of weights of the removed events)
+    """
+    fileset_path = get_skim_fileset_path(year)
+    Path(f"{fileset_path}/metadata").mkdir(parents=True, exist_ok=True)
+    with open(f"{fileset_path}/{sample}.json", "w") as json_file:
+        json.dump({sample: [entry["path"] for entry in manifest]}, json_file, indent=4)
+    with open(f"{fileset_path}/metadata/{sample}.json", "w") as json_file:
+        json.dump(metadata, json_file, indent=4)
+
+
+def get_skim_metadata(sample: str, year: str) -> dict:
+    """return the skim metadata of a sample (see 'write_skim_fileset')"""
+    with open(f"{get_skim_fileset_path(year)}/metadata/{sample}.json", "r") as json_file:
+        return json.load(json_file)
+
+
 def manage_processor_args(args: dict) -> dict:
     processor_args_mapping = {
         "ztoll": ["channel", "syst"],
         "qcd": ["syst"],
         "btag_eff": ["lepton_flavor", "channel", "syst"],
         "trigger_eff": ["channel", "syst"],
+        "skim": ["channel", "lepton_flavor", "syst", "output_type"],
     }
     processor = args.get("processor")
     if processor in processor_args_mapping:
@@ -141,7 +177,7 @@ def manage_processor_args(args: dict) -> dict:
 
 def run_checker(args: dict) -> None:
     # check processor
-    available_processors = ["ttbar", "ztoll", "qcd", "btag_eff", "trigger_eff"]
+    available_processors = ["ttbar", "ztoll", "qcd", "btag_eff", "trigger_eff", "skim"]
     if args["processor"] not in available_processors:
         raise ValueError(
             f"Incorrect processor. Available processors are: {available_processors}"
@@ -152,6 +188,12 @@ def run_checker(args: dict) -> None:
         raise ValueError(
             f"Incorrect executor. Available executors are: {available_executors}"
         )
+    # check chunking mode
+    available_chunkings = ["fixed", "adaptive"]
+    if args.get("chunking", "fixed") not in available_chunkings:
+        raise ValueError(
+            f"Incorrect chunking. Available chunking modes are: {available_chunkings}"
+        )
     # check years
     available_years = ["2016", "2017", "2018"]
     if args["year"] not in available_years:
@@ -161,12 +203,20 @@ def run_checker(args: dict) -> None:
         raise ValueError(
             f"Incorrect year modifier. Available year modifiers are: {available_yearmods}"
         )
-    # check output type
+    # check output type (skims are always written as ROOT files)
     available_output_types = ["hist", "array"]
-    if args["output_type"] not in available_output_types:
+    if args["processor"] != "skim" and args["output_type"] not in available_output_types:
         raise ValueError(
             f"Incorrect output_type. Available output_types are: {available_output_types}"
         )
+    # check input (skims keep the branches and the sum of weights of the ttbar analysis)
+    available_inputs = ["nanoaod", "skim"]
+    if args.get("input", "nanoaod") not in available_inputs:
+        raise ValueError(
+            f"Incorrect input. Available inputs are: {available_inputs}"
+        )
+    if args.get("input") == "skim" and args["processor"] != "ttbar":
+        raise ValueError("Skims can only be used as input of the ttbar processor")
     # check sample
     configs_path = f"{Path.cwd()}/wprime_plus_b/configs/dataset/datasets_configs.yaml"
     with open(configs_path, "r") as stream:
@@ -187,19 +237,26 @@ def run_checker(args: dict) -> None:
             )
     if args["processor"] == "ttbar":
         # check channel
-        available_channels = ["2b1l", "1b1e1mu", "1b1l"]
+        available_channels = ["2b1l", "1b1e1mu", "1b1l", "all"]
         if args["channel"] not in available_channels:
             raise ValueError(
                 f"Incorrect channel. Available channels are: {available_channels}"
             )
         # check lepton flavor
-        available_lepton_flavors = ["ele", "mu"]
+        available_lepton_flavors = ["ele", "mu", "all"]
         if args["lepton_flavor"] not in available_lepton_flavors:
             raise ValueError(
                 f"Incorrect lepton flavor. Available lepton flavors are: {available_lepton_flavors}"
             )
-        # check Data sample
-        if args["channel"] == "1b1e1mu":
+        # all regions are run in a single pass with both channel and lepton flavor set to 'all'
+        if (args["channel"] == "all") != (args["lepton_flavor"] == "all"):
+            raise ValueError(
+                "To run all ttbar regions, use 'all' for both channel and lepton flavor"
+            )
+        # check Data sample (with 'all', each data stream only fills the regions of its trigger)
+        if args["channel"] == "all":
+            pass
+        elif args["channel"] == "1b1e1mu":
             if args["lepton_flavor"] == "mu":
                 if args["sample"] == "SingleMuon":
                     raise ValueError(
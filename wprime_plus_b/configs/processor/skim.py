@@ -0,0 +1,7 @@
+from wprime_plus_b.utils.configs.processor import ProcessorConfig
+
+processor_config = ProcessorConfig(
+    name="skim",
+    channel=None,
+    lepton_flavor=None,
+)
\ No newline at end of file
@@ -0,0 +1,7 @@
+from wprime_plus_b.utils.configs.processor import ProcessorConfig
+
+processor_config = ProcessorConfig(
+    name="ttbar",
+    channel="all",
+    lepton_flavor="all",
+)
@@ -0,0 +1,3 @@
+from wprime_plus_b.corrections.payload_handler import CorrectionRegistry
+
+registry = CorrectionRegistry()
@@ -1,12 +1,44 @@
 import json
-import correctionlib
 import numpy as np
 import awkward as ak
 import importlib.resources
 from coffea import util
 from typing import Type
 from coffea.analysis_tools import Weights
-from wprime_plus_b.corrections.utils import get_pog_json
+from wprime_plus_b.corrections import registry
+from wprime_plus_b.corrections.utils import (
+    SYST,
+    add_event_sfs,
+    get_object_sfs,
+    get_systematics,
+    prod_per_event,
+    get_correction_set,
+)
+
+
+def load_btag_efficiency(tagger: str, working_point: str, year: str):
+    """load the btagging efficiency lookup table (once per worker process)"""
+
+    def loader():
+        with importlib.resources.path(
+            "wprime_plus_b.data", f"btag_eff_{tagger}_{working_point}_{year}.coffea"
+        ) as filename:
+            return util.load(str(filename))
+
+    return registry.get(
+        payload=f"btag_eff_{tagger}_{working_point}", year=year, loader=loader
+    )
+
+
+def load_btag_working_points() -> dict:
+    """load the btagging working points (once per worker process)"""
+
+    def loader():
+        with importlib.resources.path("wprime_plus_b.data", "btagWPs.json") as path:
+            with open(path, "r") as handle:
+                return json.load(handle)
+
+    return registry.get(payload="btag_working_points", year="", loader=loader)
 
 
 class BTagCorrector:
@@ -46,6 +78,10 @@ class BTagCorrector:
             systematics are used instead of the 'up/down' ones,
             which are supposed to be correlated/decorrelated
             between the different data years
+
+    The jets are flattened once: efficiencies, b-tagging decisions and scale factors
+    of every flavor are computed on the flat jets, and the per-event weights of each
+    flavor ('bc' or 'light') are obtained with a segmented product over the jets.
     """
 
     def __init__(
@@ -71,27 +107,28 @@ class BTagCorrector:
 
         # load efficiency lookup table (only for deepJet)
         # efflookup(pt, |eta|, flavor)
-        with importlib.resources.path(
-            "wprime_plus_b.data", f"btag_eff_{self._tagger}_{self._wp}_{year}.coffea"
-        ) as filename:
-            self._efflookup = util.load(str(filename))
+        self._efflookup = load_btag_efficiency(self._tagger, self._wp, year)
         # load btagging working point (only for deepJet)
         # https://twiki.cern.ch/twiki/bin/viewauth/CMS/BtagRecommendation
-        with importlib.resources.path("wprime_plus_b.data", "btagWPs.json") as path:
-            with open(path, "r") as handle:
-                btag_working_points = json.load(handle)
-        self._btagwp = btag_working_points[tagger][year + year_mod][worging_point]
+        self._btagwp = load_btag_working_points()[tagger][year + year_mod][worging_point]
 
         # define correction set
-        self._cset = correctionlib.CorrectionSet.from_file(
-            get_pog_json(json_name="btag", year=year + year_mod)
-        )
+        self._cset = get_correction_set(json_name="btag", year=year + year_mod)
 
-        # bc and light jets
+        # flat jets array since correction function works only on flat arrays
+        j, self._n = ak.flatten(jets), ak.num(jets)
+        self._pt = ak.to_numpy(j.pt)
+        self._abs_eta = np.abs(ak.to_numpy(j.eta))
+        self._hadron_flavor = ak.to_numpy(j.hadronFlavour)
         # hadron flavor definition: 5=b, 4=c, 0=udsg
-        self._bc_jets = jets[jets.hadronFlavour > 0]
-        self._light_jets = jets[jets.hadronFlavour == 0]
-        self._jet_map = {"bc": self._bc_jets, "light": self._light_jets}
+        self._flavor_mask = {
+            "bc": self._hadron_flavor > 0,
+            "light": self._hadron_flavor == 0,
+        }
+        # jets that pass the btag working point
+        self._passbtag = ak.to_numpy(j.btagDeepFlavB) > self._btagwp
+        # efficiencies of every jet, computed once for all flavors
+        self._eff = None
 
     def add_btag_weights(self, flavor: str) -> None:
         """
@@ -102,103 +139,67 @@ class BTagCorrector:
             flavor:
                 hadron flavor {'bc', 'light'}
         """
-        # efficiencies
-        eff = self.efficiency(flavor=flavor)
-
-        # mask with events that pass the btag working point
-        passbtag = self.passbtag_mask(flavor=flavor)
-
-        # nominal scale factors
-        jets_sf = self.get_scale_factors(flavor=flavor, syst="central")
-
-        # nominal weights
-        jets_weight = self.get_btag_weight(eff, jets_sf, passbtag)
-
-        if self._variation == "nominal":
-            # systematics
-            syst_up = "up_correlated" if self._full_run else "up"
-            syst_down = "down_correlated" if self._full_run else "down"
-
-            # up and down scale factors
-            jets_sf_up = self.get_scale_factors(flavor=flavor, syst=syst_up)
-            jets_sf_down = self.get_scale_factors(flavor=flavor, syst=syst_down)
-
-            jets_weight_up = self.get_btag_weight(eff, jets_sf_up, passbtag)
-            jets_weight_down = self.get_btag_weight(eff, jets_sf_down, passbtag)
-
-            # add weights to Weights container
-            self._weights.add(
-                name=f"{flavor}_jets",
-                weight=jets_weight,
-                weightUp=jets_weight_up,
-                weightDown=jets_weight_down,
+        # systematics
+        syst_up = "up_correlated" if self._full_run else "up"
+        syst_down = "down_correlated" if self._full_run else "down"
+        systematics = get_systematics(["central", syst_up, syst_down], self._variation)
+
+        # nominal (and 'up' and 'down') scale factors of the jets of this flavor
+        sfs = self.get_sf(flavor=flavor, systematics=systematics)
+
+        # per-jet weight factors, set to 1 for the jets of the other flavors
+        factors = self.get_btag_weight(self.efficiency(), sfs, self._passbtag)
+        factors[:, ~self._flavor_mask[flavor]] = 1.0
+
+        # add weights to Weights container
+        add_event_sfs(self._weights, f"{flavor}_jets", prod_per_event(factors, self._n))
+
+    def efficiency(self) -> np.ndarray:
+        """compute the btagging efficiency of every (flat) jet"""
+        if self._eff is None:
+            self._eff = np.asarray(
+                self._efflookup(self._pt, self._abs_eta, self._hadron_flavor)
             )
-        else:
-            self._weights.add(
-                name=f"{flavor}_jets",
-                weight=jets_weight,
-            )
-
-    def efficiency(self, flavor: str, fill_value=1) -> ak.Array:
-        """compute the btagging efficiency for 'njets' jets"""
-        return self._efflookup(
-            self._jet_map[flavor].pt,
-            np.abs(self._jet_map[flavor].eta),
-            self._jet_map[flavor].hadronFlavour,
-        )
-
-    def passbtag_mask(self, flavor, fill_value=True) -> ak.Array:
-        """return the mask with jets that pass the b-tagging working point"""
-        return self._jet_map[flavor]["btagDeepFlavB"] > self._btagwp
-
-    def get_scale_factors(self, flavor: str, syst="central", fill_value=1) -> ak.Array:
-        """
-        compute jets scale factors
-        """
-        return self.get_sf(flavor=flavor, syst=syst)
+        return self._eff
 
-    def get_sf(self, flavor: str, syst: str = "central") -> ak.Array:
+    def get_sf(self, flavor: str, systematics: list = None) -> np.ndarray:
         """
-        compute the scale factors for bc or light jets
+        compute the scale factors of the bc or light (flat) jets. Jets of the other
+        flavors, or out of the correction limits, get a scale factor of 1
 
         Parameters:
         -----------
             flavor:
                 hadron flavor {'bc', 'light'}
-            syst:
-                Name of the systematic {'central', 'down', 'down_correlated', 'down_uncorrelated', 'up', 'up_correlated'}
+            systematics:
+                Name of the systematics {'central', 'down', 'down_correlated', 'down_uncorrelated', 'up', 'up_correlated'}.
+                Only 'central' if None
+
+        Returns:
+        --------
+            array of shape (len(systematics), number of jets)
         """
         cset_keys = {
             "bc": f"{self._tagger}_{self._sf}",
             "light": f"{self._tagger}_incl",
         }
-        # until correctionlib handles jagged data natively we have to flatten and unflatten
-        j, nj = ak.flatten(self._jet_map[flavor]), ak.num(self._jet_map[flavor])
-
+        if systematics is None:
+            systematics = ["central"]
         # get 'in-limits' jets
-        jet_eta_mask = np.abs(j.eta) < 2.499
-        in_jet_mask = jet_eta_mask
-        in_jets = j.mask[in_jet_mask]
-
-        # get jet transverse momentum, abs pseudorapidity and hadron flavour (replace None values with some 'in-limit' value)
-        jets_pt = ak.fill_none(in_jets.pt, 0.0)
-        jets_eta = ak.fill_none(np.abs(in_jets.eta), 0.0)
-        jets_hadron_flavour = ak.fill_none(in_jets.hadronFlavour, 5)
-
-        sf = self._cset[cset_keys[flavor]].evaluate(
-            syst,
-            self._wp,
-            np.array(jets_hadron_flavour),
-            np.array(jets_eta),
-            np.array(jets_pt),
+        in_jet_mask = self._flavor_mask[flavor] & (self._abs_eta < 2.499)
+        return get_object_sfs(
+            self._cset[cset_keys[flavor]],
+            inputs=[SYST, self._wp, self._hadron_flavor, self._abs_eta, self._pt],
+            systematics=systematics,
+            in_limit_mask=in_jet_mask,
         )
-        sf = ak.where(in_jet_mask, sf, ak.ones_like(sf))
-        return ak.unflatten(sf, nj)
 
     @staticmethod
-    def get_btag_weight(eff: ak.Array, sf: ak.Array, passbtag: ak.Array) -> ak.Array:
+    def get_btag_weight(
+        eff: np.ndarray, sf: np.ndarray, passbtag: np.ndarray
+    ) -> np.ndarray:
         """
-        compute b-tagging weights
+        compute the b-tagging weight factor of each jet
 
         see: https://twiki.cern.ch/twiki/bin/viewauth/CMS/BTagSFMethods
 
@@ -207,14 +208,11 @@ class BTagCorrector:
             eff:
                 btagging efficiencies
             sf:
-                jets scale factors
+                jets scale factors, of shape (number of systematics, number of jets)
             passbtag:
                 mask with jets that pass the b-tagging working point
         """
         # tagged SF = SF * eff / eff = SF
-        tagged_sf = ak.prod(sf.mask[passbtag], axis=-1)
-
         # untagged SF = (1 - SF * eff) / (1 - eff)
-        untagged_sf = ak.prod(((1 - sf * eff) / (1 - eff)).mask[~passbtag], axis=-1)
-
-        return ak.fill_none(tagged_sf * untagged_sf, 1.0)
\ No newline at end of file
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(passbtag, sf, (1 - sf * eff) / (1 - eff))
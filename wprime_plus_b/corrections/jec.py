@@ -5,6 +5,20 @@ import awkward as ak
 import importlib.resources
 from typing import Tuple
 from coffea.nanoevents.methods.base import NanoEventsArray
+from wprime_plus_b.corrections import registry
+
+
+def load_jec_factories() -> dict:
+    """load jet and MET factories from 'mc_jec_compiled.pkl.gz' (once per worker process)"""
+
+    def loader():
+        with importlib.resources.path(
+            "wprime_plus_b.data", "mc_jec_compiled.pkl.gz"
+        ) as path:
+            with gzip.open(path) as fin:
+                return cloudpickle.load(fin)
+
+    return registry.get(payload="mc_jec_compiled", year="", loader=loader)
 
 
 # Recomendations https://twiki.cern.ch/twiki/bin/viewauth/CMS/JECDataMC#Recommended_for_MC
@@ -27,11 +41,7 @@ def jet_corrections(events: NanoEventsArray, year: str) -> Tuple[ak.Array, ak.Ar
         corrected jets and MET
     """
     # load jet and MET factories with JEC/JER corrections
-    with importlib.resources.path(
-        "wprime_plus_b.data", "mc_jec_compiled.pkl.gz"
-    ) as path:
-        with gzip.open(path) as fin:
-            factories = cloudpickle.load(fin)
+    factories = load_jec_factories()
 
     def add_jec_variables(jets: ak.Array, event_rho: ak.Array):
         """add some variables to the jet collection"""
@@ -52,4 +62,45 @@ def jet_corrections(events: NanoEventsArray, year: str) -> Tuple[ak.Array, ak.Ar
     # get corrected MET
     corrected_met = factories["met_factory"].build(events.MET, corrected_jets, {})
 
-    return corrected_jets, corrected_met
\ No newline at end of file
+    return corrected_jets, corrected_met
+
+
+def jet_met_shift(
+    corrected_jets: ak.Array, corrected_met: ak.Array, variation: str = "nominal"
+) -> Tuple[ak.Array, ak.Array]:
+    """
+    Return the jets and MET for a systematic shift of the JEC/JER corrected collections
+
+    The shifts are lazy views of the collections returned by 'jet_corrections', so the
+    corrected jets and MET only need to be built once per chunk. The returned MET is a
+    new array, so its fields can be overwritten without modifying 'corrected_met'.
+
+    Parameters:
+    -----------
+        corrected_jets:
+            JEC/JER corrected jets (or the NanoAOD jets in data)
+        corrected_met:
+            corrected MET (or the NanoAOD MET in data)
+        variation:
+            systematic shift {'nominal', 'JESUp', 'JESDown', 'JERUp', 'JERDown', 'UEUp', 'UEDown'}
+
+    Returns:
+    --------
+        shifted jets and MET
+    """
+    jets, met = corrected_jets, corrected_met
+    # jet JEC/JER shift
+    if variation == "JESUp":
+        jets = corrected_jets.JES_Total.up
+    elif variation == "JESDown":
+        jets = corrected_jets.JES_Total.down
+    elif variation == "JERUp":
+        jets = corrected_jets.JER.up
+    elif variation == "JERDown":
+        jets = corrected_jets.JER.down
+    # MET UnclusteredEnergy shift
+    elif variation == "UEUp":
+        met = corrected_met.MET_UnclusteredEnergy.up
+    elif variation == "UEDown":
+        met = corrected_met.MET_UnclusteredEnergy.down
+    return jets, ak.Array(met.layout, behavior=met.behavior)
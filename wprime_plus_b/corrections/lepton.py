@@ -6,9 +6,30 @@ import awkward as ak
 import importlib.resources
 from typing import Type
 from pathlib import Path
-from .utils import unflat_sf
 from coffea.analysis_tools import Weights
-from wprime_plus_b.corrections.utils import pog_years, get_pog_json
+from wprime_plus_b.corrections import registry
+from wprime_plus_b.corrections.utils import (
+    SYST,
+    pog_years,
+    add_event_sfs,
+    get_object_sfs,
+    get_systematics,
+    prod_per_event,
+    get_correction_set,
+    get_correction_payload,
+)
+
+
+def load_electron_trigger_correction(year: str) -> correctionlib.CorrectionSet:
+    """load the electron trigger correction set (once per worker process)"""
+
+    def loader():
+        with importlib.resources.path(
+            "wprime_plus_b.data", f"correction_electron_trigger_{year}.json.gz"
+        ) as path:
+            return correctionlib.CorrectionSet.from_file(str(path))
+
+    return registry.get(payload="electron_trigger", year=year, loader=loader)
 
 
 # ----------------------------------
@@ -62,13 +83,15 @@ class ElectronCorrector:
         self.weights = weights
 
         # define correction set
-        self.cset = correctionlib.CorrectionSet.from_file(
-            get_pog_json(json_name="electron", year=year + year_mod)
-        )
+        self.cset = get_correction_set(json_name="electron", year=year + year_mod)
         self.year = year
         self.year_mod = year_mod  # 2018
         self.pog_year = pog_years[year + year_mod]
 
+    def payload(self, name: str) -> dict:
+        """JSON definition of the electron correction 'name' (see 'get_object_sfs')"""
+        return get_correction_payload("electron", self.year + self.year_mod, name)
+
     def add_trigger_weight(self, trigger_mask, trigger_match_mask):
         """
         add electron Trigger weights 
@@ -85,25 +108,16 @@ class ElectronCorrector:
         trigger_match_mask = ak.flatten(trigger_match_mask)
         
         in_electron_mask = electron_pt_mask & electron_eta_mask & trigger_mask & trigger_match_mask
-        in_electrons = self.e.mask[in_electron_mask]
-        
-        # get electrons transverse momentum and pseudorapidity (replace None values with some 'in-limit' value)
-        electron_pt = ak.fill_none(in_electrons.pt, 10.0)
-        electron_eta = ak.fill_none(in_electrons.eta, 0.0)
 
-        # get eletron trigger correction
-        cset = correctionlib.CorrectionSet.from_file(
-            f"wprime_plus_b/data/correction_electron_trigger_{self.year + self.year_mod}.json.gz"
-        )
-        nominal_sf = unflat_sf(
-            cset["trigger_eff"].evaluate(electron_pt, electron_eta),
-            in_electron_mask,
-            self.n,
-        )
-        self.weights.add(
-            name=f"ele_trigger",
-            weight=nominal_sf,
+        # get eletron trigger correction (only for 'in-limits' electrons)
+        cset = load_electron_trigger_correction(self.year + self.year_mod)
+        sfs = get_object_sfs(
+            cset["trigger_eff"],
+            inputs=[self.e.pt, self.e.eta],
+            systematics=[None],
+            in_limit_mask=in_electron_mask,
         )
+        add_event_sfs(self.weights, "ele_trigger", prod_per_event(sfs, self.n))
 
     def add_id_weight(self, id_working_point: str) -> None:
         """
@@ -131,51 +145,20 @@ class ElectronCorrector:
         )  # potential problems with pt > 500 GeV
         electron_id_mask = id_wps[id_working_point]
         in_electron_mask = electron_pt_mask & electron_id_mask
-        in_electrons = self.e.mask[in_electron_mask]
-        
-        # get electrons transverse momentum and pseudorapidity (replace None values with some 'in-limit' value)
-        electron_pt = ak.fill_none(in_electrons.pt, 10.0)
-        electron_eta = ak.fill_none(in_electrons.eta, 0.0)
-        
+
         # remove '_UL' from year
         year = self.pog_year.replace("_UL", "")
-        
-        # get nominal scale factors
-        nominal_sf = unflat_sf(
-            self.cset["UL-Electron-ID-SF"].evaluate(
-                year, "sf", id_working_point, electron_eta, electron_pt
-            ),
-            in_electron_mask,
-            self.n,
+
+        # get nominal (and 'up' and 'down') scale factors
+        sfs = get_object_sfs(
+            self.cset["UL-Electron-ID-SF"],
+            inputs=[year, SYST, id_working_point, self.e.eta, self.e.pt],
+            systematics=get_systematics(["sf", "sfup", "sfdown"], self.variation),
+            in_limit_mask=in_electron_mask,
+            payload=self.payload("UL-Electron-ID-SF"),
         )
-        if self.variation == "nominal":
-            # get 'up' and 'down' scale factors
-            up_sf = unflat_sf(
-                self.cset["UL-Electron-ID-SF"].evaluate(
-                    year, "sfup", id_working_point, electron_eta, electron_pt
-                ),
-                in_electron_mask,
-                self.n,
-            )
-            down_sf = unflat_sf(
-                self.cset["UL-Electron-ID-SF"].evaluate(
-                    year, "sfdown", id_working_point, electron_eta, electron_pt
-                ),
-                in_electron_mask,
-                self.n,
-            )
-            # add scale factors to weights container
-            self.weights.add(
-                name=f"electron_id",
-                weight=nominal_sf,
-                weightUp=up_sf,
-                weightDown=down_sf,
-            )
-        else:
-            self.weights.add(
-                name=f"electron_id",
-                weight=nominal_sf,
-            )
+        # add scale factors to weights container
+        add_event_sfs(self.weights, "electron_id", prod_per_event(sfs, self.n))
 
     def add_reco_weight(self) -> None:
         """add electron reconstruction scale factors to weights container"""
@@ -184,51 +167,20 @@ class ElectronCorrector:
             self.e.pt < 499.999
         )  # potential problems with pt > 500 GeV
         in_electron_mask = electron_pt_mask
-        in_electrons = self.e.mask[in_electron_mask]
-        
-        # get electrons transverse momentum and pseudorapidity (replace None values with some 'in-limit' value)
-        electron_pt = ak.fill_none(in_electrons.pt, 20.1)
-        electron_eta = ak.fill_none(in_electrons.eta, 0.0)
-        
+
         # remove _UL from year
         year = self.pog_year.replace("_UL", "")
-        
-        # get nominal scale factors
-        nominal_sf = unflat_sf(
-            self.cset["UL-Electron-ID-SF"].evaluate(
-                year, "sf", "RecoAbove20", electron_eta, electron_pt
-            ),
-            in_electron_mask,
-            self.n,
+
+        # get nominal (and 'up' and 'down') scale factors
+        sfs = get_object_sfs(
+            self.cset["UL-Electron-ID-SF"],
+            inputs=[year, SYST, "RecoAbove20", self.e.eta, self.e.pt],
+            systematics=get_systematics(["sf", "sfup", "sfdown"], self.variation),
+            in_limit_mask=in_electron_mask,
+            payload=self.payload("UL-Electron-ID-SF"),
         )
-        if self.variation == "nominal":
-            # get 'up' and 'down' scale factors
-            up_sf = unflat_sf(
-                self.cset["UL-Electron-ID-SF"].evaluate(
-                    year, "sfup", "RecoAbove20", electron_eta, electron_pt
-                ),
-                in_electron_mask,
-                self.n,
-            )
-            down_sf = unflat_sf(
-                self.cset["UL-Electron-ID-SF"].evaluate(
-                    year, "sfdown", "RecoAbove20", electron_eta, electron_pt
-                ),
-                in_electron_mask,
-                self.n,
-            )
-            # add scale factors to weights container
-            self.weights.add(
-                name=f"electron_reco",
-                weight=nominal_sf,
-                weightUp=up_sf,
-                weightDown=down_sf,
-            )
-        else:
-            self.weights.add(
-                name=f"electron_reco",
-                weight=nominal_sf,
-            )
+        # add scale factors to weights container
+        add_event_sfs(self.weights, "electron_reco", prod_per_event(sfs, self.n))
 
 
 # Muon
@@ -322,13 +274,15 @@ class MuonCorrector:
         self.weights = weights
         
         # define correction set
-        self.cset = correctionlib.CorrectionSet.from_file(
-            get_pog_json(json_name="muon", year=year + year_mod)
-        )
+        self.cset = get_correction_set(json_name="muon", year=year + year_mod)
         self.year = year
         self.year_mod = year_mod
         self.pog_year = pog_years[year + year_mod]
 
+    def payload(self, name: str) -> dict:
+        """JSON definition of the muon correction 'name' (see 'get_object_sfs')"""
+        return get_correction_payload("muon", self.year + self.year_mod, name)
+
     def add_id_weight(self):
         """
         add muon ID scale factors to weights container
@@ -338,11 +292,6 @@ class MuonCorrector:
         muon_eta_mask = np.abs(self.m.eta) < 2.39
         muon_id_mask = get_id_wps(self.m)[self.id_wp]
         in_muon_mask = muon_pt_mask & muon_eta_mask & muon_id_mask
-        in_muons = self.m.mask[in_muon_mask]
-
-        # get muons pT and abseta (replace None values with some 'in-limit' value)
-        muon_pt = ak.fill_none(in_muons.pt, 15.0)
-        muon_eta = np.abs(ak.fill_none(in_muons.eta, 0.0))
 
         # 'id' scale factors names
         id_corrections = {
@@ -356,42 +305,16 @@ class MuonCorrector:
             "2018": {},
         }
 
-        # get nominal scale factors
-        nominal_sf = unflat_sf(
-            self.cset[id_corrections[self.year + self.year_mod][self.id_wp]].evaluate(
-                self.pog_year, muon_eta, muon_pt, "sf"
-            ),
-            in_muon_mask,
-            self.n,
+        # get nominal (and 'up' and 'down') scale factors
+        sfs = get_object_sfs(
+            self.cset[id_corrections[self.year + self.year_mod][self.id_wp]],
+            inputs=[self.pog_year, np.abs(self.m.eta), self.m.pt, SYST],
+            systematics=get_systematics(["sf", "systup", "systdown"], self.variation),
+            in_limit_mask=in_muon_mask,
+            payload=self.payload(id_corrections[self.year + self.year_mod][self.id_wp]),
         )
-        if self.variation == "nominal":
-            # get 'up' and 'down' scale factors
-            up_sf = unflat_sf(
-                self.cset[
-                    id_corrections[self.year + self.year_mod][self.id_wp]
-                ].evaluate(self.pog_year, muon_eta, muon_pt, "systup"),
-                in_muon_mask,
-                self.n,
-            )
-            down_sf = unflat_sf(
-                self.cset[
-                    id_corrections[self.year + self.year_mod][self.id_wp]
-                ].evaluate(self.pog_year, muon_eta, muon_pt, "systdown"),
-                in_muon_mask,
-                self.n,
-            )
-            # add scale factors to weights container
-            self.weights.add(
-                name=f"muon_id",
-                weight=nominal_sf,
-                weightUp=up_sf,
-                weightDown=down_sf,
-            )
-        else:
-            self.weights.add(
-                name=f"muon_id",
-                weight=nominal_sf,
-            )
+        # add scale factors to weights container
+        add_event_sfs(self.weights, "muon_id", prod_per_event(sfs, self.n))
 
     def add_iso_weight(self):
         """
@@ -403,11 +326,6 @@ class MuonCorrector:
         muon_id_mask = get_id_wps(self.m)[self.id_wp]
         muon_iso_mask = get_iso_wps(self.m)[self.iso_wp]
         in_muon_mask = muon_pt_mask & muon_eta_mask & muon_id_mask & muon_iso_mask
-        in_muons = self.m.mask[in_muon_mask]
-
-        # get muons pT and abseta (replace None values with some 'in-limit' value)
-        muon_pt = ak.fill_none(in_muons.pt, 29.0)
-        muon_eta = np.abs(ak.fill_none(in_muons.eta, 0.0))
 
         iso_corrections = {
             "2016APV": {},
@@ -437,40 +355,16 @@ class MuonCorrector:
         ]
         assert correction_name, "No Iso SF's available"
 
-        # get nominal scale factors
-        nominal_sf = unflat_sf(
-            self.cset[correction_name].evaluate(self.pog_year, muon_eta, muon_pt, "sf"),
-            in_muon_mask,
-            self.n,
+        # get nominal (and 'up' and 'down') scale factors
+        sfs = get_object_sfs(
+            self.cset[correction_name],
+            inputs=[self.pog_year, np.abs(self.m.eta), self.m.pt, SYST],
+            systematics=get_systematics(["sf", "systup", "systdown"], self.variation),
+            in_limit_mask=in_muon_mask,
+            payload=self.payload(correction_name),
         )
-        if self.variation == "nominal":
-            # get 'up' and 'down' scale factors
-            up_sf = unflat_sf(
-                self.cset[correction_name].evaluate(
-                    self.pog_year, muon_eta, muon_pt, "systup"
-                ),
-                in_muon_mask,
-                self.n,
-            )
-            down_sf = unflat_sf(
-                self.cset[correction_name].evaluate(
-                    self.pog_year, muon_eta, muon_pt, "systdown"
-                ),
-                in_muon_mask,
-                self.n,
-            )
-            # add scale factors to weights container
-            self.weights.add(
-                name=f"muon_iso",
-                weight=nominal_sf,
-                weightUp=up_sf,
-                weightDown=down_sf,
-            )
-        else:
-            self.weights.add(
-                name=f"muon_iso",
-                weight=nominal_sf,
-            )
+        # add scale factors to weights container
+        add_event_sfs(self.weights, "muon_iso", prod_per_event(sfs, self.n))
 
     def add_triggeriso_weight(self, trigger_mask, trigger_match_mask) -> None:
         """
@@ -497,11 +391,6 @@ class MuonCorrector:
         in_muon_mask = (
             muon_pt_mask & muon_eta_mask & muon_id_mask & muon_iso_mask & trigger_mask & trigger_match_mask
         )
-        in_muons = self.m.mask[in_muon_mask]
-
-        # get muons transverse momentum and abs pseudorapidity (replace None values with some 'in-limit' value)
-        muon_pt = ak.fill_none(in_muons.pt, 29.0)
-        muon_eta = np.abs(ak.fill_none(in_muons.eta, 0.0))
 
         # scale factors keys
         sfs_keys = {
@@ -510,45 +399,16 @@ class MuonCorrector:
             "2017": "NUM_IsoMu27_DEN_CutBasedIdTight_and_PFIsoTight",
             "2018": "NUM_IsoMu24_DEN_CutBasedIdTight_and_PFIsoTight",
         }
-        # get nominal scale factors
-        sf = self.cset[sfs_keys[self.year + self.year_mod]].evaluate(
-            self.pog_year, muon_eta, muon_pt, "sf"
-        )
-        nominal_sf = unflat_sf(
-            sf,
-            in_muon_mask,
-            self.n,
+        # get nominal (and 'up' and 'down') scale factors
+        sfs = get_object_sfs(
+            self.cset[sfs_keys[self.year + self.year_mod]],
+            inputs=[self.pog_year, np.abs(self.m.eta), self.m.pt, SYST],
+            systematics=get_systematics(["sf", "systup", "systdown"], self.variation),
+            in_limit_mask=in_muon_mask,
+            payload=self.payload(sfs_keys[self.year + self.year_mod]),
         )
-        if self.variation == "nominal":
-            # get 'up' and 'down' scale factors
-            up_sf = self.cset[sfs_keys[self.year]].evaluate(
-                self.pog_year, muon_eta, muon_pt, "systup"
-            )
-            up_sf = unflat_sf(
-                up_sf,
-                in_muon_mask,
-                self.n,
-            )
-            down_sf = self.cset[sfs_keys[self.year]].evaluate(
-                self.pog_year, muon_eta, muon_pt, "systdown"
-            )
-            down_sf = unflat_sf(
-                down_sf,
-                in_muon_mask,
-                self.n,
-            )
-            # add scale factors to weights container
-            self.weights.add(
-                name=f"muon_triggeriso",
-                weight=nominal_sf,
-                weightUp=up_sf,
-                weightDown=down_sf,
-            )
-        else:
-            self.weights.add(
-                name=f"muon_triggeriso",
-                weight=nominal_sf,
-            )
+        # add scale factors to weights container
+        add_event_sfs(self.weights, "muon_triggeriso", prod_per_event(sfs, self.n))
 
 
 # ----------------------------------
@@ -626,9 +486,7 @@ class TauCorrector:
         self.variation = variation
 
         # define correction set_id
-        self.cset = correctionlib.CorrectionSet.from_file(
-            get_pog_json(json_name="tau", year=self.year + self.year_mod)
-        )
+        self.cset = get_correction_set(json_name="tau", year=self.year + self.year_mod)
         self.pog_year = pog_years[year + year_mod]
         """
         Check: https://github.com/cms-tau-pog/TauFW/blob/43bc39474b689d9712107d53a953b38c3cd9d43e/PicoProducer/python/analysis/ModuleETau.py#L270 
@@ -651,51 +509,19 @@ class TauCorrector:
         # Only taus passing the wp stablished
         tau_wp_mask = self.taus_wp_e > self.tau_vs_ele_wp
         in_tau_mask = tau_genMatch_mask & tau_wp_mask  #  & tau_eta_mask
-        # get 'in-limits' taus
-        in_limit_taus = self.taus.mask[in_tau_mask]
-        # get pt and eta
-        # fill Nones with some 'in-limit' value
-        tau_eta = ak.fill_none(in_limit_taus.eta, 0)
-        tau_genMatch = ak.fill_none(in_limit_taus.genPartFlav, 0.0)
-        # wp
-        wp = self.tau_vs_ele
-        # syst
-        syst = "nom"
-        # get nominal scale factors
-        nominal_sf = unflat_sf(
-            self.cset["DeepTau2017v2p1VSe"].evaluate(tau_eta, tau_genMatch, wp, "nom"),
-            in_tau_mask,
+        # get nominal (and 'up' and 'down') scale factors of the 'in-limits' taus
+        sfs = prod_per_event(
+            get_object_sfs(
+                self.cset["DeepTau2017v2p1VSe"],
+                inputs=[self.taus_eta, self.taus_genMatch, self.tau_vs_ele, SYST],
+                systematics=get_systematics(["nom", "up", "down"], self.variation),
+                in_limit_mask=in_tau_mask,
+            ),
             self.n,
         )
-        if self.variation == "nominal":
-            # get 'up' and 'down' scale factors
-            up_sf = unflat_sf(
-                self.cset["DeepTau2017v2p1VSe"].evaluate(
-                    tau_eta, tau_genMatch, wp, "up"
-                ),
-                in_tau_mask,
-                self.n,
-            )
-            down_sf = unflat_sf(
-                self.cset["DeepTau2017v2p1VSe"].evaluate(
-                    tau_eta, tau_genMatch, wp, "down"
-                ),
-                in_tau_mask,
-                self.n,
-            )
-            # add scale factors to weights container
-            self.weights.add(
-                name=f"e -> tau_h fake rate_{self.tau_vs_ele}",
-                weight=nominal_sf,
-                weightUp=up_sf,
-                weightDown=down_sf,
-            )
-        else:
-            self.weights.add(
-                name=f"e -> tau_h fake rate_{self.tau_vs_ele}",
-                weight=nominal_sf,
-            )
-        return nominal_sf
+        # add scale factors to weights container
+        add_event_sfs(self.weights, f"e -> tau_h fake rate_{self.tau_vs_ele}", sfs)
+        return sfs[0]
 
     # mu -> tau_h fake rate SFs for DeepTau2017v2p1VSmu
     # eta = (0, 2.3]; genMatch = 0,2; wp = Loose, Medium, Tight, VLoose ; syst: down, nom, up
@@ -714,49 +540,19 @@ class TauCorrector:
         # Only taus passing the wp stablished
         tau_wp_mask = self.taus_wp_mu > self.tau_vs_mu_wp
         in_tau_mask = tau_genMatch_mask & tau_wp_mask  # & tau_eta_mask
-        # get 'in-limits' taus
-        in_limit_taus = self.taus.mask[in_tau_mask]
-        # get pt and etaF
-        # fill Nones with some 'in-limit' value
-        tau_eta = ak.fill_none(in_limit_taus.eta, 0)
-        tau_genMatch = ak.fill_none(in_limit_taus.genPartFlav, 0.0)
-        # wp
-        wp = self.tau_vs_mu
-        # get nominal scale factors
-        nominal_sf = unflat_sf(
-            self.cset["DeepTau2017v2p1VSmu"].evaluate(tau_eta, tau_genMatch, wp, "nom"),
-            in_tau_mask,
+        # get nominal (and 'up' and 'down') scale factors of the 'in-limits' taus
+        sfs = prod_per_event(
+            get_object_sfs(
+                self.cset["DeepTau2017v2p1VSmu"],
+                inputs=[self.taus_eta, self.taus_genMatch, self.tau_vs_mu, SYST],
+                systematics=get_systematics(["nom", "up", "down"], self.variation),
+                in_limit_mask=in_tau_mask,
+            ),
             self.n,
         )
-        if self.variation == "nominal":
-            # get 'up' and 'down' scale factors
-            up_sf = unflat_sf(
-                self.cset["DeepTau2017v2p1VSmu"].evaluate(
-                    tau_eta, tau_genMatch, wp, "up"
-                ),
-                in_tau_mask,
-                self.n,
-            )
-            down_sf = unflat_sf(
-                self.cset["DeepTau2017v2p1VSmu"].evaluate(
-                    tau_eta, tau_genMatch, wp, "down"
-                ),
-                in_tau_mask,
-                self.n,
-            )
-            # add scale factors to weights container
-            self.weights.add(
-                name=f"mu -> tau_h fake rate_{self.tau_vs_mu}",
-                weight=nominal_sf,
-                weightUp=up_sf,
-                weightDown=down_sf,
-            )
-        else:
-            self.weights.add(
-                name=f"mu -> tau_h fake rate_{self.tau_vs_mu}",
-                weight=nominal_sf,
-            )
-        return nominal_sf
+        # add scale factors to weights container
+        add_event_sfs(self.weights, f"mu -> tau_h fake rate_{self.tau_vs_mu}", sfs)
+        return sfs[0]
 
     # By default, use the pT-dependent SFs with the 'pt' flag
     # pt = (-inf, inf); dm = 0, 1, 2, 10, 11; genmatch = 0, 1, 2, 3, 4, 5, 6; wp = Loose, Medium, Tight, VTight; wp_VSe = Tight, VVLoose; syst = down, nom, up; flag = dm, pt
@@ -787,54 +583,29 @@ class TauCorrector:
         # Only taus passing the wp stablished
         tau_wp_mask = self.taus_wp_jet > self.tau_vs_jet_wp
         in_tau_mask = tau_dm_mask & tau_genMatch_mask & tau_wp_mask
-        # get 'in-limits' taus
-        in_limit_taus = self.taus.mask[in_tau_mask]
-        # get pt and eta
-        # fill Nones with some 'in-limit' value
-        tau_pt = ak.fill_none(in_limit_taus.pt, 0)
-        tau_dm = ak.fill_none(in_limit_taus.decayMode, 0)
-        tau_genMatch = ak.fill_none(in_limit_taus.genPartFlav, 0.0)
-        # wp
-        wp = self.tau_vs_jet
-        # wp_VSe
-        wp_VSe = self.tau_vs_ele
-        # get nominal scale factors
-        nominal_sf = unflat_sf(
-            self.cset["DeepTau2017v2p1VSjet"].evaluate(
-                tau_pt, tau_dm, tau_genMatch, wp, wp_VSe, "default", flag
+        # get nominal (and 'up' and 'down') scale factors of the 'in-limits' taus
+        sfs = prod_per_event(
+            get_object_sfs(
+                self.cset["DeepTau2017v2p1VSjet"],
+                inputs=[
+                    self.taus_pt,
+                    self.taus_dm,
+                    self.taus_genMatch,
+                    self.tau_vs_jet,
+                    self.tau_vs_ele,
+                    SYST,
+                    flag,
+                ],
+                systematics=get_systematics(["default", "up", "down"], self.variation),
+                in_limit_mask=in_tau_mask,
             ),
-            in_tau_mask,
             self.n,
         )
-        if self.variation == "nominal":
-            # get 'up' and 'down' scale factors
-            up_sf = unflat_sf(
-                self.cset["DeepTau2017v2p1VSjet"].evaluate(
-                    tau_pt, tau_dm, tau_genMatch, wp, wp_VSe, "up", flag
-                ),
-                in_tau_mask,
-                self.n,
-            )
-            down_sf = unflat_sf(
-                self.cset["DeepTau2017v2p1VSjet"].evaluate(
-                    tau_pt, tau_dm, tau_genMatch, wp, wp_VSe, "down", flag
-                ),
-                in_tau_mask,
-                self.n,
-            )
-            # add scale factors to weights container
-            self.weights.add(
-                name=f"jet -> tau_h fake rate_{self.tau_vs_jet}_{flag}",
-                weight=nominal_sf,
-                weightUp=up_sf,
-                weightDown=down_sf,
-            )
-        else:
-            self.weights.add(
-                name=f"jet -> tau_h fake rate_{self.tau_vs_jet}_{flag}",
-                weight=nominal_sf,
-            )
-        return nominal_sf
+        # add scale factors to weights container
+        add_event_sfs(
+            self.weights, f"jet -> tau_h fake rate_{self.tau_vs_jet}_{flag}", sfs
+        )
+        return sfs[0]
 
         # By default, use the pT-dependent SFs with the 'pt' flag
 
@@ -862,50 +633,18 @@ class TauCorrector:
         # Only taus passing the wp stablished
         tau_wp_mask = self.taus_wp_jet > self.tau_vs_jet_wp
         tau_mask = tau_pt_mask & tau_dm_mask & tau_wp_mask
-        # get 'in-limits' taus
-        in_limit_taus = self.taus.mask[tau_mask]
-        # get pt and dm
-        # fill Nones with some 'in-limit' value
-        tau_pt = ak.fill_none(in_limit_taus.pt, 40.0)
-        tau_dm = ak.fill_none(in_limit_taus.decayMode, -1)
-        trigtype = trigger
-        corrtype = info
-        wp = self.tau_vs_jet
-        # get nominal scale factors
-        sf = unflat_sf(
-            self.cset["tau_trigger"].evaluate(
-                tau_pt, tau_dm, trigtype, wp, corrtype, "nom"
+        # get nominal (and 'up' and 'down') scale factors of the 'in-limits' taus
+        sfs = prod_per_event(
+            get_object_sfs(
+                self.cset["tau_trigger"],
+                inputs=[self.taus_pt, self.taus_dm, trigger, self.tau_vs_jet, info, SYST],
+                systematics=get_systematics(["nom", "up", "down"], self.variation),
+                in_limit_mask=tau_mask,
             ),
-            tau_mask,
             self.n,
         )
-        nominal_sf = np.where(mask_trigger, sf, 1.0)
-        if self.variation == "nominal":
-            # get 'up' and 'down' scale factors
-            up_sf = unflat_sf(
-                self.cset["tau_trigger"].evaluate(
-                    tau_pt, tau_dm, trigtype, wp, corrtype, "up"
-                ),
-                tau_mask,
-                self.n,
-            )
-            down_sf = unflat_sf(
-                self.cset["tau_trigger"].evaluate(
-                    tau_pt, tau_dm, trigtype, wp, corrtype, "down"
-                ),
-                tau_mask,
-                self.n,
-            )
-            # add scale factors to weights container
-            self.weights.add(
-                name=f"trigger_{trigtype}",
-                weight=nominal_sf,
-                weightUp=up_sf,
-                weightDown=down_sf,
-            )
-        else:
-            self.weights.add(
-                name=f"trigger_{trigtype}",
-                weight=nominal_sf,
-            )
-        return nominal_sf
\ No newline at end of file
+        # the nominal scale factors only apply to events passing the trigger
+        sfs[0] = np.where(mask_trigger, sfs[0], 1.0)
+        # add scale factors to weights container
+        add_event_sfs(self.weights, f"trigger_{trigger}", sfs)
+        return sfs[0]
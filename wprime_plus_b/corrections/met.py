@@ -1,8 +1,7 @@
-import correctionlib
 import numpy as np
 import awkward as ak
-from typing import Tuple
-from wprime_plus_b.corrections.utils import get_pog_json
+from typing import List, Tuple
+from wprime_plus_b.corrections.utils import get_correction_set
 
 
 def met_phi_corrections(
@@ -38,9 +37,7 @@ def met_phi_corrections(
     --------
         corrected MET pt and phi
     """
-    cset = correctionlib.CorrectionSet.from_file(
-        get_pog_json(json_name="met", year=year)
-    )
+    cset = get_correction_set(json_name="met", year=year)
     # make sure to not cross the maximum allowed value for uncorrected met
     met_pt = np.clip(met_pt, 0.0, 6499.0)
     met_phi = np.clip(met_phi, -3.5, 3.5)
@@ -68,3 +65,75 @@ def met_phi_corrections(
         return corrected_met_pt, corrected_met_phi
     except:
         return met_pt, met_phi
+
+
+def get_met_shift(
+    corrections: List[Tuple[ak.Array, ak.Array]], nevents: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return the per-event px/py shift of the corrected objects of several collections,
+    accumulated in a single pass over their flat pt/phi buffers
+
+    Parameters:
+    -----------
+        corrections:
+            list of (uncorrected, corrected) collection pairs
+        nevents:
+            number of events
+
+    Returns:
+    --------
+        sum of the corrected minus uncorrected object px and py of each event
+    """
+    event_index, delta_px, delta_py = [], [], []
+    for old_objects, new_objects in corrections:
+        counts = ak.to_numpy(ak.num(old_objects, axis=1))
+        old_pt = ak.to_numpy(ak.flatten(old_objects.pt)).astype(np.float64)
+        new_pt = ak.to_numpy(ak.flatten(new_objects.pt)).astype(np.float64)
+        old_phi = ak.to_numpy(ak.flatten(old_objects.phi)).astype(np.float64)
+        new_phi = ak.to_numpy(ak.flatten(new_objects.phi)).astype(np.float64)
+        if np.array_equal(old_phi, new_phi):
+            # energy scale corrections only change pt: one cos/sin per object
+            delta_pt = new_pt - old_pt
+            delta_px.append(delta_pt * np.cos(old_phi))
+            delta_py.append(delta_pt * np.sin(old_phi))
+        else:
+            delta_px.append(new_pt * np.cos(new_phi) - old_pt * np.cos(old_phi))
+            delta_py.append(new_pt * np.sin(new_phi) - old_pt * np.sin(old_phi))
+        event_index.append(np.repeat(np.arange(nevents), counts))
+    if not corrections:
+        return np.zeros(nevents), np.zeros(nevents)
+    event_index = np.concatenate(event_index)
+    shift_px = np.bincount(
+        event_index, weights=np.concatenate(delta_px), minlength=nevents
+    )
+    shift_py = np.bincount(
+        event_index, weights=np.concatenate(delta_py), minlength=nevents
+    )
+    return shift_px, shift_py
+
+
+def propagate_met(
+    met_pt: ak.Array, met_phi: ak.Array, shift: Tuple[np.ndarray, np.ndarray]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Propagate the object-level corrections to MET
+
+    Parameters:
+    -----------
+        met_pt:
+            MET transverse momentum
+        met_phi:
+            MET azimuthal angle
+        shift:
+            px/py shift of the corrected objects (see 'get_met_shift')
+
+    Returns:
+    --------
+        corrected MET pt and phi
+    """
+    met_pt = np.asarray(met_pt, dtype=np.float64)
+    met_phi = np.asarray(met_phi, dtype=np.float64)
+    met_px = met_pt * np.cos(met_phi) - shift[0]
+    met_py = met_pt * np.sin(met_phi) - shift[1]
+    return np.hypot(met_px, met_py), np.arctan2(met_py, met_px)
@@ -0,0 +1,70 @@
+import time
+import threading
+from typing import Any, Callable
+
+
+class CorrectionRegistry:
+    """
+    Process-wide registry of correction payloads (correctionlib sets, pickled
+    factories, lookup tables, ...)
+
+    Payloads are keyed by (payload, year) where 'year' includes the year modifier
+    (e.g. '2016APV'), and year-independent payloads use an empty year. Each payload
+    is loaded lazily the first time it is requested and kept for the lifetime of
+    the worker process, so every chunk and every corrector share the same object.
+    """
+
+    def __init__(self) -> None:
+        self._payloads = {}
+        self._hits = {}
+        self._misses = {}
+        self._load_time = {}
+        self._lock = threading.RLock()
+
+    def get(self, payload: str, year: str, loader: Callable[[], Any]) -> Any:
+        """
+        return the payload stored under (payload, year), loading it with 'loader' on first use
+
+        Parameters:
+        -----------
+            payload:
+                payload name
+            year:
+                dataset year plus year modifier {'2016APV', '2016', '2017', '2018'}, or '' for year-independent payloads
+            loader:
+                callable with no arguments that loads the payload
+        """
+        key = (payload, year)
+        with self._lock:
+            if key in self._payloads:
+                self._hits[key] = self._hits.get(key, 0) + 1
+                return self._payloads[key]
+            t0 = time.perf_counter()
+            value = loader()
+            self._load_time[key] = time.perf_counter() - t0
+            self._misses[key] = self._misses.get(key, 0) + 1
+            self._payloads[key] = value
+            return value
+
+    def __contains__(self, key) -> bool:
+        return key in self._payloads
+
+    def stats(self) -> dict:
+        """return hit/miss counters and load time (in seconds) for each payload"""
+        with self._lock:
+            return {
+                f"{payload}_{year}" if year else payload: {
+                    "hits": self._hits.get((payload, year), 0),
+                    "misses": self._misses.get((payload, year), 0),
+                    "load_time": self._load_time.get((payload, year), 0.0),
+                }
+                for payload, year in self._payloads
+            }
+
+    def clear(self) -> None:
+        """drop every loaded payload and reset the counters"""
+        with self._lock:
+            self._payloads.clear()
+            self._hits.clear()
+            self._misses.clear()
+            self._load_time.clear()
@@ -1,8 +1,14 @@
-import correctionlib
-import awkward as ak
+import numpy as np
 from typing import Type
 from coffea.analysis_tools import Weights
-from wprime_plus_b.corrections.utils import get_pog_json
+from wprime_plus_b.corrections.utils import (
+    SYST,
+    add_event_sfs,
+    get_object_sfs,
+    get_systematics,
+    get_correction_set,
+    get_correction_payload,
+)
 
 
 def add_pileup_weight(
@@ -32,9 +38,7 @@ def add_pileup_weight(
     https://cms-nanoaod-integration.web.cern.ch/commonJSONSFs/summaries/LUM_2017_UL_puWeights.html
     """
     # define correction set and goldenJSON file names
-    cset = correctionlib.CorrectionSet.from_file(
-        get_pog_json(json_name="pileup", year=year + year_mod)
-    )
+    cset = get_correction_set(json_name="pileup", year=year + year_mod)
     year_to_corr = {
         "2016": "Collisions16_UltraLegacy_goldenJSON",
         "2017": "Collisions17_UltraLegacy_goldenJSON",
@@ -42,21 +46,13 @@ def add_pileup_weight(
     }
     # get number of true interactions
     nti = events.Pileup.nTrueInt
-    # get nominal scale factors
-    nominal_sf = cset[year_to_corr[year]].evaluate(ak.to_numpy(nti), "nominal")
-    if variation == "nominal":
-        # get up and down variations
-        up_sf = cset[year_to_corr[year]].evaluate(ak.to_numpy(nti), "up")
-        down_sf = cset[year_to_corr[year]].evaluate(ak.to_numpy(nti), "down")
-        # add pileup scale factors to weights container
-        weights_container.add(
-            name="pileup",
-            weight=nominal_sf,
-            weightUp=up_sf,
-            weightDown=down_sf,
-        )
-    else:
-        weights_container.add(
-            name="pileup",
-            weight=nominal_sf,
-        )
\ No newline at end of file
+    # get nominal (and 'up' and 'down') scale factors in a single lookup
+    sfs = get_object_sfs(
+        cset[year_to_corr[year]],
+        inputs=[nti, SYST],
+        systematics=get_systematics(["nominal", "up", "down"], variation),
+        in_limit_mask=np.ones(len(nti), dtype=bool),
+        payload=get_correction_payload("pileup", year + year_mod, year_to_corr[year]),
+    )
+    # add pileup scale factors to weights container
+    add_event_sfs(weights_container, "pileup", sfs)
@@ -1,10 +1,17 @@
-import correctionlib
 import numpy as np
 import awkward as ak
 from typing import Type
-from .utils import unflat_sf
 from coffea.analysis_tools import Weights
-from wprime_plus_b.corrections.utils import get_pog_json
+from wprime_plus_b.corrections.utils import (
+    SYST,
+    add_event_sfs,
+    get_object_sfs,
+    get_systematics,
+    prod_per_event,
+    get_correction_set,
+    get_correction_payload,
+)
+from wprime_plus_b.processors.utils.delta_r import delta_r_match_count
 
 
 def add_pujetid_weight(
@@ -49,45 +56,19 @@ def add_pujetid_weight(
     jet_pt_mask = (j.pt > 20) & (j.pt < 50)
     jet_eta_mask = np.abs(j.eta) < 5.
     jet_puid_mask = j.puId == puid_wps[working_point]
-    genjet_match_mask = ak.flatten(ak.any(jets.metric_table(genjets) < 0.4, axis=-1))
+    genjet_match_mask = ak.flatten(delta_r_match_count(jets, genjets, threshold=0.4) > 0)
     in_jet_mask = jet_pt_mask & jet_eta_mask & jet_puid_mask & genjet_match_mask
-    in_jets = j.mask[in_jet_mask]
-
-    # get jet transverse momentum and pseudorapidity (replace None values with some 'in-limit' value)
-    jets_pt = ak.fill_none(in_jets.pt, 20.0)
-    jets_eta = ak.fill_none(in_jets.eta, 0.0)
 
     # define correction set
-    cset = correctionlib.CorrectionSet.from_file(
-        get_pog_json("pujetid", year + year_mod)
-    )
-    # get nominal scale factors
+    cset = get_correction_set(json_name="pujetid", year=year + year_mod)
+    # get nominal (and 'up' and 'down') scale factors
     # If jet in 'in-limits' jets, then take the computed SF, otherwise assign 1
-    # Unflatten to original shape
-    nominal_sf = unflat_sf(
-        cset["PUJetID_eff"].evaluate(jets_eta, jets_pt, "nom", working_point),
-        in_jet_mask,
-        n,
+    sfs = get_object_sfs(
+        cset["PUJetID_eff"],
+        inputs=[j.eta, j.pt, SYST, working_point],
+        systematics=get_systematics(["nom", "up", "down"], variation),
+        in_limit_mask=in_jet_mask,
+        payload=get_correction_payload("pujetid", year + year_mod, "PUJetID_eff"),
     )
-    if variation == "nominal":
-        # get 'up' and 'down' variations
-        up_sf = unflat_sf(
-            cset["PUJetID_eff"].evaluate(jets_eta, jets_pt, "up", working_point),
-            in_jet_mask,
-            n,
-        )
-        down_sf = unflat_sf(
-            cset["PUJetID_eff"].evaluate(jets_eta, jets_pt, "down", working_point),
-            in_jet_mask,
-            n,
-        )
-        # add nominal, up and down scale factors to weights container
-        weights.add(
-            name="pujetid",
-            weight=nominal_sf,
-            weightUp=up_sf,
-            weightDown=down_sf,
-        )
-    else:
-        # add nominal scale factors to weights container
-        weights.add(name="pujetid", weight=nominal_sf)
\ No newline at end of file
+    # multiply the scale factors of each event and add them to weights container
+    add_event_sfs(weights, "pujetid", prod_per_event(sfs, n))
\ No newline at end of file
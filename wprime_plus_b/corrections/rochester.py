@@ -1,38 +1,155 @@
 import numpy as np
 import awkward as ak
+import importlib.resources
 from coffea.lookup_tools import txt_converters, rochester_lookup
+from wprime_plus_b.corrections import registry
 
+# Rochester corrections file tag for each year
+# https://gitlab.cern.ch/akhukhun/roccor
+rochester_files = {
+    "2016APV": "2016a",
+    "2016": "2016b",
+    "2017": "2017",
+    "2018": "2018",
+}
 
-def apply_rochester_corrections(muons, is_mc, year):
-    rochester_data = txt_converters.convert_rochester_file(
-        f"wprime_plus_b/data/RoccoR{year}UL.txt", loaduncs=True
+
+def load_rochester_data(year: str) -> dict:
+    """
+    return the parsed Rochester corrections of a given year
+
+    Parameters:
+    -----------
+        year:
+            dataset year plus year modifier {'2016APV', '2016', '2017', '2018'}
+    """
+    tag = rochester_files[year]
+    with importlib.resources.path("wprime_plus_b.data", f"RoccoR{tag}UL.txt") as path:
+        return txt_converters.convert_rochester_file(str(path), loaduncs=True)
+
+
+def load_rochester_lookup(year: str) -> rochester_lookup.rochester_lookup:
+    """load the Rochester corrections lookup (once per worker process)"""
+    return registry.get(
+        payload="rochester",
+        year=year,
+        loader=lambda: rochester_lookup.rochester_lookup(load_rochester_data(year)),
     )
-    rochester = rochester_lookup.rochester_lookup(rochester_data)
 
+
+def splitmix64(x: np.ndarray) -> np.ndarray:
+    """splitmix64 hash of an uint64 array"""
+    with np.errstate(over="ignore"):
+        z = x + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def event_uniform(
+    run: np.ndarray, lumi: np.ndarray, event: np.ndarray, counts: np.ndarray
+) -> np.ndarray:
+    """
+    return one uniform random number in [0, 1) per object, seeded by (run, lumi, event)
+    and the object index within the event. The numbers only depend on the event
+    identifiers, so they do not change with the chunking or between reruns
+
+    Parameters:
+    -----------
+        run:
+            run number of each event
+        lumi:
+            luminosity block of each event
+        event:
+            event number of each event
+        counts:
+            number of objects in each event
+    """
+    seed = splitmix64(np.asarray(run, dtype=np.uint64))
+    seed = splitmix64(seed ^ np.asarray(lumi, dtype=np.uint64))
+    seed = splitmix64(seed ^ np.asarray(event, dtype=np.uint64))
+    # object index within the event
+    counts = np.asarray(counts, dtype=np.int64)
+    offsets = np.repeat(np.cumsum(counts) - counts, counts)
+    index = np.arange(counts.sum(), dtype=np.int64) - offsets
+    random = splitmix64(np.repeat(seed, counts) ^ index.astype(np.uint64))
+    # use the 53 most significant bits as the mantissa of a double
+    return (random >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53))
+
+
+def as_single_list(array: np.ndarray) -> ak.Array:
+    """wrap a flat buffer as a one-list jagged array (the lookup expects jagged inputs)"""
+    return ak.unflatten(array, [len(array)])
+
+
+def apply_rochester_corrections(events, muons: ak.Array, is_mc: bool, year: str) -> ak.Array:
+    """
+    return the Rochester corrected muons pT
+
+    Parameters:
+    -----------
+        events:
+            events collection (used to seed the MC smearing with run, lumi and event)
+        muons:
+            muons collection
+        is_mc:
+            True for MC samples
+        year:
+            dataset year plus year modifier {'2016APV', '2016', '2017', '2018'}
+    """
+    rochester = load_rochester_lookup(year)
+    counts = ak.to_numpy(ak.num(muons.pt, axis=1))
+    charge = ak.to_numpy(ak.flatten(muons.charge))
+    pt = ak.to_numpy(ak.flatten(muons.pt))
+    eta = ak.to_numpy(ak.flatten(muons.eta))
+    phi = ak.to_numpy(ak.flatten(muons.phi))
+
+    # evaluate every muon once on flat buffers
     if is_mc:
-        hasgen = ~np.isnan(ak.fill_none(muons.matched_gen.pt, np.nan))
-        mc_rand = np.random.rand(*ak.to_numpy(ak.flatten(muons.pt)).shape)
-        mc_rand = ak.unflatten(mc_rand, ak.num(muons.pt, axis=1))
-        corrections = np.array(ak.flatten(ak.ones_like(muons.pt)))
-        mc_kspread = rochester.kSpreadMC(
-            muons.charge[hasgen],
-            muons.pt[hasgen],
-            muons.eta[hasgen],
-            muons.phi[hasgen],
-            muons.matched_gen.pt[hasgen],
+        gen_pt = ak.to_numpy(ak.flatten(ak.fill_none(muons.matched_gen.pt, np.nan)))
+        hasgen = ~np.isnan(gen_pt)
+        corrections = np.ones_like(pt)
+        # muons matched to a generator-level muon: spread using the gen pT
+        corrections[hasgen] = ak.to_numpy(
+            ak.flatten(
+                rochester.kSpreadMC(
+                    as_single_list(charge[hasgen]),
+                    as_single_list(pt[hasgen]),
+                    as_single_list(eta[hasgen]),
+                    as_single_list(phi[hasgen]),
+                    as_single_list(gen_pt[hasgen]),
+                )
+            )
         )
-        mc_ksmear = rochester.kSmearMC(
-            muons.charge[~hasgen],
-            muons.pt[~hasgen],
-            muons.eta[~hasgen],
-            muons.phi[~hasgen],
-            muons.nTrackerLayers[~hasgen],
-            mc_rand[~hasgen],
+        # unmatched muons: smear with a random number seeded by (run, lumi, event)
+        nlayers = ak.to_numpy(ak.flatten(muons.nTrackerLayers))
+        mc_rand = event_uniform(
+            run=ak.to_numpy(events.run),
+            lumi=ak.to_numpy(events.luminosityBlock),
+            event=ak.to_numpy(events.event),
+            counts=counts,
+        )
+        corrections[~hasgen] = ak.to_numpy(
+            ak.flatten(
+                rochester.kSmearMC(
+                    as_single_list(charge[~hasgen]),
+                    as_single_list(pt[~hasgen]),
+                    as_single_list(eta[~hasgen]),
+                    as_single_list(phi[~hasgen]),
+                    as_single_list(nlayers[~hasgen]),
+                    as_single_list(mc_rand[~hasgen]),
+                )
+            )
         )
-        hasgen_flat = np.array(ak.flatten(hasgen))
-        corrections[hasgen_flat] = np.array(ak.flatten(mc_kspread))
-        corrections[~hasgen_flat] = np.array(ak.flatten(mc_ksmear))
-        corrections = ak.unflatten(corrections, ak.num(muons.pt, axis=1))
     else:
-        corrections = rochester.kScaleDT(muons.charge, muons.pt, muons.eta, muons.phi)
-    return muons.pt * corrections
+        corrections = ak.to_numpy(
+            ak.flatten(
+                rochester.kScaleDT(
+                    as_single_list(charge),
+                    as_single_list(pt),
+                    as_single_list(eta),
+                    as_single_list(phi),
+                )
+            )
+        )
+    return ak.unflatten(pt * corrections, counts)
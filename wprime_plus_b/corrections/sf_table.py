@@ -0,0 +1,223 @@
+import gzip
+import json
+import numpy as np
+from typing import Union
+from wprime_plus_b.corrections import registry
+
+
+def load_correction_json(path: str) -> dict:
+    """
+    return the corrections of a correctionlib JSON file (.json or .json.gz) keyed by
+    name, as plain dictionaries (once per worker process)
+    """
+
+    def loader():
+        opener = gzip.open if str(path).endswith(".gz") else open
+        with opener(path, "rt") as handle:
+            data = json.load(handle)
+        return {correction["name"]: correction for correction in data["corrections"]}
+
+    return registry.get(payload=f"correction_json_{path}", year="", loader=loader)
+
+
+def get_edges(edges: Union[list, dict]) -> Union[np.ndarray, dict]:
+    """
+    return the bin edges of a binning node: an array for explicit edges, or the
+    'low', 'high' and 'n' of a uniform binning
+    """
+    if isinstance(edges, dict):
+        return {
+            "low": float(edges["low"]),
+            "high": float(edges["high"]),
+            "n": int(edges["n"]),
+        }
+    return np.asarray(edges, dtype=np.float64)
+
+
+def get_nbins(edges: Union[np.ndarray, dict]) -> int:
+    """return the number of bins of some edges (see 'get_edges')"""
+    return edges["n"] if isinstance(edges, dict) else len(edges) - 1
+
+
+def get_bin_index(edges: Union[np.ndarray, dict], x: np.ndarray) -> np.ndarray:
+    """
+    return the bin of each value, -1 below the first bin and the number of bins
+    above the last one (or for NaN)
+    """
+    if not isinstance(edges, dict):
+        return np.searchsorted(edges, x, side="right") - 1
+    low, high, nbins = edges["low"], edges["high"], edges["n"]
+    # uniform binning: computed as in correctionlib, not from rounded edges
+    index = np.floor((x - low) / (high - low) * nbins)
+    index = np.where(
+        (x >= high) | np.isnan(x),
+        nbins,
+        np.where(x < low, -1, np.clip(index, 0, nbins - 1)),
+    )
+    return index.astype(np.int64)
+
+
+def same_edges(first: Union[np.ndarray, dict], second: Union[np.ndarray, dict]) -> bool:
+    """check if two edges (see 'get_edges') are equal"""
+    if isinstance(first, dict) or isinstance(second, dict):
+        return isinstance(first, dict) and isinstance(second, dict) and first == second
+    return len(first) == len(second) and np.array_equal(first, second)
+
+
+def resolve_binning(node, scalars: dict) -> Union[tuple, None]:
+    """
+    follow the category nodes of a correction with the scalar inputs and return the
+    (inputs, edges, flows, content) of the binning reached, merging nested binnings
+    into a single multidimensional one. Returns None if the node cannot be reduced to
+    a binning with numeric contents (e.g. formulas or per-object categories)
+    """
+    if isinstance(node, (int, float)):
+        return [], [], [], np.array([node], dtype=np.float64)
+    if not isinstance(node, dict):
+        return None
+    nodetype = node.get("nodetype")
+    if nodetype == "category":
+        if node["input"] not in scalars:
+            # per-object categories (e.g. genmatch) are not resolved
+            return None
+        for item in node["content"]:
+            if item["key"] == scalars[node["input"]]:
+                return resolve_binning(item["value"], scalars)
+        if node.get("default") is not None:
+            return resolve_binning(node["default"], scalars)
+        return None
+    if nodetype == "binning":
+        inputs, edges = [node["input"]], [get_edges(node["edges"])]
+    elif nodetype == "multibinning":
+        inputs, edges = list(node["inputs"]), [get_edges(e) for e in node["edges"]]
+    else:
+        return None
+    flow = node["flow"]
+    if not (flow in ["clamp", "error"] or isinstance(flow, (int, float))):
+        return None
+    children = [resolve_binning(child, scalars) for child in node["content"]]
+    if any(child is None for child in children):
+        return None
+    inner_inputs, inner_edges, inner_flows, _ = children[0]
+    for child_inputs, child_edges, child_flows, _ in children:
+        if not same_binning(
+            (inner_inputs, inner_edges, inner_flows),
+            (child_inputs, child_edges, child_flows),
+        ):
+            return None
+    return (
+        inputs + inner_inputs,
+        edges + inner_edges,
+        [flow] * len(inputs) + inner_flows,
+        np.concatenate([child[3] for child in children]),
+    )
+
+
+def same_binning(first: tuple, second: tuple) -> bool:
+    """check if two (inputs, edges, flows) binnings are equal"""
+    return (
+        first[0] == second[0]
+        and first[2] == second[2]
+        and len(first[1]) == len(second[1])
+        and all(same_edges(a, b) for a, b in zip(first[1], second[1]))
+    )
+
+
+class SystematicTable:
+    """
+    Bin contents of several systematics of a binned correction that share the same
+    binning. The bin of each object is found once and the values of every systematic
+    are gathered from a (nsyst, nbins) table in a single operation
+
+    Parameters:
+    -----------
+        inputs:
+            names of the binned inputs
+        edges:
+            bin edges of each binned input (see 'get_edges')
+        flows:
+            overflow behaviour of each binned input {'clamp', 'error', <value>}
+        contents:
+            bin contents of shape (number of systematics, number of bins)
+    """
+
+    def __init__(self, inputs: list, edges: list, flows: list, contents: np.ndarray) -> None:
+        self.inputs = inputs
+        self.edges = edges
+        self.flows = flows
+        self.contents = contents
+
+    def evaluate(self, arrays: dict) -> Union[np.ndarray, None]:
+        """
+        return the values of every systematic for the binned inputs in 'arrays', or None
+        if an input is missing or out of range with flow 'error'
+        """
+        if not all(name in arrays for name in self.inputs):
+            return None
+        nobjects = len(next(iter(arrays.values())))
+        flat_index = np.zeros(nobjects, dtype=np.int64)
+        overflows = []
+        for name, edges, flow in zip(self.inputs, self.edges, self.flows):
+            x = np.asarray(arrays[name], dtype=np.float64)
+            nbins = get_nbins(edges)
+            index = get_bin_index(edges, x)
+            if flow != "clamp":
+                outside = (index < 0) | (index >= nbins)
+                if np.any(outside):
+                    if flow == "error":
+                        return None
+                    overflows.append((outside, flow))
+            flat_index = flat_index * nbins + np.clip(index, 0, nbins - 1)
+        values = self.contents[:, flat_index]
+        # the outermost binning with an overflow sets the value
+        for outside, flow in reversed(overflows):
+            values[:, outside] = flow
+        return values
+
+
+def compile_table(
+    correction: dict, scalars: dict, syst_input: str, systematics: list
+) -> Union[SystematicTable, None]:
+    """
+    return the SystematicTable of a correction for some fixed scalar inputs, or None if
+    the systematics do not reduce to binnings with a shared binning
+
+    Parameters:
+    -----------
+        correction:
+            correction dictionary (see 'load_correction_json')
+        scalars:
+            values of the scalar inputs, except the systematic
+        syst_input:
+            name of the systematic input
+        systematics:
+            systematic names
+    """
+    binnings = [
+        resolve_binning(correction["data"], {**scalars, syst_input: syst})
+        for syst in systematics
+    ]
+    if any(binning is None for binning in binnings):
+        return None
+    if not all(same_binning(binnings[0][:3], binning[:3]) for binning in binnings):
+        return None
+    inputs, edges, flows, _ = binnings[0]
+    return SystematicTable(
+        inputs, edges, flows, np.stack([binning[3] for binning in binnings])
+    )
+
+
+def get_table(
+    correction: dict, scalars: dict, syst_input: str, systematics: list
+) -> Union[SystematicTable, None]:
+    """return the SystematicTable of 'compile_table' (once per worker process)"""
+    key = json.dumps(
+        [correction["name"], id(correction), scalars, syst_input, systematics],
+        sort_keys=True,
+        default=str,
+    )
+    return registry.get(
+        payload=f"sf_table_{key}",
+        year="",
+        loader=lambda: compile_table(correction, scalars, syst_input, systematics),
+    )
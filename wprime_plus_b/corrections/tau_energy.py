@@ -1,8 +1,6 @@
-import copy
-import correctionlib
 import numpy as np
 import awkward as ak
-from wprime_plus_b.corrections.utils import get_pog_json
+from wprime_plus_b.corrections.utils import SYST, get_object_sfs, get_correction_set
 
 # ----------------------------------------------------------------------------------- #
 # -- The tau energy scale (TES) corrections for taus are provided  ------------------ #
@@ -47,28 +45,29 @@ def tau_energy_scale(
 ):
 
     # Corrections works with flatten values
-    ntaus = ak.num(copy.deepcopy(events.Tau))
-    taus_flatten = ak.flatten(copy.deepcopy(events.Tau))
+    ntaus = ak.num(events.Tau)
+    taus_flatten = ak.flatten(events.Tau)
     # It is defined the taus will be corrected with the energy scale factor: Only a subset of the initial taus.
     mask = mask_energy_corrections(taus_flatten)
-    taus_filter = taus_flatten.mask[mask]
-    # We fill the None values with valid entries
-    pt = ak.fill_none(taus_filter.pt, 0)
-    eta = ak.fill_none(taus_filter.eta, 0)
-    dm = ak.fill_none(taus_filter.decayMode, 0)
-    genmatch = ak.fill_none(taus_filter.genPartFlav, 2)
     # Define correction set_id
-    cset = correctionlib.CorrectionSet.from_file(
-        get_pog_json(json_name="tau", year=year + year_mod)
-    )
-    SF = cset["tau_energy_scale"].evaluate(pt, eta, dm, genmatch, id, sys)
-    taus_new_pt = taus_filter.pt * SF
-    taus_new_mass = taus_filter.mass * SF
-    new_tau_pt = ak.where(mask, taus_new_pt, taus_flatten.pt)
-    new_tau_mass = ak.where(mask, taus_new_mass, taus_flatten.mass)
+    cset = get_correction_set(json_name="tau", year=year + year_mod)
+    # the energy scale is only evaluated for the masked taus (1 for the others)
+    sf = get_object_sfs(
+        cset["tau_energy_scale"],
+        inputs=[
+            taus_flatten.pt,
+            taus_flatten.eta,
+            taus_flatten.decayMode,
+            taus_flatten.genPartFlav,
+            id,
+            SYST,
+        ],
+        systematics=[sys],
+        in_limit_mask=mask,
+    )[0]
     # We have to unflatten the taus
-    tau_pt = ak.unflatten(new_tau_pt, ntaus)
-    tau_mass = ak.unflatten(new_tau_mass, ntaus)
+    tau_pt = ak.unflatten(ak.to_numpy(taus_flatten.pt) * sf, ntaus)
+    tau_mass = ak.unflatten(ak.to_numpy(taus_flatten.mass) * sf, ntaus)
     return tau_pt, tau_mass
 
 
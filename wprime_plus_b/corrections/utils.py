@@ -10,6 +10,8 @@ from typing import Type, Tuple
 from coffea.lookup_tools import extractor
 from coffea.analysis_tools import Weights
 from coffea.nanoevents.methods.base import NanoEventsArray
+from wprime_plus_b.corrections import registry
+from wprime_plus_b.corrections.sf_table import get_table, load_correction_json
 
 
 # CorrectionLib files are available from
@@ -52,19 +54,157 @@ def get_pog_json(json_name: str, year: str) -> str:
     return f"{POG_CORRECTION_PATH}/POG/{pog_json[0]}/{pog_years[year]}/{pog_json[1]}"
 
 
-def unflat_sf(sf: ak.Array, in_limit_mask: ak.Array, n: ak.Array):
+def get_correction_set(json_name: str, year: str) -> correctionlib.CorrectionSet:
     """
-    get scale factors for in-limit objects (otherwise assign 1).
-    Unflat array to original shape and multiply scale factors event-wise
+    returns the pog correction set, parsed once per worker process
 
     Parameters:
     -----------
-        sf:
-            Array with 1D scale factors
+        json_name:
+            json name {'muon', 'electron', 'tau', 'pileup', 'btag', 'met', 'pujetid'}
+        year:
+            dataset year {'2016APV', '2016', '2017', '2018'}
+    """
+    return registry.get(
+        payload=json_name,
+        year=year,
+        loader=lambda: correctionlib.CorrectionSet.from_file(
+            get_pog_json(json_name=json_name, year=year)
+        ),
+    )
+
+
+# placeholder for the systematic argument of a correction (see 'get_object_sfs')
+SYST = "__syst__"
+
+
+def get_correction_payload(json_name: str, year: str, name: str) -> dict:
+    """
+    returns the JSON definition of a pog correction (see 'get_object_sfs')
+
+    Parameters:
+    -----------
+        json_name:
+            json name {'muon', 'electron', 'tau', 'pileup', 'btag', 'met', 'pujetid'}
+        year:
+            dataset year {'2016APV', '2016', '2017', '2018'}
+        name:
+            correction name
+    """
+    return load_correction_json(get_pog_json(json_name=json_name, year=year))[name]
+
+
+def get_object_sfs(
+    correction: correctionlib.highlevel.Correction,
+    inputs: list,
+    systematics: list,
+    in_limit_mask: ak.Array,
+    payload: dict = None,
+) -> np.ndarray:
+    """
+    evaluate a correction for the in-limit objects of a flat collection, for several
+    systematics at once. Out-of-limit objects get a scale factor of 1.
+
+    If the JSON definition of the correction is given and every systematic is a binned
+    correction with the same binning, the bins of the objects are found once and the
+    values of all the systematics are gathered together (see 'sf_table'). Otherwise,
+    the correction is evaluated once per systematic.
+
+    Parameters:
+    -----------
+        correction:
+            correctionlib correction
+        inputs:
+            correction inputs: flat object arrays (only their in-limit entries are
+            evaluated), scalars, and 'SYST' in place of the systematic name
+        systematics:
+            systematic names, in the order of the output rows
         in_limit_mask:
-            Array mask for events with objects within correction limits
-        n:
-            Array with number of objects per event
+            flat mask of the objects within the correction limits
+        payload:
+            JSON definition of the correction (see 'get_correction_payload')
+
+    Returns:
+    --------
+        array of shape (len(systematics), number of objects)
+    """
+    in_limit_mask = np.asarray(ak.to_numpy(in_limit_mask), dtype=bool)
+    sfs = np.ones((len(systematics), len(in_limit_mask)))
+    if not np.any(in_limit_mask):
+        return sfs
+    args = [
+        ak.to_numpy(arg)[in_limit_mask]
+        if isinstance(arg, (ak.Array, np.ndarray))
+        else arg
+        for arg in inputs
+    ]
+    is_syst = [isinstance(arg, str) and arg == SYST for arg in args]
+    if payload is not None and any(is_syst):
+        names = [variable["name"] for variable in payload["inputs"]]
+        scalars, arrays = {}, {}
+        for name, arg, syst_arg in zip(names, args, is_syst):
+            if isinstance(arg, np.ndarray):
+                arrays[name] = arg
+            elif not syst_arg:
+                scalars[name] = arg
+        table = get_table(payload, scalars, names[is_syst.index(True)], systematics)
+        values = table.evaluate(arrays) if table is not None else None
+        if values is not None:
+            sfs[:, in_limit_mask] = values
+            return sfs
+    for i, syst in enumerate(systematics):
+        sfs[i, in_limit_mask] = correction.evaluate(
+            *[syst if syst_arg else arg for arg, syst_arg in zip(args, is_syst)]
+        )
+    return sfs
+
+
+def prod_per_event(sfs: np.ndarray, counts: ak.Array) -> np.ndarray:
+    """
+    multiply the object scale factors of each event (segmented product over the objects)
+
+    Parameters:
+    -----------
+        sfs:
+            object scale factors of shape (number of systematics, number of objects)
+        counts:
+            number of objects per event
+
+    Returns:
+    --------
+        array of shape (number of systematics, number of events)
     """
-    sf = ak.where(in_limit_mask, sf, ak.ones_like(sf))
-    return ak.fill_none(ak.prod(ak.unflatten(sf, n), axis=1), value=1)
\ No newline at end of file
+    counts = np.asarray(ak.to_numpy(counts), dtype=np.int64)
+    if len(counts) == 0:
+        return np.ones((len(sfs), 0))
+    starts = np.zeros(len(counts), dtype=np.int64)
+    np.cumsum(counts[:-1], out=starts[1:])
+    # a trailing column of ones keeps every start index valid for reduceat
+    padded = np.concatenate([sfs, np.ones((len(sfs), 1))], axis=1)
+    event_sfs = np.multiply.reduceat(padded, starts, axis=1)
+    # reduceat returns the start element for empty segments
+    event_sfs[:, counts == 0] = 1.0
+    return event_sfs
+
+
+def get_systematics(systematics: list, variation: str) -> list:
+    """
+    return the (nominal, up, down) systematic names if 'variation' is 'nominal',
+    otherwise only the nominal one
+    """
+    return systematics if variation == "nominal" else systematics[:1]
+
+
+def add_event_sfs(weights: Type[Weights], name: str, event_sfs: np.ndarray) -> None:
+    """
+    add event scale factors to a weights container: (nominal,) or (nominal, up, down)
+    """
+    if len(event_sfs) == 3:
+        weights.add(
+            name=name,
+            weight=event_sfs[0],
+            weightUp=event_sfs[1],
+            weightDown=event_sfs[2],
+        )
+    else:
+        weights.add(name=name, weight=event_sfs[0])
@@ -0,0 +1,174 @@
+"""
+Cutflows and N-1 yields from the selection store written by TtbarAnalysis
+('selection_location'), without reading the NanoAOD again
+
+usage:
+    python -m wprime_plus_b.postprocessor.cutflow --path <selection_location>/<dataset> --region 2b1l_ele
+    python -m wprime_plus_b.postprocessor.cutflow --path <...> --region 2b1l_ele --drop met_pt,tau_veto
+    python -m wprime_plus_b.postprocessor.cutflow --path <...> --region 2b1l_ele --cuts goodvertex,lumi,two_bjets
+"""
+import glob
+import json
+import argparse
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from wprime_plus_b.processors.utils.selection_store import STORE_METADATA_KEY
+
+
+def get_store_files(path: str) -> list:
+    """return the selection store files below 'path'"""
+    return sorted(glob.glob(f"{path}/**/*.parquet", recursive=True))
+
+
+def get_store_metadata(fname: str) -> dict:
+    """return the store metadata of a selection store file"""
+    return json.loads(pq.read_schema(fname).metadata[STORE_METADATA_KEY])
+
+
+def bit_mask(bits: list) -> np.uint64:
+    """return the uint64 with the given bits set"""
+    mask = np.uint64(0)
+    for bit in bits:
+        mask |= np.uint64(1) << np.uint64(bit)
+    return mask
+
+
+def compute_yields(path: str, region: str, queries: dict) -> pd.DataFrame:
+    """
+    return the raw and weighted number of events passing each set of cuts of a region,
+    reading the selection store one file at a time.
+
+    Events rejected by the pre-selection only store the selections evaluated on the
+    whole chunk (good vertex, lumi, triggers, trigger matching, MET filters). The
+    'unresolved' column counts those events that pass every such cut of a query that
+    also contains other cuts: their yield is missing, so it is a lower bound if non-zero.
+
+    Parameters:
+    -----------
+        path:
+            selection store directory (or a dataset directory inside it)
+        region:
+            region name (e.g. '2b1l_ele')
+        queries:
+            dictionary with query names as keys and lists of region cut names as values
+    """
+    results = {
+        name: {"nevents": 0, "sumw": 0.0, "sumw2": 0.0, "unresolved": 0}
+        for name in queries
+    }
+    masks = None
+    for fname in get_store_files(path):
+        metadata = get_store_metadata(fname)
+        if region not in metadata["regions"]:
+            # e.g. data streams that do not fill the region
+            continue
+        if masks is None:
+            bit = {name: i for i, name in enumerate(metadata["selection_names"])}
+            selection_names = metadata["regions"][region]
+            masks = {}
+            for name, cuts in queries.items():
+                for cut in cuts:
+                    if cut not in selection_names:
+                        raise ValueError(
+                            f"Unknown cut '{cut}'. Available cuts are: {list(selection_names)}"
+                        )
+                selections = [selection_names[cut] for cut in cuts]
+                chunk_selections = [
+                    s for s in selections if s in metadata["chunk_selections"]
+                ]
+                masks[name] = (
+                    bit_mask([bit[s] for s in selections]),
+                    bit_mask([bit[s] for s in chunk_selections]),
+                    len(chunk_selections) < len(selections),
+                )
+        table = pq.read_table(
+            fname, columns=["selection", "evaluated", f"weight_{region}"]
+        )
+        bits = table["selection"].to_numpy()
+        evaluated = table["evaluated"].to_numpy()
+        weights = table[f"weight_{region}"].to_numpy()
+        for name, (mask, chunk_mask, needs_evaluation) in masks.items():
+            passed = (bits & mask) == mask
+            results[name]["nevents"] += int(np.sum(passed))
+            results[name]["sumw"] += float(np.sum(weights[passed]))
+            results[name]["sumw2"] += float(np.sum(weights[passed] ** 2))
+            if needs_evaluation:
+                candidates = (bits & chunk_mask) == chunk_mask
+                results[name]["unresolved"] += int(np.sum(candidates & ~evaluated))
+    return pd.DataFrame.from_dict(results, orient="index")
+
+
+def get_region_cuts(path: str, region: str) -> list:
+    """return the cut names of a region, in selection order"""
+    for fname in get_store_files(path):
+        metadata = get_store_metadata(fname)
+        if region in metadata["regions"]:
+            return list(metadata["regions"][region])
+    raise ValueError(f"No selection store files found for region '{region}' in {path}")
+
+
+def cutflow(path: str, region: str) -> pd.DataFrame:
+    """return the cumulative yields after each cut of a region"""
+    cuts = get_region_cuts(path, region)
+    return compute_yields(
+        path, region, {cut: cuts[: i + 1] for i, cut in enumerate(cuts)}
+    )
+
+
+def n_minus_one(path: str, region: str) -> pd.DataFrame:
+    """return the yields with all the cuts of a region but one"""
+    cuts = get_region_cuts(path, region)
+    queries = {"all": cuts}
+    queries.update({f"no {cut}": [c for c in cuts if c != cut] for cut in cuts})
+    return compute_yields(path, region, queries)
+
+
+def main(args):
+    pd.set_option("display.max_rows", None)
+    if args.cuts:
+        cuts = args.cuts.split(",")
+        print(compute_yields(args.path, args.region, {",".join(cuts): cuts}))
+    elif args.drop:
+        drop = args.drop.split(",")
+        cuts = [c for c in get_region_cuts(args.path, args.region) if c not in drop]
+        print(compute_yields(args.path, args.region, {f"no {args.drop}": cuts}))
+    else:
+        print("cutflow")
+        print(cutflow(args.path, args.region))
+        print("\nN-1")
+        print(n_minus_one(args.path, args.region))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--path",
+        dest="path",
+        type=str,
+        required=True,
+        help="selection store directory (or a dataset directory inside it)",
+    )
+    parser.add_argument(
+        "--region",
+        dest="region",
+        type=str,
+        required=True,
+        help="region name (e.g. '2b1l_ele')",
+    )
+    parser.add_argument(
+        "--cuts",
+        dest="cuts",
+        type=str,
+        default="",
+        help="comma separated cuts: print the yield with these cuts only",
+    )
+    parser.add_argument(
+        "--drop",
+        dest="drop",
+        type=str,
+        default="",
+        help="comma separated cuts: print the yield with every region cut but these",
+    )
+    args = parser.parse_args()
+    main(args)
@@ -1,8 +1,8 @@
 import glob
-import copy
 import pickle
 import numpy as np
 from coffea import processor
+from wprime_plus_b.processors.utils.histograms import empty_like
 
 
 def open_output(output_fname: str) -> dict:
@@ -47,7 +47,7 @@ def fill_histograms(
     """fill hist histograms using accumulated outputs"""
     filled_histograms = {}
     for sample, values in accumulated_outputs.items():
-        histograms = copy.deepcopy(hist_histograms)
+        histograms = {kin: empty_like(hist_histograms[kin]) for kin in hist_histograms}
         sample_weight = values["weights"].value
         weight = sample_weight if weighted else np.ones_like(sample_weight)
         filled_histograms[sample] = {}
@@ -77,10 +77,11 @@ def scale_histograms(histograms: dict, lumi_weights: dict) -> dict:
     for sample in histograms:
         scaled_histograms[sample] = {}
         for kin in histograms[sample]:
-            histogram = copy.deepcopy(histograms[sample][kin])
+            histogram = histograms[sample][kin]
             if sample in ["SingleMuon", "SingleElectron"]:
                 scaled_histograms[sample][kin] = histogram
             else:
+                # scaling returns a new histogram
                 scaled_histograms[sample][kin] = histogram * lumi_weights[sample]
     return scaled_histograms
 
@@ -3,7 +3,12 @@ import hist
 import importlib.resources
 import awkward as ak
 from coffea import processor
-from wprime_plus_b.processors.utils.analysis_utils import normalize
+from wprime_plus_b.processors.utils.analysis_utils import (
+    normalize,
+    get_partition_key,
+    write_parquet_partition,
+)
+from wprime_plus_b.processors.utils.columns import get_required_columns
 
 class BTagEfficiencyProcessor(processor.ProcessorABC):
     """
@@ -19,17 +24,28 @@ class BTagEfficiencyProcessor(processor.ProcessorABC):
             tagger name {'deepJet', 'deepCSV'}
         wp:
             worging point {'L', 'M', 'T'}
+        output_type:
+            output object type {'hist', 'array'}
+        output_location:
+            parquet dataset directory (required for 'array' output)
     """
-    def __init__(self, year="2017", yearmod="", tagger="deepJet", wp="M", output_type="hist"):
+    def __init__(self, year="2017", yearmod="", tagger="deepJet", wp="M", output_type="hist", output_location=None):
         self._year = year + yearmod
         self._tagger = tagger
         self._wp = wp
         self._output_type = output_type
+        self._output_location = output_location
+        if self._output_type == "array" and self._output_location is None:
+            raise ValueError("'output_location' is required for 'array' output")
         
         with importlib.resources.path("wprime_plus_b.data", "btagWPs.json") as path:
             with open(path, "r") as handle:
                 btagWPs = json.load(handle)
         self._btagwp = btagWPs[self._tagger][self._year][self._wp]
+        # NanoAOD branches read by the processor
+        self.columns = get_required_columns(
+            year=year, objects=["jets"], corrections=["btag"]
+        )
         
         self.make_output = lambda: hist.Hist(
             hist.axis.StrCategory([], growth=True, name="dataset"),
@@ -66,20 +82,22 @@ class BTagEfficiencyProcessor(processor.ProcessorABC):
             out["histograms"] = output
         
         elif self._output_type == "array":
-            # select variables and put them in column accumulators
+            # write selected variables to parquet
             features = {
                 "pt": ak.flatten(jets.pt),
                 "abseta": ak.flatten(abs(jets.eta)),
                 "flavor": ak.flatten(jets.hadronFlavour),
                 "pass_wp": ak.flatten(passbtag),
             }
-            output = {
-                feature_name: processor.column_accumulator(
-                    normalize(feature_array)
-                )
-                for feature_name, feature_array in features.items()
-            }
-            out["arrays"] = output
+            out["manifest"] = write_parquet_partition(
+                features={
+                    feature_name: normalize(feature_array)
+                    for feature_name, feature_array in features.items()
+                },
+                output_location=self._output_location,
+                dataset=dataset,
+                partition_key=get_partition_key(events),
+            )
         
         return {dataset: out}
 
@@ -0,0 +1,50 @@
+from coffea import processor
+from wprime_plus_b.processors.utils.chunk_cache import chunk_cache
+from wprime_plus_b.processors.utils.disk_cache import disk_cache
+
+
+class MultiAnalysisProcessor(processor.ProcessorABC):
+    """
+    Run several analysis processors over a single read of each chunk
+
+    The corrected objects (JEC/JER jets and MET, Rochester muons, tau energy scale)
+    and the common weights (genweight, l1prefiring, pileup) are computed once per
+    chunk and shared by every analysis (see 'chunk_cache'). The output of each
+    analysis is stored under its own key. The disk cache is configured by the
+    wrapper, so the cache settings of the analyses are not used.
+
+    Parameters:
+    -----------
+    processors:
+        dictionary with analysis names as keys and processor instances as values,
+        e.g. {'ttbar': TtbarAnalysis(...), 'ztoll': ZToLLProcessor(...)}
+    cache_location:
+        directory of the disk cache of corrected objects and event weights (disabled if None)
+    cache_budget:
+        disk budget of the cache in GB
+    """
+
+    def __init__(
+        self, processors: dict, cache_location: str = None, cache_budget: float = 10
+    ):
+        self._processors = processors
+        self._cache_location = cache_location
+        self._cache_budget = cache_budget
+        # NanoAOD branches read by any of the analyses
+        self.columns = sorted(
+            set().union(*(p.columns for p in self._processors.values()))
+        )
+
+    def process(self, events):
+        # get dataset name
+        dataset = events.metadata["dataset"]
+        # read (and keep) the corrected objects in the disk cache, if any
+        disk_cache.configure(self._cache_location, self._cache_budget)
+        output = {}
+        with chunk_cache.activate(events):
+            for name, processor_instance in self._processors.items():
+                output[name] = processor_instance.process(events)[dataset]
+        return {dataset: output}
+
+    def postprocess(self, accumulator):
+        return accumulator
@@ -1,20 +1,34 @@
 import json
 import copy
-import pickle
 import numpy as np
 import awkward as ak
 import importlib.resources
 from coffea import processor
-from coffea.analysis_tools import PackedSelection, Weights
+from coffea.analysis_tools import PackedSelection
 from wprime_plus_b.processors.utils import histograms
-from wprime_plus_b.corrections.jec import jet_corrections
-from wprime_plus_b.corrections.met import met_phi_corrections
+from wprime_plus_b.processors.utils.lumi_mask import get_lumi_mask
+from wprime_plus_b.processors.utils.columns import get_required_columns
+from wprime_plus_b.processors.utils.disk_cache import disk_cache
+from wprime_plus_b.processors.utils.cutflow import (
+    compute_cutflow,
+    cumulative_sumw,
+    get_weight_variations,
+)
+from wprime_plus_b.processors.utils.selection_store import pack_selection_bits
+from wprime_plus_b.corrections.met import (
+    met_phi_corrections,
+    get_met_shift,
+    propagate_met,
+)
 from wprime_plus_b.corrections.btag import BTagCorrector
-from wprime_plus_b.corrections.pileup import add_pileup_weight
-from wprime_plus_b.corrections.l1prefiring import add_l1prefiring_weight
 from wprime_plus_b.corrections.pujetid import add_pujetid_weight
-from wprime_plus_b.corrections.tau_energy import tau_energy_scale, met_corrected_tes
 from wprime_plus_b.processors.utils.analysis_utils import delta_r_mask, normalize
+from wprime_plus_b.processors.utils.chunk_cache import (
+    chunk_cache,
+    get_common_weights,
+    get_jet_corrections,
+    get_tau_energy_scale,
+)
 from wprime_plus_b.selections.qcd.jet_selection import select_good_bjets
 from wprime_plus_b.corrections.lepton import (
     ElectronCorrector,
@@ -51,7 +65,13 @@ class QcdAnalysis(processor.ProcessorABC):
     syst:
         systematics to apply
     output_type:
-
+        output object type {'hist'}
+    cache_location:
+        directory of the disk cache of corrected objects and event weights (disabled if None)
+    cache_budget:
+        disk budget of the cache in GB
+    weights_dtype:
+        dtype of the stored event weights {'float64', 'float32'} (see 'CompactWeights')
     """
 
     def __init__(
@@ -61,23 +81,152 @@ class QcdAnalysis(processor.ProcessorABC):
         year: str = "2017",
         yearmod: str = "",
         output_type: str = "hist",
+        cache_location: str = None,
+        cache_budget: float = 10,
+        weights_dtype: str = "float64",
     ):
         self._channel = channel
         self._year = year
+        self._cache_location = cache_location
+        self._cache_budget = cache_budget
+        self._weights_dtype = weights_dtype
         self._yearmod = yearmod
         self._lepton_flavor = lepton_flavor
         self._output_type = output_type
 
-        # initialize dictionary of hists for control regions
-        self.hist_dict = {
-            "met_kin": histograms.qcd_met_hist,
-            "lepton_bjet_kin": histograms.qcd_lepton_bjet_hist,
-            "lepton_met_kin": histograms.qcd_lepton_met_hist,
-            "lepton_met_bjet_kin": histograms.qcd_lepton_met_bjet_hist,
-        }
+        # histogram specs for control regions
+        self.hist_specs = histograms.qcd_hist_specs
         # define dictionary to store analysis variables
         self.features = {}
 
+        # load triggers and MET filters once (they do not depend on the chunk)
+        with importlib.resources.path("wprime_plus_b.data", "triggers.json") as path:
+            with open(path, "r") as handle:
+                self._triggers = json.load(handle)[self._year]
+        with importlib.resources.path(
+            "wprime_plus_b.data", "metfilters.json"
+        ) as path:
+            with open(path, "r") as handle:
+                self._metfilters = json.load(handle)[self._year]
+
+        # NanoAOD branches read by the processor
+        self.columns = get_required_columns(
+            year=self._year,
+            objects=["electrons", "muons", "taus", "jets", "met"],
+            corrections=[
+                "jec",
+                "met_phi",
+                "tau_energy",
+                "pileup",
+                "l1prefiring",
+                "pujetid",
+                "btag",
+                "tau_sf",
+            ],
+            trigger_flavors=["ele", "mu"],
+            metfilters=True,
+        )
+
+        # define selection regions for each channel
+        self._region_selections = {
+            "A": {
+                "ele": [
+                    "goodvertex",
+                    "lumi",
+                    "trigger_ele",
+                    "metfilters",
+                    "high_met_pt",
+                    "one_bjet",
+                    "tau_veto",
+                    "muon_veto",
+                    "one_electron",
+                ],
+                "mu": [
+                    "goodvertex",
+                    "lumi",
+                    "trigger_mu",
+                    "metfilters",
+                    "high_met_pt",
+                    "one_bjet",
+                    "tau_veto",
+                    "electron_veto",
+                    "one_muon",
+                ],
+            },
+            "B": {
+                "ele": [
+                    "goodvertex",
+                    "lumi",
+                    "trigger_ele",
+                    "metfilters",
+                    "high_met_pt",
+                    "one_bjet",
+                    "tau_veto",
+                    "muon_veto",
+                    "one_electron",
+                ],
+                "mu": [
+                    "goodvertex",
+                    "lumi",
+                    "trigger_mu",
+                    "metfilters",
+                    "high_met_pt",
+                    "one_bjet",
+                    "tau_veto",
+                    "electron_veto",
+                    "one_muon",
+                ],
+            },
+            "C": {
+                "ele": [
+                    "goodvertex",
+                    "lumi",
+                    "trigger_ele",
+                    "metfilters",
+                    "low_met_pt",
+                    "one_bjet",
+                    "tau_veto",
+                    "muon_veto",
+                    "one_electron",
+                ],
+                "mu": [
+                    "goodvertex",
+                    "lumi",
+                    "trigger_mu",
+                    "metfilters",
+                    "low_met_pt",
+                    "one_bjet",
+                    "tau_veto",
+                    "electron_veto",
+                    "one_muon",
+                ],
+            },
+            "D": {
+                "ele": [
+                    "goodvertex",
+                    "lumi",
+                    "trigger_ele",
+                    "metfilters",
+                    "low_met_pt",
+                    "one_bjet",
+                    "tau_veto",
+                    "muon_veto",
+                    "one_electron",
+                ],
+                "mu": [
+                    "goodvertex",
+                    "lumi",
+                    "trigger_mu",
+                    "metfilters",
+                    "low_met_pt",
+                    "one_bjet",
+                    "tau_veto",
+                    "electron_veto",
+                    "one_muon",
+                ],
+            },
+        }
+
     def add_feature(self, name: str, var: ak.Array) -> None:
         """add a variable array to the out dictionary"""
         self.features = {**self.features, name: var}
@@ -89,6 +238,10 @@ class QcdAnalysis(processor.ProcessorABC):
 
         # get dataset name
         dataset = events.metadata["dataset"]
+        # read (and keep) the corrected objects in the disk cache, if any. Within
+        # 'MultiAnalysisProcessor' the cache is configured by the wrapper
+        if not chunk_cache.is_active(events):
+            disk_cache.configure(self._cache_location, self._cache_budget)
 
         # get number of events before selection
         nevents = len(events)
@@ -97,12 +250,12 @@ class QcdAnalysis(processor.ProcessorABC):
         # check if sample is MC
         self.is_mc = hasattr(events, "genWeight")
 
-        # create copies of histogram objects
-        hist_dict = copy.deepcopy(self.hist_dict)
+        # build empty histograms
+        hist_dict = histograms.build_histograms(self.hist_specs)
 
         # apply JEC/JER corrections to jets (in data, the corrections are already applied)
         if self.is_mc:
-            corrected_jets, met = jet_corrections(events, self._year + self._yearmod)
+            corrected_jets, met = get_jet_corrections(events, self._year + self._yearmod)
         else:
             corrected_jets, met = events.Jet, events.MET
         # apply MET phi corrections
@@ -121,16 +274,137 @@ class QcdAnalysis(processor.ProcessorABC):
         corrected_taus = events.Tau
         if self.is_mc:
             # Data does not have corrections
-            corrected_taus["pt"], corrected_taus["mass"] = tau_energy_scale(
+            corrected_taus["pt"], corrected_taus["mass"] = get_tau_energy_scale(
                 events, "2017", "", "DeepTau2017v2p1", "nom"
             )
             # Given the tau corrections. We need to recalculate the MET.
             # https://github.com/columnflow/columnflow/blob/16d35bb2f25f62f9110a8f1089e8dc5c62b29825/columnflow/calibration/util.py#L42
             # https://github.com/Katsch21/hh2bbtautau/blob/e268752454a0ce0089ff08cc6c373a353be77679/hbt/calibration/tau.py#L117
-            met["pt"], met["phi"] = met_corrected_tes(
-                old_taus=events.Tau, new_taus=corrected_taus, met=met
+            met["pt"], met["phi"] = propagate_met(
+                met_pt,
+                met_phi,
+                get_met_shift([(events.Tau, corrected_taus)], len(events)),
             )
         
+        # --------------------------------------------------
+        # region-independent event weights (computed once)
+        # --------------------------------------------------
+        # genweight, l1prefiring and pileup (shared with other analyses, see 'chunk_cache')
+        shared_weights = get_common_weights(
+            events, self.is_mc, self._year, self._yearmod, self._weights_dtype
+        )
+        if self.is_mc:
+            # add pujetid weigths
+            add_pujetid_weight(
+                jets=corrected_jets,
+                genjets=events.GenJet,
+                weights=shared_weights,
+                year=self._year,
+                year_mod=self._yearmod,
+                working_point="M",
+                variation="nominal",
+            )
+            # b-tagging corrector
+            btag_corrector = BTagCorrector(
+                jets=corrected_jets,
+                weights=shared_weights,
+                sf_type="comb",
+                worging_point="M",
+                tagger="deepJet",
+                year=self._year,
+                year_mod=self._yearmod,
+                full_run=False,
+                variation="nominal",
+            )
+            # add b-tagging weights
+            btag_corrector.add_btag_weights(flavor="bc")
+
+            """
+            # electron corrector
+            electron_corrector = ElectronCorrector(
+                electrons=events.Electron,
+                weights=shared_weights,
+                year=self._year,
+                year_mod=self._yearmod,
+                variation="nominal",
+            )
+            # add electron ID weights
+            electron_corrector.add_id_weight(
+                id_working_point="wp90iso"
+            )
+            # add electron reco weights
+            electron_corrector.add_reco_weight()
+
+            # muon corrector
+
+            muon_corrector = MuonCorrector(
+                muons=events.Muon,
+                weights=shared_weights,
+                year=self._year,
+                year_mod=self._yearmod,
+                variation="nominal",
+                id_wp="tight",
+                iso_wp="tight"
+            )
+            # add muon ID weights
+            muon_corrector.add_id_weight()
+
+            # add muon iso weights
+            muon_corrector.add_iso_weight()
+
+            # add trigger weights
+            if self._lepton_flavor == "mu":
+                muon_corrector.add_triggeriso_weight()
+            """
+        # --------------------------------------------------
+        # region-independent objects and masks (computed once)
+        # --------------------------------------------------
+        # select good electrons (the electron selection is the same for every region)
+        good_electrons = select_good_electrons(
+            events=events,
+            region=self._channel,
+        )
+        electrons = events.Electron[good_electrons]
+
+        shared_selections = {}
+        # add luminosity calibration mask (only to data)
+        if not self.is_mc:
+            lumi_mask = get_lumi_mask(self._year, events.run, events.luminosityBlock)
+        else:
+            lumi_mask = np.ones(len(events), dtype="bool")
+        shared_selections["lumi"] = lumi_mask
+
+        # add lepton triggers masks
+        trigger = {}
+        for ch in ["ele", "mu"]:
+            trigger[ch] = np.zeros(nevents, dtype="bool")
+            for t in self._triggers[ch]:
+                if t in events.HLT.fields:
+                    trigger[ch] = trigger[ch] | events.HLT[t]
+        shared_selections["trigger_ele"] = trigger["ele"]
+        shared_selections["trigger_mu"] = trigger["mu"]
+
+        # add MET filters mask
+        metfilters = np.ones(nevents, dtype="bool")
+        metfilterkey = "mc" if self.is_mc else "data"
+        for mf in self._metfilters[metfilterkey]:
+            if mf in events.Flag.fields:
+                metfilters = metfilters & events.Flag[mf]
+        shared_selections["metfilters"] = metfilters
+
+        # cuts on MET
+        shared_selections["high_met_pt"] = met.pt > 50
+        shared_selections["low_met_pt"] = met.pt < 50
+
+        # add number of electrons
+        shared_selections["one_electron"] = ak.num(electrons) == 1
+        shared_selections["electron_veto"] = ak.num(electrons) == 0
+
+        # add cut on good vertices number
+        shared_selections["goodvertex"] = events.PV.npvsGood > 0
+
+        # regions with the same tau working points share their weights
+        region_weights = {}
         for region in ["A", "B", "C", "D"]:
             if self._channel != "all":
                 if region != self._channel:
@@ -141,111 +415,39 @@ class QcdAnalysis(processor.ProcessorABC):
             # --------------------
             # event weights vector
             # --------------------
-            weights_container = Weights(len(events), storeIndividual=True)
-            if self.is_mc:
-                # add gen weigths
-                weights_container.add("genweight", events.genWeight)
-                # add l1prefiring weigths
-                add_l1prefiring_weight(events, weights_container, self._year, "nominal")
-                # add pileup weigths
-                add_pileup_weight(
-                    events, weights_container, self._year, self._yearmod, "nominal"
-                )
-                # add pujetid weigths
-                add_pujetid_weight(
-                    jets=corrected_jets,
-                    weights=weights_container,
-                    year=self._year,
-                    year_mod=self._yearmod,
-                    working_point="M",
-                    variation="nominal",
-                )
-                # b-tagging corrector
-                btag_corrector = BTagCorrector(
-                    jets=corrected_jets,
-                    weights=weights_container,
-                    sf_type="comb",
-                    worging_point="M",
-                    tagger="deepJet",
-                    year=self._year,
-                    year_mod=self._yearmod,
-                    full_run=False,
-                    variation="nominal",
-                )
-                # add b-tagging weights
-                btag_corrector.add_btag_weights(flavor="bc")
-
-                # tau corrections
-                tau_corrector = TauCorrector(
-                    taus=corrected_taus,
-                    weights=weights_container,
-                    year=self._year,
-                    year_mod=self._yearmod,
-                    tau_vs_jet=qcd_tau_selection[region][self._lepton_flavor][
-                        "tau_vs_jet"
-                    ],
-                    tau_vs_ele=qcd_tau_selection[region][self._lepton_flavor][
-                        "tau_vs_ele"
-                    ],
-                    tau_vs_mu=qcd_tau_selection[region][self._lepton_flavor][
-                        "tau_vs_mu"
-                    ],
-                    variation="nominal",
-                )
-                tau_corrector.add_id_weight_DeepTau2017v2p1VSe()
-                tau_corrector.add_id_weight_DeepTau2017v2p1VSmu()
-                tau_corrector.add_id_weight_DeepTau2017v2p1VSjet()
-
-                """
-                # electron corrector
-                electron_corrector = ElectronCorrector(
-                    electrons=events.Electron,
-                    weights=weights_container,
-                    year=self._year,
-                    year_mod=self._yearmod,
-                    variation="nominal",
-                )
-                # add electron ID weights
-                electron_corrector.add_id_weight(
-                    id_working_point="wp90iso"
-                )
-                # add electron reco weights
-                electron_corrector.add_reco_weight()
-
-                # muon corrector
-
-                muon_corrector = MuonCorrector(
-                    muons=events.Muon,
-                    weights=weights_container,
-                    year=self._year,
-                    year_mod=self._yearmod,
-                    variation="nominal",
-                    id_wp="tight",
-                    iso_wp="tight"
-                )
-                # add muon ID weights
-                muon_corrector.add_id_weight()
-
-                # add muon iso weights
-                muon_corrector.add_iso_weight()
+            tau_wps = tuple(
+                qcd_tau_selection[region][self._lepton_flavor][wp]
+                for wp in ["tau_vs_jet", "tau_vs_ele", "tau_vs_mu"]
+            )
+            if tau_wps not in region_weights:
+                # add region-dependent weights on top of the shared ones
+                weights_container = copy.deepcopy(shared_weights)
+                if self.is_mc:
+                    # tau corrections
+                    tau_corrector = TauCorrector(
+                        taus=corrected_taus,
+                        weights=weights_container,
+                        year=self._year,
+                        year_mod=self._yearmod,
+                        tau_vs_jet=tau_wps[0],
+                        tau_vs_ele=tau_wps[1],
+                        tau_vs_mu=tau_wps[2],
+                        variation="nominal",
+                    )
+                    tau_corrector.add_id_weight_DeepTau2017v2p1VSe()
+                    tau_corrector.add_id_weight_DeepTau2017v2p1VSmu()
+                    tau_corrector.add_id_weight_DeepTau2017v2p1VSjet()
+                region_weights[tau_wps] = weights_container
+            weights_container = region_weights[tau_wps]
 
-                # add trigger weights
-                if self._lepton_flavor == "mu":
-                    muon_corrector.add_triggeriso_weight()
-                """
             # save sum of weights before selections
             output["metadata"][region]["sumw"] = ak.sum(weights_container.weight())
+            # memory footprint of the weights container of each chunk
+            output["metadata"][region]["weights_nbytes"] = [weights_container.nbytes]
         
             # ------------------
             # leptons
             # -------------------
-            # select good electrons
-            good_electrons = select_good_electrons(
-                events=events,
-                region=region,
-            )
-            electrons = events.Electron[good_electrons]
-
             # select good muons
             good_muons = select_good_muons(
                 events=events,
@@ -310,169 +512,35 @@ class QcdAnalysis(processor.ProcessorABC):
             # ---------------
             # make a PackedSelection object to store selection masks
             self.selections = PackedSelection()
-            
-            # add luminosity calibration mask (only to data)
-            with importlib.resources.path(
-                "wprime_plus_b.data", "lumi_masks.pkl"
-            ) as path:
-                with open(path, "rb") as handle:
-                    self._lumi_mask = pickle.load(handle)
-            if not self.is_mc:
-                lumi_mask = self._lumi_mask[self._year](
-                    events.run, events.luminosityBlock
-                )
-            else:
-                lumi_mask = np.ones(len(events), dtype="bool")
-            self.selections.add("lumi", lumi_mask)
-
-            # add lepton triggers masks
-            with importlib.resources.path(
-                "wprime_plus_b.data", "triggers.json"
-            ) as path:
-                with open(path, "r") as handle:
-                    self._triggers = json.load(handle)[self._year]
-            trigger = {}
-            for ch in ["ele", "mu"]:
-                trigger[ch] = np.zeros(nevents, dtype="bool")
-                for t in self._triggers[ch]:
-                    if t in events.HLT.fields:
-                        trigger[ch] = trigger[ch] | events.HLT[t]
-            self.selections.add("trigger_ele", trigger["ele"])
-            self.selections.add("trigger_mu", trigger["mu"])
-
-            # add MET filters mask
-            with importlib.resources.path(
-                "wprime_plus_b.data", "metfilters.json"
-            ) as path:
-                with open(path, "r") as handle:
-                    self._metfilters = json.load(handle)[self._year]
-            metfilters = np.ones(nevents, dtype="bool")
-            metfilterkey = "mc" if self.is_mc else "data"
-            for mf in self._metfilters[metfilterkey]:
-                if mf in events.Flag.fields:
-                    metfilters = metfilters & events.Flag[mf]
-            self.selections.add("metfilters", metfilters)
-
-            # cuts on MET
-            self.selections.add("high_met_pt", met.pt > 50)
-            self.selections.add("low_met_pt", met.pt < 50)
-
-            # add number of leptons and jets
-            self.selections.add("one_electron", ak.num(electrons) == 1)
-            self.selections.add("electron_veto", ak.num(electrons) == 0)
+
+            # add region-independent selection masks
+            for selection_name, selection_mask in shared_selections.items():
+                self.selections.add(selection_name, selection_mask)
+
+            # add number of muons, taus and jets
             self.selections.add("one_muon", ak.num(muons) == 1)
             self.selections.add("muon_veto", ak.num(muons) == 0)
             self.selections.add("tau_veto", ak.num(taus) == 0)
             self.selections.add("one_bjet", ak.num(bjets) == 1)
 
-            # add cut on good vertices number
-            self.selections.add("goodvertex", events.PV.npvsGood > 0)
-
-            # define selection regions for each channel
-            region_selections = {
-                "A": {
-                    "ele": [
-                        "goodvertex",
-                        "lumi",
-                        "trigger_ele",
-                        "metfilters",
-                        "high_met_pt",
-                        "one_bjet",
-                        "tau_veto",
-                        "muon_veto",
-                        "one_electron",
-                    ],
-                    "mu": [
-                        "goodvertex",
-                        "lumi",
-                        "trigger_mu",
-                        "metfilters",
-                        "high_met_pt",
-                        "one_bjet",
-                        "tau_veto",
-                        "electron_veto",
-                        "one_muon",
-                    ],
-                },
-                "B": {
-                    "ele": [
-                        "goodvertex",
-                        "lumi",
-                        "trigger_ele",
-                        "metfilters",
-                        "high_met_pt",
-                        "one_bjet",
-                        "tau_veto",
-                        "muon_veto",
-                        "one_electron",
-                    ],
-                    "mu": [
-                        "goodvertex",
-                        "lumi",
-                        "trigger_mu",
-                        "metfilters",
-                        "high_met_pt",
-                        "one_bjet",
-                        "tau_veto",
-                        "electron_veto",
-                        "one_muon",
-                    ],
-                },
-                "C": {
-                    "ele": [
-                        "goodvertex",
-                        "lumi",
-                        "trigger_ele",
-                        "metfilters",
-                        "low_met_pt",
-                        "one_bjet",
-                        "tau_veto",
-                        "muon_veto",
-                        "one_electron",
-                    ],
-                    "mu": [
-                        "goodvertex",
-                        "lumi",
-                        "trigger_mu",
-                        "metfilters",
-                        "low_met_pt",
-                        "one_bjet",
-                        "tau_veto",
-                        "electron_veto",
-                        "one_muon",
-                    ],
-                },
-                "D": {
-                    "ele": [
-                        "goodvertex",
-                        "lumi",
-                        "trigger_ele",
-                        "metfilters",
-                        "low_met_pt",
-                        "one_bjet",
-                        "tau_veto",
-                        "muon_veto",
-                        "one_electron",
-                    ],
-                    "mu": [
-                        "goodvertex",
-                        "lumi",
-                        "trigger_mu",
-                        "metfilters",
-                        "low_met_pt",
-                        "one_bjet",
-                        "tau_veto",
-                        "electron_veto",
-                        "one_muon",
-                    ],
-                },
-            }
+            # ---------------
+            # cutflow
+            # ---------------
+            cut_names = self._region_selections[region][self._lepton_flavor]
+            cutflow = compute_cutflow(
+                pack_selection_bits(cut_names, selections=self.selections),
+                cut_names,
+                get_weight_variations(weights_container),
+            )
+            output["metadata"][region]["cutflow"] = cumulative_sumw(cutflow)
+            output["metadata"][region]["cutflow_yields"] = cutflow
+
             # ---------------
             # event variables
             # ---------------
             self.selections.add(
                 f"{self._lepton_flavor}_{region}",
-                self.selections.all(*region_selections[region][self._lepton_flavor]),
+                self.selections.all(*self._region_selections[region][self._lepton_flavor]),
             )
             region_selection = self.selections.all(f"{self._lepton_flavor}_{region}")
 
@@ -529,9 +597,9 @@ class QcdAnalysis(processor.ProcessorABC):
                             feature: normalize(self.features[feature])
                             for feature in hist_dict[kin].axes.name[:-1]
                         }
-                        hist_dict[kin].fill(
-                            **fill_args,
-                            region=region,
+                        histograms.fill(
+                            hist_dict[kin],
+                            values={**fill_args, "region": region},
                             weight=weights_container.weight()[region_selection],
                         )
             # save metadata
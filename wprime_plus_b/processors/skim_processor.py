@@ -0,0 +1,195 @@
+import os
+import json
+import uproot
+import numpy as np
+import awkward as ak
+import importlib.resources
+from coffea import processor
+from wprime_plus_b.processors.utils.lumi_mask import get_lumi_mask
+from wprime_plus_b.processors.utils.analysis_utils import get_partition_key
+from wprime_plus_b.processors.utils.chunk_cache import get_common_weights
+from wprime_plus_b.processors.utils.columns import get_required_columns
+
+
+class SkimProcessor(processor.ProcessorABC):
+    """
+    Write slim NanoAOD skims for fast reruns of the ttbar analysis
+
+    Events are kept if they pass a loose preselection (lumi mask, OR of the electron
+    and muon triggers, MET filters, at least one lepton and at least one b-jet
+    candidate), looser than every ttbar region to leave room for the JEC/JER and
+    Rochester corrections. Only the branches read by the ttbar analysis are written,
+    one ROOT file per chunk in '<output_location>/<dataset>/<partition_key>.root'.
+
+    Parameters:
+    -----------
+        year:
+            year of the dataset {'2016', '2017', '2018'}
+        yearmod:
+            year modifier {'', 'APV'}
+        output_location:
+            skims directory
+        columns:
+            branches to keep (default: the branches read by the ttbar analysis)
+        lepton_pt_threshold:
+            minimum pT of the electron or muon candidate
+        jet_pt_threshold:
+            minimum NanoAOD pT of the b-jet candidate
+        btag_working_point:
+            deepJet working point of the b-jet candidate {'L', 'M', 'T'}
+    """
+
+    def __init__(
+        self,
+        year: str = "2017",
+        yearmod: str = "",
+        output_location: str = None,
+        columns: list = None,
+        lepton_pt_threshold: float = 25,
+        jet_pt_threshold: float = 15,
+        btag_working_point: str = "L",
+    ):
+        if output_location is None:
+            raise ValueError("'output_location' is required for skims")
+        self._year = year
+        self._yearmod = yearmod
+        self._output_location = output_location
+        self._lepton_pt_threshold = lepton_pt_threshold
+        self._jet_pt_threshold = jet_pt_threshold
+
+        # load triggers, MET filters and b-tagging working point
+        with importlib.resources.path("wprime_plus_b.data", "triggers.json") as path:
+            with open(path, "r") as handle:
+                self._triggers = json.load(handle)[self._year]
+        with importlib.resources.path(
+            "wprime_plus_b.data", "metfilters.json"
+        ) as path:
+            with open(path, "r") as handle:
+                self._metfilters = json.load(handle)[self._year]
+        with importlib.resources.path("wprime_plus_b.data", "btagWPs.json") as path:
+            with open(path, "r") as handle:
+                btag_wps = json.load(handle)["deepJet"][self._year + self._yearmod]
+        self._btag_wp = btag_wps[btag_working_point]
+
+        # NanoAOD branches read by the ttbar analysis
+        if columns is None:
+            columns = get_required_columns(
+                year=self._year,
+                objects=[
+                    "electrons",
+                    "muons",
+                    "taus",
+                    "jets",
+                    "met",
+                    "trigger_objects",
+                ],
+                corrections=[
+                    "jec",
+                    "met_phi",
+                    "rochester",
+                    "tau_energy",
+                    "pileup",
+                    "l1prefiring",
+                    "pujetid",
+                    "btag",
+                    "electron_sf",
+                    "muon_sf",
+                    "tau_sf",
+                ],
+                trigger_flavors=["ele", "mu"],
+                metfilters=True,
+            )
+        self.columns = columns
+
+    def preselection(self, events) -> np.ndarray:
+        """return the mask of the events passing the loose preselection"""
+        nevents = len(events)
+        # luminosity calibration mask (only to data)
+        if self.is_mc:
+            mask = np.ones(nevents, dtype="bool")
+        else:
+            mask = get_lumi_mask(self._year, events.run, events.luminosityBlock)
+        # OR of the electron and muon triggers
+        trigger = np.zeros(nevents, dtype="bool")
+        for ch in ["ele", "mu"]:
+            for t in self._triggers[ch]:
+                if t in events.HLT.fields:
+                    trigger = trigger | ak.to_numpy(events.HLT[t])
+        mask = mask & trigger
+        # MET filters
+        metfilterkey = "mc" if self.is_mc else "data"
+        for mf in self._metfilters[metfilterkey]:
+            if mf in events.Flag.fields:
+                mask = mask & ak.to_numpy(events.Flag[mf])
+        # at least one lepton candidate
+        electrons = (events.Electron.pt > self._lepton_pt_threshold) & (
+            np.abs(events.Electron.eta) < 2.5
+        )
+        muons = (events.Muon.pt > self._lepton_pt_threshold) & (
+            np.abs(events.Muon.eta) < 2.4
+        )
+        nleptons = ak.sum(electrons, axis=1) + ak.sum(muons, axis=1)
+        mask = mask & ak.to_numpy(nleptons > 0)
+        # at least one b-jet candidate
+        bjets = (
+            (events.Jet.pt > self._jet_pt_threshold)
+            & (np.abs(events.Jet.eta) < 2.5)
+            & (events.Jet.btagDeepFlavB > self._btag_wp)
+        )
+        return mask & ak.to_numpy(ak.any(bjets, axis=1))
+
+    def get_branches(self, events) -> dict:
+        """
+        return the kept branches of 'events', with the fields of each jagged collection
+        zipped into a single record array (written as '<collection>_<field>' branches
+        plus the 'n<collection>' counts branch)
+        """
+        branches, collections = {}, {}
+        for column in self.columns:
+            if column in events.fields:
+                branches[column] = events[column]
+                continue
+            name, _, field = column.partition("_")
+            if name not in events.fields or field not in events[name].fields:
+                continue
+            if events[name].ndim > 1:
+                collections.setdefault(name, {})[field] = events[name][field]
+            else:
+                branches[column] = events[name][field]
+        for name, fields in collections.items():
+            branches[name] = ak.zip(fields)
+        return branches
+
+    def process(self, events):
+        # get dataset name
+        dataset = events.metadata["dataset"]
+        # check if sample is MC
+        self.is_mc = hasattr(events, "genWeight")
+        # sum of weights before selection, with the common weights only (genweight,
+        # l1prefiring and pileup): the object-level SFs depend on the ttbar region
+        event_weights = get_common_weights(
+            events, self.is_mc, self._year, self._yearmod
+        ).weight()
+        mask = self.preselection(events)
+        output = {
+            "metadata": {
+                "raw_initial_nevents": len(events),
+                "raw_skimmed_nevents": int(np.sum(mask)),
+                "sumw": float(np.sum(event_weights)),
+                # weights of the removed events, added back to 'sumw' when the skims are
+                # analyzed. They lack the object-level SFs, so that 'sumw' is approximate
+                "rejected_sumw": float(np.sum(event_weights[~mask])),
+            },
+            "manifest": [],
+        }
+        if np.any(mask):
+            output_directory = f"{self._output_location}/{dataset}"
+            os.makedirs(output_directory, exist_ok=True)
+            fname = f"{output_directory}/{get_partition_key(events)}.root"
+            with uproot.recreate(fname) as file:
+                file["Events"] = self.get_branches(events[mask])
+            output["manifest"].append({"path": fname, "nrows": int(np.sum(mask))})
+        return {dataset: output}
+
+    def postprocess(self, accumulator):
+        return accumulator
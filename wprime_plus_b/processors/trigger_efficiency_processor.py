@@ -1,13 +1,15 @@
 import json
 import hist
-import pickle
 import numpy as np
 import pandas as pd
 import awkward as ak
 from typing import List
 from coffea import processor
-from coffea.analysis_tools import Weights, PackedSelection
+from coffea.analysis_tools import PackedSelection
 from wprime_plus_b.processors.utils.analysis_utils import delta_r_mask, normalize
+from wprime_plus_b.processors.utils.lumi_mask import get_lumi_mask
+from wprime_plus_b.processors.utils.columns import get_required_columns
+from wprime_plus_b.processors.utils.weights import CompactWeights
 from wprime_plus_b.corrections.jec import jet_corrections
 from wprime_plus_b.corrections.met import met_phi_corrections
 from wprime_plus_b.corrections.btag import BTagCorrector
@@ -44,9 +46,25 @@ class TriggerEfficiencyProcessor(processor.ProcessorABC):
         # https://twiki.cern.ch/twiki/bin/view/CMS/MissingETOptionalFiltersRun2
         with open("wprime_plus_b/data/metfilters.json", "rb") as handle:
             self._metfilters = json.load(handle)[self._year]
-        # open lumi masks
-        with open("wprime_plus_b/data/lumi_masks.pkl", "rb") as handle:
-            self._lumi_mask = pickle.load(handle)
+        # NanoAOD branches read by the processor
+        self.columns = get_required_columns(
+            year=self._year,
+            objects=["electrons", "muons", "taus", "jets", "met"],
+            corrections=[
+                "jec",
+                "met_phi",
+                "tau_energy",
+                "pileup",
+                "l1prefiring",
+                "pujetid",
+                "btag",
+                "electron_sf",
+                "muon_sf",
+                "tau_sf",
+            ],
+            trigger_flavors=["ele", "mu"],
+            metfilters=True,
+        )
         # output histograms
         self.make_output = lambda: {
             "electron_kin": hist.Hist(
@@ -284,7 +302,7 @@ class TriggerEfficiencyProcessor(processor.ProcessorABC):
         # --------------------
         # event weights vector
         # --------------------
-        weights_container = Weights(len(events), storeIndividual=True)
+        weights_container = CompactWeights(len(events), storeIndividual=True)
         if self.is_mc:
             # add gen weigths
             weights_container.add("genweight", events.genWeight)
@@ -377,7 +395,7 @@ class TriggerEfficiencyProcessor(processor.ProcessorABC):
 
         # luminosity
         if not self.is_mc:
-            lumi_mask = self._lumi_mask[self._year](events.run, events.luminosityBlock)
+            lumi_mask = get_lumi_mask(self._year, events.run, events.luminosityBlock)
         else:
             lumi_mask = np.ones(len(events), dtype="bool")
         self.selections.add("lumi", lumi_mask)
@@ -1,22 +1,47 @@
 import json
 import copy
-import pickle
 import numpy as np
 import awkward as ak
 import importlib.resources
 from coffea import processor
-from coffea.analysis_tools import PackedSelection, Weights
+from coffea.analysis_tools import PackedSelection
 from wprime_plus_b.processors.utils import histograms
-from wprime_plus_b.corrections.jec import jet_corrections
-from wprime_plus_b.corrections.met import met_phi_corrections
+from wprime_plus_b.processors.utils.lumi_mask import get_lumi_mask
+from wprime_plus_b.processors.utils.columns import get_required_columns
+from wprime_plus_b.processors.utils.disk_cache import disk_cache
+from wprime_plus_b.processors.utils.cutflow import (
+    compute_cutflow,
+    cumulative_sumw,
+    get_weight_variations,
+)
+from wprime_plus_b.processors.utils.selection_store import (
+    pack_selection_bits,
+    write_selection_partition,
+)
+from wprime_plus_b.corrections.jec import jet_met_shift
+from wprime_plus_b.corrections.met import (
+    met_phi_corrections,
+    get_met_shift,
+    propagate_met,
+)
 from wprime_plus_b.corrections.btag import BTagCorrector
-from wprime_plus_b.corrections.pileup import add_pileup_weight
-from wprime_plus_b.corrections.l1prefiring import add_l1prefiring_weight
 from wprime_plus_b.corrections.pujetid import add_pujetid_weight
-from wprime_plus_b.corrections.tau_energy import tau_energy_scale, met_corrected_tes
-from wprime_plus_b.processors.utils.analysis_utils import delta_r_mask, normalize, trigger_match
+from wprime_plus_b.processors.utils.analysis_utils import (
+    delta_r_mask,
+    normalize,
+    trigger_match,
+    get_partition_key,
+    write_parquet_partition,
+    config_key,
+)
 from wprime_plus_b.selections.ttbar.jet_selection import select_good_bjets
-from wprime_plus_b.corrections.rochester import apply_rochester_corrections
+from wprime_plus_b.processors.utils.chunk_cache import (
+    chunk_cache,
+    get_common_weights,
+    get_jet_corrections,
+    get_rochester_pt,
+    get_tau_energy_scale,
+)
 from wprime_plus_b.corrections.lepton import (
     ElectronCorrector,
     MuonCorrector,
@@ -42,9 +67,9 @@ class TtbarAnalysis(processor.ProcessorABC):
     Parameters:
     -----------
     channel:
-        region channel {'2b1l', '1b1e1mu', '1b1l'}
+        region channel {'2b1l', '1b1e1mu', '1b1l', 'all'}
     lepton_flavor:
-        lepton flavor {'ele', 'mu'}
+        lepton flavor {'ele', 'mu', 'all'}
     year:
         year of the dataset {"2017"}
     year_mode:
@@ -53,6 +78,17 @@ class TtbarAnalysis(processor.ProcessorABC):
         systematics to apply {"nominal", "jec", "jer", "jet", "met", "full"} 
     output_type:
         output object type {'hist', 'array'}
+    output_location:
+        parquet dataset directory (required for 'array' output)
+    cache_location:
+        directory of the disk cache of corrected objects and event weights (disabled if None)
+    cache_budget:
+        disk budget of the cache in GB
+    selection_location:
+        selection store directory. If set, the nominal selection bits and weights of
+        every event are written there (see 'wprime_plus_b.postprocessor.cutflow')
+    weights_dtype:
+        dtype of the stored event weights {'float64', 'float32'} (see 'CompactWeights')
     """
 
     def __init__(
@@ -63,52 +99,481 @@ class TtbarAnalysis(processor.ProcessorABC):
         yearmod: str = "",
         syst: str = "nominal",
         output_type: str = "hist",
+        output_location: str = None,
+        cache_location: str = None,
+        cache_budget: float = 10,
+        selection_location: str = None,
+        weights_dtype: str = "float64",
     ):
         self._year = year
+        self._cache_location = cache_location
+        self._cache_budget = cache_budget
+        self._selection_location = selection_location
+        self._weights_dtype = weights_dtype
         self._yearmod = yearmod
         self._lepton_flavor = lepton_flavor
         self._channel = channel
         self._syst = syst
         self._output_type = output_type
+        self._output_location = output_location
+        if self._output_type == "array" and self._output_location is None:
+            raise ValueError("'output_location' is required for 'array' output")
 
-        # define region of the analysis
-        self._region = f"{self._channel}_{self._lepton_flavor}"
-        # initialize dictionary of hists for control regions
-        self.hist_dict = {}
-        self.hist_dict[self._region] = {
-            "n_kin": histograms.ttbar_n_hist,
-            "jet_kin": histograms.ttbar_jet_hist,
-            "met_kin": histograms.ttbar_met_hist,
-            "lepton_kin": histograms.ttbar_lepton_hist,
-            "lepton_bjet_kin": histograms.ttbar_lepton_bjet_hist,
-            "lepton_met_kin": histograms.ttbar_lepton_met_hist,
-            "lepton_met_bjet_kin": histograms.ttbar_lepton_met_bjet_hist,
+        # define regions of the analysis. With 'all', every channel (or lepton flavor)
+        # is evaluated in a single pass over the events
+        channels = ["2b1l", "1b1e1mu", "1b1l"] if channel == "all" else [channel]
+        lepton_flavors = ["ele", "mu"] if lepton_flavor == "all" else [lepton_flavor]
+        self._regions = {
+            f"{ch}_{fl}": (ch, fl) for ch in channels for fl in lepton_flavors
         }
+        # histogram specs for control regions
+        self.hist_specs = histograms.ttbar_hist_specs
         # define dictionary to store analysis variables
         self.features = {}
-        # initialize dictionary of arrays
-        self.array_dict = {}
+
+        # load triggers and MET filters once (they do not depend on the chunk)
+        with importlib.resources.path("wprime_plus_b.data", "triggers.json") as path:
+            with open(path, "r") as handle:
+                self._triggers = json.load(handle)[self._year]
+        with importlib.resources.path(
+            "wprime_plus_b.data", "metfilters.json"
+        ) as path:
+            with open(path, "r") as handle:
+                self._metfilters = json.load(handle)[self._year]
+
+        # NanoAOD branches read by the processor
+        self.columns = get_required_columns(
+            year=self._year,
+            objects=["electrons", "muons", "taus", "jets", "met", "trigger_objects"],
+            corrections=[
+                "jec",
+                "met_phi",
+                "rochester",
+                "tau_energy",
+                "pileup",
+                "l1prefiring",
+                "pujetid",
+                "btag",
+                "electron_sf",
+                "muon_sf",
+                "tau_sf",
+            ],
+            trigger_flavors=["ele", "mu"],
+            metfilters=True,
+        )
+
+        # define selection regions for each channel
+        self._region_selections = {
+            "2b1l": {
+                "ele": [
+                    "goodvertex",
+                    "lumi",
+                    "trigger_ele",
+                    "trigger_match",
+                    "metfilters",
+                    "met_pt",
+                    "two_bjets",
+                    "tau_veto",
+                    "muon_veto",
+                    "one_electron",
+                ],
+                "mu": [
+                    "goodvertex",
+                    "lumi",
+                    "trigger_mu",
+                    "trigger_match",
+                    "metfilters",
+                    "met_pt",
+                    "two_bjets",
+                    "tau_veto",
+                    "electron_veto",
+                    "one_muon",
+                ],
+            },
+            "1b1e1mu": {
+                "ele": [
+                    "goodvertex",
+                    "lumi",
+                    "trigger_mu",
+                    "trigger_match",
+                    "metfilters",
+                    "met_pt",
+                    "one_bjet",
+                    "tau_veto",
+                    "one_muon",
+                    "one_electron",
+                ],
+                "mu": [
+                    "goodvertex",
+                    "lumi",
+                    "trigger_ele",
+                    "trigger_match",
+                    "metfilters",
+                    "met_pt",
+                    "one_bjet",
+                    "tau_veto",
+                    "one_electron",
+                    "one_muon",
+                ],
+            },
+            "1b1l": {
+                "ele": [
+                    "goodvertex",
+                    "lumi",
+                    "trigger_ele",
+                    "trigger_match",
+                    "metfilters",
+                    "met_pt",
+                    "one_bjet",
+                    "tau_veto",
+                    "muon_veto",
+                    "one_electron",
+                ],
+                "mu": [
+                    "goodvertex",
+                    "lumi",
+                    "trigger_mu",
+                    "trigger_match",
+                    "metfilters",
+                    "met_pt",
+                    "one_bjet",
+                    "tau_veto",
+                    "electron_veto",
+                    "one_muon",
+                ],
+            },
+        }
+
+        # lepton flavor of the trigger used by each region
+        self._trigger_flavors = {
+            region: "mu" if "trigger_mu" in self._region_selections[ch][fl] else "ele"
+            for region, (ch, fl) in self._regions.items()
+        }
+        # name of the selection mask of each region cut. Masks that depend on the
+        # region objects are stored with the region name as prefix
+        region_dependent_cuts = [
+            "one_electron",
+            "electron_veto",
+            "one_muon",
+            "muon_veto",
+            "tau_veto",
+            "one_bjet",
+            "two_bjets",
+        ]
+        self._selection_names = {}
+        for region, (ch, fl) in self._regions.items():
+            self._selection_names[region] = {}
+            for cut_name in self._region_selections[ch][fl]:
+                if cut_name == "trigger_match":
+                    selection_name = f"trigger_match_{self._trigger_flavors[region]}"
+                elif cut_name in region_dependent_cuts:
+                    selection_name = f"{region}_{cut_name}"
+                else:
+                    selection_name = cut_name
+                self._selection_names[region][cut_name] = selection_name
+        # bit order of the selection store (every selection of every region)
+        self._store_selection_names = list(
+            dict.fromkeys(
+                selection_name
+                for region in self._regions
+                for selection_name in self._selection_names[region].values()
+            )
+        )
 
     def add_feature(self, name: str, var: ak.Array) -> None:
         """add a variable array to the out dictionary"""
         self.features = {**self.features, name: var}
 
+    def build_output(
+        self,
+        dataset: str,
+        output: dict,
+        region_metadata: dict,
+        hist_dict: dict,
+        manifest: list,
+    ) -> dict:
+        """build the output dictionary (keyed by region when several regions are evaluated)"""
+        if len(self._regions) == 1:
+            region = next(iter(self._regions))
+            output["metadata"].update(region_metadata[region])
+            if self._output_type == "hist":
+                output["histograms"] = hist_dict[region]
+        else:
+            output["metadata"].update(region_metadata)
+            if self._output_type == "hist":
+                output["histograms"] = hist_dict
+        if self._output_type == "array":
+            output["manifest"] = manifest
+        return {dataset: output}
+
+    def add_cutflow(
+        self,
+        metadata: dict,
+        region: str,
+        chunk_masks: dict,
+        selections: PackedSelection,
+        evaluated: np.ndarray,
+        weights: dict,
+    ) -> None:
+        """
+        add the cutflow of a region over the whole chunk to its metadata: the cumulative
+        nominal yields ('cutflow') and the cumulative, N-1 and individual yields of every
+        weight variation ('cutflow_yields', see 'compute_cutflow').
+
+        The events rejected by the pre-selection fail every cut evaluated after the
+        corrections, so the N-1 yields of the pre-selection cuts and the individual
+        yields of the other cuts only count the events kept by the pre-selection.
+
+        Parameters:
+        -----------
+            metadata:
+                region metadata
+            region:
+                region name
+            chunk_masks:
+                selection masks evaluated on every event of the chunk
+            selections:
+                nominal selection masks of the 'evaluated' events
+            evaluated:
+                mask of the events passing the pre-selection
+            weights:
+                dictionary with variation names as keys and event weights of the whole
+                chunk as values
+        """
+        bits = pack_selection_bits(
+            list(self._selection_names[region].values()),
+            chunk_masks,
+            selections,
+            evaluated,
+        )
+        cutflow = compute_cutflow(bits, list(self._selection_names[region]), weights)
+        metadata["cutflow"] = cumulative_sumw(cutflow)
+        metadata["cutflow_yields"] = cutflow
+
+    def write_selection_store(
+        self,
+        events,
+        dataset: str,
+        chunk_masks: dict,
+        selections: PackedSelection,
+        evaluated: np.ndarray,
+        weights: dict,
+    ) -> None:
+        """
+        write the selection bits and the nominal weights of every event of the chunk to
+        the selection store
+
+        Parameters:
+        -----------
+            events:
+                events collection of the chunk
+            dataset:
+                dataset name
+            chunk_masks:
+                selection masks evaluated on every event of the chunk
+            selections:
+                nominal selection masks of the 'evaluated' events
+            evaluated:
+                mask of the events passing the pre-selection
+            weights:
+                dictionary with region names as keys and nominal event weights as values
+        """
+        bits = pack_selection_bits(
+            self._store_selection_names, chunk_masks, selections, evaluated
+        )
+        write_selection_partition(
+            bits=bits,
+            evaluated=evaluated,
+            weights=weights,
+            metadata={
+                "selection_names": self._store_selection_names,
+                "chunk_selections": list(chunk_masks),
+                "regions": {region: self._selection_names[region] for region in weights},
+            },
+            output_location=self._selection_location,
+            dataset=dataset,
+            partition_key=get_partition_key(events),
+        )
+
+    def add_lepton_weights(
+        self,
+        weights,
+        region: str,
+        electrons: ak.Array,
+        muons: ak.Array,
+        taus: ak.Array,
+        trigger_mask: dict,
+        trigger_match_masks: dict,
+    ) -> None:
+        """
+        add the lepton weights of a region: electronId, electronReco, muonId, muonIso,
+        muonTriggerIso (regions with the muon trigger) and the tau ID weights
+
+        Parameters:
+        -----------
+            weights:
+                weights container
+            region:
+                region name
+            electrons:
+                electrons collection
+            muons:
+                rochester corrected muons
+            taus:
+                energy scale corrected taus
+            trigger_mask:
+                dictionary with trigger flavors as keys and trigger masks as values
+            trigger_match_masks:
+                dictionary with trigger flavors as keys and trigger matching masks as values
+        """
+        channel, lepton_flavor = self._regions[region]
+        # electron corrector
+        electron_corrector = ElectronCorrector(
+            electrons=electrons,
+            weights=weights,
+            year=self._year,
+            year_mod=self._yearmod,
+            variation="nominal",
+        )
+        # add electron ID weights
+        electron_corrector.add_id_weight(
+            id_working_point=ttbar_electron_selection[channel][lepton_flavor][
+                "electron_id_wp"
+            ]
+        )
+        # add electron reco weights
+        electron_corrector.add_reco_weight()
+        # muon corrector
+        muon_corrector = MuonCorrector(
+            muons=muons,
+            weights=weights,
+            year=self._year,
+            year_mod=self._yearmod,
+            variation="nominal",
+            id_wp=ttbar_muon_selection[channel][lepton_flavor]["muon_id_wp"],
+            iso_wp=ttbar_muon_selection[channel][lepton_flavor]["muon_iso_wp"],
+        )
+        # add muon ID weights
+        muon_corrector.add_id_weight()
+        # add muon iso weights
+        muon_corrector.add_iso_weight()
+
+        # add trigger weights
+        if self._trigger_flavors[region] == "mu":
+            muon_corrector.add_triggeriso_weight(
+                trigger_mask=trigger_mask["mu"],
+                trigger_match_mask=trigger_match_masks["mu"],
+            )
+        else:
+            pass
+            """
+            electron_corrector.add_trigger_weight(
+                trigger_mask=trigger_mask["ele"],
+                trigger_match_mask=trigger_match_masks["ele"]
+            )
+            """
+        # add tau weights
+        tau_corrector = TauCorrector(
+            taus=taus,
+            weights=weights,
+            year=self._year,
+            year_mod=self._yearmod,
+            tau_vs_jet=ttbar_tau_selection[channel][lepton_flavor]["tau_vs_jet"],
+            tau_vs_ele=ttbar_tau_selection[channel][lepton_flavor]["tau_vs_ele"],
+            tau_vs_mu=ttbar_tau_selection[channel][lepton_flavor]["tau_vs_mu"],
+            variation="nominal",
+        )
+        tau_corrector.add_id_weight_DeepTau2017v2p1VSe()
+        tau_corrector.add_id_weight_DeepTau2017v2p1VSmu()
+        tau_corrector.add_id_weight_DeepTau2017v2p1VSjet()
+
+    def add_jet_weights(
+        self,
+        weights,
+        region: str,
+        jets: ak.Array,
+        genjets: ak.Array,
+        variation: str,
+    ) -> None:
+        """
+        add the jet weights of a region: pujetid and b-tagging
+
+        Parameters:
+        -----------
+            weights:
+                weights container
+            region:
+                region name
+            jets:
+                JEC/JER corrected jets
+            genjets:
+                generator level jets
+            variation:
+                systematic variation
+        """
+        channel, lepton_flavor = self._regions[region]
+        # add pujetid weigths
+        add_pujetid_weight(
+            jets=jets,
+            genjets=genjets,
+            weights=weights,
+            year=self._year,
+            year_mod=self._yearmod,
+            working_point=ttbar_jet_selection[channel][lepton_flavor]["jet_pileup_id"],
+            variation=variation,
+        )
+        # b-tagging corrector
+        btag_corrector = BTagCorrector(
+            jets=jets,
+            weights=weights,
+            sf_type="comb",
+            worging_point=ttbar_jet_selection[channel][lepton_flavor][
+                "btag_working_point"
+            ],
+            tagger="deepJet",
+            year=self._year,
+            year_mod=self._yearmod,
+            full_run=False,
+            variation=variation,
+        )
+        # add b-tagging weights
+        btag_corrector.add_btag_weights(flavor="bc")
+
     def process(self, events):
         # get dataset name
         dataset = events.metadata["dataset"]
+        # read (and keep) the corrected objects in the disk cache, if any. Within
+        # 'MultiAnalysisProcessor' the cache is configured by the wrapper
+        if not chunk_cache.is_active(events):
+            disk_cache.configure(self._cache_location, self._cache_budget)
         # get number of events before selection
         nevents = len(events)
         # check if sample is MC
         self.is_mc = hasattr(events, "genWeight")
-        # create copies of histogram objects
-        hist_dict = copy.deepcopy(self.hist_dict)
-        # create copy of array dictionary
-        array_dict = copy.deepcopy(self.array_dict)
+        # regions to evaluate. In data (with several regions), only the regions
+        # using the trigger of the dataset stream are evaluated
+        regions = self._regions
+        if not self.is_mc and len(self._regions) > 1:
+            stream_flavors = {"SingleElectron": "ele", "SingleMuon": "mu"}
+            for stream, stream_flavor in stream_flavors.items():
+                if dataset.startswith(stream):
+                    regions = {
+                        region: region_config
+                        for region, region_config in self._regions.items()
+                        if self._trigger_flavors[region] == stream_flavor
+                    }
+        # build empty histograms
+        hist_dict = {
+            region: histograms.build_histograms(self.hist_specs) for region in regions
+        }
+        # list of parquet files written by this chunk (array output)
+        manifest = []
         # dictionary to store output data and metadata
         output = {}
         output["metadata"] = {}
         output["metadata"].update({"raw_initial_nevents": nevents})
-                    
+        region_metadata = {region: {} for region in regions}
+
         # define systematic variations shifts
         syst_variations = ["nominal"]
         if self.is_mc:
@@ -129,662 +594,548 @@ class TtbarAnalysis(processor.ProcessorABC):
                 syst_variations.extend(jet_jec_syst_variations)
                 syst_variations.extend(jet_jer_syst_variations)
                 syst_variations.extend(met_obj_syst_variations)
-                
-        for syst_var in syst_variations:
-            
-            # -------------------------------------------------------------  
-            # object corrections
-            # -------------------------------------------------------------  
-            # apply JEC/JER corrections to jets (in data, the corrections are already applied)
-            if self.is_mc:
-                corrected_jets, met = jet_corrections(
-                    events, self._year + self._yearmod
+
+        # -------------------------------------------------------------
+        # trigger masks
+        # -------------------------------------------------------------
+        # get triggers masks
+        trigger_mask = {}
+        for ch in ["ele", "mu"]:
+            trigger_mask[ch] = np.zeros(nevents, dtype="bool")
+            for t in self._triggers[ch]:
+                if t in events.HLT.fields:
+                    trigger_mask[ch] = trigger_mask[ch] | events.HLT[t]
+
+        # get DeltaR matched trigger objects mask for the trigger of each region
+        trigger_leptons = {"ele": events.Electron, "mu": events.Muon}
+        trigger_match_masks = {}
+        for region in regions:
+            trigger_flavor = self._trigger_flavors[region]
+            if trigger_flavor not in trigger_match_masks:
+                trigger_match_masks[trigger_flavor] = trigger_match(
+                    leptons=trigger_leptons[trigger_flavor],
+                    trigobjs=events.TrigObj,
+                    trigger_path=self._triggers[trigger_flavor][0],
                 )
-                # jet JEC/JER shift
-                if syst_var == "JESUp":
-                    corrected_jets = corrected_jets.JES_Total.up
-                elif syst_var == "JESDown":
-                    corrected_jets = corrected_jets.JES_Total.down
-                elif syst_var == "JERUp":
-                    corrected_jets = corrected_jets.JER.up
-                elif syst_var == "JERDown":
-                    corrected_jets = corrected_jets.JER.down
-                # MET UnclusteredEnergy shift
-                elif syst_var == "UEUp":
-                    met = met.MET_UnclusteredEnergy.up
-                elif syst_var == "UEDown":
-                    met = met.MET_UnclusteredEnergy.down
-            else:
-                corrected_jets, met = events.Jet, events.MET
-                
-            # apply MET phi corrections
-            met_pt, met_phi = met_phi_corrections(
-                met_pt=met.pt,
-                met_phi=met.phi,
-                npvs=events.PV.npvsGood,
-                run=events.run,
-                is_mc=self.is_mc,
-                year=self._year,
-                year_mod=self._yearmod,
+
+        # -------------------------------------------------------------
+        # event pre-selection
+        # -------------------------------------------------------------
+        # the correction-independent masks (good vertex, lumi, triggers, trigger
+        # matching and MET filters) are evaluated first, and the corrections are
+        # only computed for the events passing all of them (in at least one region)
+        if not self.is_mc:
+            lumi_mask = get_lumi_mask(self._year, events.run, events.luminosityBlock)
+        else:
+            lumi_mask = np.ones(nevents, dtype="bool")
+        metfilters = np.ones(nevents, dtype="bool")
+        metfilterkey = "mc" if self.is_mc else "data"
+        for mf in self._metfilters[metfilterkey]:
+            if mf in events.Flag.fields:
+                metfilters = metfilters & events.Flag[mf]
+        event_masks = {
+            "goodvertex": ak.to_numpy(events.PV.npvsGood > 0),
+            "lumi": lumi_mask,
+            "trigger_ele": ak.to_numpy(trigger_mask["ele"]),
+            "trigger_mu": ak.to_numpy(trigger_mask["mu"]),
+            "metfilters": ak.to_numpy(metfilters),
+        }
+        for trigger_flavor, match_mask in trigger_match_masks.items():
+            event_masks[f"trigger_match_{trigger_flavor}"] = ak.to_numpy(
+                ak.sum(match_mask, axis=-1) > 0
             )
-            met["pt"], met["phi"] = met_pt, met_phi
-            
-            # apply Tau energy corrections (only to MC)
-            corrected_taus = events.Tau
-            if self.is_mc:
-                # Data does not have corrections
-                corrected_taus["pt"], corrected_taus["mass"] = tau_energy_scale(
-                    events, "2017", "", "DeepTau2017v2p1", "nom"
+        # events passing the leading region cuts that can be applied before the
+        # corrections, in at least one region
+        preselection = np.zeros(nevents, dtype="bool")
+        for region in regions:
+            region_preselection = np.ones(nevents, dtype="bool")
+            for selection_name in self._selection_names[region].values():
+                if selection_name not in event_masks:
+                    break
+                region_preselection = region_preselection & event_masks[selection_name]
+            preselection = preselection | region_preselection
+
+        # event-level weights are computed for every event, since the sum of
+        # weights before selection runs over the whole chunk
+        event_weights = get_common_weights(
+            events, self.is_mc, self._year, self._yearmod, self._weights_dtype
+        )
+        # the events rejected by the pre-selection only enter the sum of weights, the
+        # cutflow and the weight statistics with these weights: the corrections are
+        # not computed for them, so their object-level SFs (lepton, tau, pujetid and
+        # b-tagging) are not applied (as for the events removed by the skims)
+        if not np.any(preselection):
+            # no event survives the pre-selection: skip the corrections
+            for region in regions:
+                region_metadata[region].update(
+                    {"sumw": ak.sum(event_weights.weight())}
+                )
+                region_metadata[region].update({"weight_statistics": {}})
+                for weight, statistics in event_weights.weightStatistics.items():
+                    region_metadata[region]["weight_statistics"][weight] = statistics
+                self.add_cutflow(
+                    region_metadata[region],
+                    region,
+                    chunk_masks=event_masks,
+                    selections=None,
+                    evaluated=preselection,
+                    weights=get_weight_variations(event_weights),
                 )
-                # Given the tau corrections. We need to recalculate the MET.
-                # https://github.com/columnflow/columnflow/blob/16d35bb2f25f62f9110a8f1089e8dc5c62b29825/columnflow/calibration/util.py#L42
-                # https://github.com/Katsch21/hh2bbtautau/blob/e268752454a0ce0089ff08cc6c373a353be77679/hbt/calibration/tau.py#L117
-                met["pt"], met["phi"] = met_corrected_tes(
-                    old_taus=events.Tau, new_taus=corrected_taus, met=met
+            if self._selection_location is not None:
+                self.write_selection_store(
+                    events=events,
+                    dataset=dataset,
+                    chunk_masks=event_masks,
+                    selections=None,
+                    evaluated=preselection,
+                    weights={region: event_weights.weight() for region in regions},
                 )
-                
-            # apply rochester corretions to muons
-            corrected_muons = events.Muon 
-            muon_pt = apply_rochester_corrections(
-                corrected_muons, self.is_mc, self._year + self._yearmod
+            return self.build_output(
+                dataset, output, region_metadata, hist_dict, manifest
             )
-            corrected_muons["pt"] = muon_pt
-            met["pt"], met["phi"] = met_corrected_tes(
-                events.Muon, corrected_muons, met
+
+        # keep the events passing the pre-selection. The corrections shared with other
+        # analyses (see 'chunk_cache') are taken from the whole chunk
+        chunk_events = events
+        chunk_event_masks = event_masks
+        events = events[preselection]
+        trigger_mask = {ch: mask[preselection] for ch, mask in trigger_mask.items()}
+        trigger_match_masks = {
+            trigger_flavor: match_mask[preselection]
+            for trigger_flavor, match_mask in trigger_match_masks.items()
+        }
+        event_masks = {name: mask[preselection] for name, mask in event_masks.items()}
+
+        # -------------------------------------------------------------
+        # object corrections (shared by all regions and systematic variations)
+        # -------------------------------------------------------------
+        # apply JEC/JER corrections to jets (in data, the corrections are already applied)
+        # the corrected collections are built once per chunk and each systematic shift is taken from them
+        if self.is_mc:
+            nominal_jets, nominal_met = get_jet_corrections(
+                chunk_events, self._year + self._yearmod, mask=preselection
             )
-            
-            # -------------------------------------------------------------  
-            # event SF/weights computation
-            # -------------------------------------------------------------  
-            # get triggers masks 
-            with importlib.resources.path("wprime_plus_b.data", "triggers.json") as path:
-                with open(path, "r") as handle:
-                    self._triggers = json.load(handle)[self._year]
-            trigger_mask = {}
-            for ch in ["ele", "mu"]:
-                trigger_mask[ch] = np.zeros(nevents, dtype="bool")
-                for t in self._triggers[ch]:
-                    if t in events.HLT.fields:
-                        trigger_mask[ch] = trigger_mask[ch] | events.HLT[t]
-        
-            # get DeltaR matched trigger objects mask
-            trigger_path = {
-                "1b1l": {
-                    "ele": self._triggers["ele"][0],
-                    "mu": self._triggers["mu"][0],
-                },
-                "2b1l": {
-                    "ele": self._triggers["ele"][0],
-                    "mu": self._triggers["mu"][0],
-                },
-                "1b1e1mu": {
-                    "ele": self._triggers["mu"][0],
-                    "mu": self._triggers["ele"][0],
-                }
-            }
-            trigger_leptons = {
-                "1b1l": {
-                    "ele": events.Electron,
-                    "mu": corrected_muons,
-                },
-                "2b1l": {
-                    "ele": events.Electron,
-                    "mu": corrected_muons,
-                },
-                "1b1e1mu": {
-                    "ele": corrected_muons,
-                    "mu": events.Electron,
-                }
-            }
-            trigger_match_mask = trigger_match(
-                leptons=trigger_leptons[self._channel][self._lepton_flavor],
-                trigobjs=events.TrigObj,
-                trigger_path=trigger_path[self._channel][self._lepton_flavor],
+        else:
+            nominal_jets, nominal_met = events.Jet, events.MET
+
+        # apply Tau energy corrections (only to MC)
+        corrected_taus = events.Tau
+        if self.is_mc:
+            # Data does not have corrections
+            corrected_taus["pt"], corrected_taus["mass"] = get_tau_energy_scale(
+                chunk_events, "2017", "", "DeepTau2017v2p1", "nom", mask=preselection
             )
-            # weights (for all channels): genweight, pileup, l1prefiring, pujetid, b-tagging
-            # electron weights (for 2b1e, 1b1e or 1b1e1mu): electronId, electronReco
-            # muon weights (for 2b1mu, 1b1mu, or 1b1e1mu): muonId, muonIso, muonTriggerIso
-            weights_container = Weights(len(events), storeIndividual=True)
+
+        # apply rochester corretions to muons
+        corrected_muons = events.Muon
+        muon_pt = get_rochester_pt(
+            chunk_events, self.is_mc, self._year + self._yearmod, mask=preselection
+        )
+        corrected_muons["pt"] = muon_pt
+
+        # -------------------------------------------------------------
+        # event SF/weights computation (shared by all systematic variations)
+        # -------------------------------------------------------------
+        # weights (for all channels): genweight, pileup, l1prefiring
+        # electron weights (for 2b1e, 1b1e or 1b1e1mu): electronId, electronReco
+        # muon weights (for 2b1mu, 1b1mu, or 1b1e1mu): muonId, muonIso, muonTriggerIso
+        # jet-dependent weights (pujetid, b-tagging) are added for each variation
+        # the event-level weights of the kept events are taken from the chunk weights
+        shared_weights = event_weights.subset(preselection)
+        # lepton weights depend on the working points of each region
+        region_weights = {}
+        for region in regions:
+            region_weights[region] = copy.deepcopy(shared_weights)
             if self.is_mc:
-                # add gen weigths
-                weights_container.add("genweight", events.genWeight)
-                # add l1prefiring weigths
-                add_l1prefiring_weight(events, weights_container, self._year, syst_var)
-                # add pileup weigths
-                add_pileup_weight(
-                    events, weights_container, self._year, self._yearmod, syst_var
-                )
-                # add pujetid weigths
-                add_pujetid_weight(
-                    jets=corrected_jets,
-                    genjets=events.GenJet,
-                    weights=weights_container,
-                    year=self._year,
-                    year_mod=self._yearmod,
-                    working_point=ttbar_jet_selection[self._channel][
-                        self._lepton_flavor
-                    ]["jet_pileup_id"],
-                    variation=syst_var,
-                )
-                # b-tagging corrector
-                btag_corrector = BTagCorrector(
-                    jets=corrected_jets,
-                    weights=weights_container,
-                    sf_type="comb",
-                    worging_point=ttbar_jet_selection[self._channel][
-                        self._lepton_flavor
-                    ]["btag_working_point"],
-                    tagger="deepJet",
-                    year=self._year,
-                    year_mod=self._yearmod,
-                    full_run=False,
-                    variation=syst_var,
-                )
-                # add b-tagging weights
-                btag_corrector.add_btag_weights(flavor="bc")
-                # electron corrector
-                electron_corrector = ElectronCorrector(
+                self.add_lepton_weights(
+                    weights=region_weights[region],
+                    region=region,
                     electrons=events.Electron,
-                    weights=weights_container,
-                    year=self._year,
-                    year_mod=self._yearmod,
-                    variation=syst_var,
+                    muons=corrected_muons,
+                    taus=corrected_taus,
+                    trigger_mask=trigger_mask,
+                    trigger_match_masks=trigger_match_masks,
                 )
-                # add electron ID weights
-                electron_corrector.add_id_weight(
-                    id_working_point=ttbar_electron_selection[self._channel][
-                        self._lepton_flavor
-                    ]["electron_id_wp"]
+
+        # -------------------------------------------------------------
+        # lepton selection (shared by all systematic variations)
+        # -------------------------------------------------------------
+        # regions with the same selection config share the selected objects
+        selected_objects = {}
+        object_keys = {}
+        for region, (channel, lepton_flavor) in regions.items():
+            # select good electrons
+            electron_config = ttbar_electron_selection[channel][lepton_flavor]
+            electron_key = ("electrons", config_key(electron_config))
+            if electron_key not in selected_objects:
+                good_electrons = select_good_electrons(
+                    events=events,
+                    electron_pt_threshold=electron_config["electron_pt_threshold"],
+                    electron_id_wp=electron_config["electron_id_wp"],
+                    electron_iso_wp=electron_config["electron_iso_wp"],
                 )
-                # add electron reco weights
-                electron_corrector.add_reco_weight()
-                # muon corrector
-                muon_corrector = MuonCorrector(
+                selected_objects[electron_key] = events.Electron[good_electrons]
+            electrons = selected_objects[electron_key]
+
+            # select good muons
+            muon_config = ttbar_muon_selection[channel][lepton_flavor]
+            muon_key = ("muons", config_key(muon_config), electron_key)
+            if muon_key not in selected_objects:
+                good_muons = select_good_muons(
                     muons=corrected_muons,
-                    weights=weights_container,
-                    year=self._year,
-                    year_mod=self._yearmod,
-                    variation=syst_var,
-                    id_wp=ttbar_muon_selection[self._channel][self._lepton_flavor][
-                        "muon_id_wp"
-                    ],
-                    iso_wp=ttbar_muon_selection[self._channel][self._lepton_flavor][
-                        "muon_iso_wp"
-                    ],
+                    muon_pt_threshold=muon_config["muon_pt_threshold"],
+                    muon_id_wp=muon_config["muon_id_wp"],
+                    muon_iso_wp=muon_config["muon_iso_wp"],
                 )
-                # add muon ID weights
-                muon_corrector.add_id_weight()
-                # add muon iso weights
-                muon_corrector.add_iso_weight()
-                
-                # add trigger weights
-                if self._channel == "1b1e1mu":
-                    if self._lepton_flavor == "ele":
-                        muon_corrector.add_triggeriso_weight(
-                            trigger_mask=trigger_mask["mu"],
-                            trigger_match_mask=trigger_match_mask
-                        )
-                    else:
-                        pass
-                        """
-                        electron_corrector.add_trigger_weight(
-                            trigger_mask=trigger_mask["ele"],
-                            trigger_match_mask=trigger_match_mask
-                        )
-                        """
-                else:
-                    if self._lepton_flavor == "mu":
-                        muon_corrector.add_triggeriso_weight(
-                            trigger_mask=trigger_mask["mu"],
-                            trigger_match_mask=trigger_match_mask
-                        )
-                    else:
-                        pass
-                        """
-                        electron_corrector.add_trigger_weight(
-                            trigger_mask=trigger_mask["ele"],
-                            trigger_match_mask=trigger_match_mask
-                        )
-                        """
-                # add tau weights
-                tau_corrector = TauCorrector(
+                good_muons = (good_muons) & (
+                    delta_r_mask(corrected_muons, electrons, threshold=0.4)
+                )
+                selected_objects[muon_key] = corrected_muons[good_muons]
+            muons = selected_objects[muon_key]
+
+            # select good taus
+            tau_config = ttbar_tau_selection[channel][lepton_flavor]
+            tau_key = ("taus", config_key(tau_config), electron_key, muon_key)
+            if tau_key not in selected_objects:
+                good_taus = select_good_taus(
                     taus=corrected_taus,
-                    weights=weights_container,
-                    year=self._year,
-                    year_mod=self._yearmod,
-                    tau_vs_jet=ttbar_tau_selection[self._channel][self._lepton_flavor][
-                        "tau_vs_jet"
-                    ],
-                    tau_vs_ele=ttbar_tau_selection[self._channel][self._lepton_flavor][
-                        "tau_vs_ele"
-                    ],
-                    tau_vs_mu=ttbar_tau_selection[self._channel][self._lepton_flavor][
-                        "tau_vs_mu"
-                    ],
-                    variation=syst_var,
+                    tau_pt_threshold=tau_config["tau_pt_threshold"],
+                    tau_eta_threshold=tau_config["tau_eta_threshold"],
+                    tau_dz_threshold=tau_config["tau_dz_threshold"],
+                    tau_vs_jet=tau_config["tau_vs_jet"],
+                    tau_vs_ele=tau_config["tau_vs_ele"],
+                    tau_vs_mu=tau_config["tau_vs_mu"],
+                    prong=tau_config["prongs"],
+                )
+                good_taus = (
+                    (good_taus)
+                    & (delta_r_mask(corrected_taus, electrons, threshold=0.4))
+                    & (delta_r_mask(corrected_taus, muons, threshold=0.4))
                 )
-                tau_corrector.add_id_weight_DeepTau2017v2p1VSe()
-                tau_corrector.add_id_weight_DeepTau2017v2p1VSmu()
-                tau_corrector.add_id_weight_DeepTau2017v2p1VSjet()
-
-            if syst_var == "nominal":
-                # save sum of weights before selections
-                output["metadata"].update({"sumw": ak.sum(weights_container.weight())})
-                # save weights statistics
-                output["metadata"].update({"weight_statistics": {}})
-                for weight, statistics in weights_container.weightStatistics.items():
-                    output["metadata"]["weight_statistics"][weight] = statistics
-                    
-                    
+                selected_objects[tau_key] = corrected_taus[good_taus]
+            object_keys[region] = {
+                "electrons": electron_key,
+                "muons": muon_key,
+                "taus": tau_key,
+            }
+
+        # -------------------------------------------------------------
+        # event selection masks (shared by all systematic variations)
+        # -------------------------------------------------------------
+        # start from the pre-selection masks (restricted to the kept events)
+        shared_selections = dict(event_masks)
+
+        # add number of leptons
+        for region in regions:
+            electrons = selected_objects[object_keys[region]["electrons"]]
+            muons = selected_objects[object_keys[region]["muons"]]
+            taus = selected_objects[object_keys[region]["taus"]]
+            lepton_selections = {
+                "one_electron": ak.num(electrons) == 1,
+                "electron_veto": ak.num(electrons) == 0,
+                "one_muon": ak.num(muons) == 1,
+                "muon_veto": ak.num(muons) == 0,
+                "tau_veto": ak.num(taus) == 0,
+            }
+            for cut_name, selection_mask in lepton_selections.items():
+                if cut_name in self._selection_names[region]:
+                    selection_name = self._selection_names[region][cut_name]
+                    shared_selections[selection_name] = selection_mask
+
+        # nominal weights of every event of the chunk (for the selection store)
+        store_weights = {}
+        # MET shift from the tau energy (only MC) and rochester corrections. They do not
+        # depend on the systematic variation, so it is computed once
+        # https://github.com/columnflow/columnflow/blob/16d35bb2f25f62f9110a8f1089e8dc5c62b29825/columnflow/calibration/util.py#L42
+        # https://github.com/Katsch21/hh2bbtautau/blob/e268752454a0ce0089ff08cc6c373a353be77679/hbt/calibration/tau.py#L117
+        met_corrections = [(events.Muon, corrected_muons)]
+        if self.is_mc:
+            met_corrections.insert(0, (events.Tau, corrected_taus))
+        met_shift = get_met_shift(met_corrections, len(events))
+        for syst_var in syst_variations:
+
             # -------------------------------------------------------------
-            # object selection
-            # -------------------------------------------------------------         
-            # select good electrons
-            good_electrons = select_good_electrons(
-                events=events,
-                electron_pt_threshold=ttbar_electron_selection[self._channel][
-                    self._lepton_flavor
-                ]["electron_pt_threshold"],
-                electron_id_wp=ttbar_electron_selection[self._channel][
-                    self._lepton_flavor
-                ]["electron_id_wp"],
-                electron_iso_wp=ttbar_electron_selection[self._channel][
-                    self._lepton_flavor
-                ]["electron_iso_wp"],
-            )
-            electrons = events.Electron[good_electrons]
-            
-            # select good muons
-            good_muons = select_good_muons(
-                muons=corrected_muons,
-                muon_pt_threshold=ttbar_muon_selection[self._channel][
-                    self._lepton_flavor
-                ]["muon_pt_threshold"],
-                muon_id_wp=ttbar_muon_selection[self._channel][self._lepton_flavor][
-                    "muon_id_wp"
-                ],
-                muon_iso_wp=ttbar_muon_selection[self._channel][self._lepton_flavor][
-                    "muon_iso_wp"
-                ],
-            )
-            good_muons = (good_muons) & (
-                delta_r_mask(corrected_muons, electrons, threshold=0.4)
-            )
-            muons = corrected_muons[good_muons]
-            
-            # select good taus
-            good_taus = select_good_taus(
-                taus=corrected_taus,
-                tau_pt_threshold=ttbar_tau_selection[self._channel][
-                    self._lepton_flavor
-                ]["tau_pt_threshold"],
-                tau_eta_threshold=ttbar_tau_selection[self._channel][
-                    self._lepton_flavor
-                ]["tau_eta_threshold"],
-                tau_dz_threshold=ttbar_tau_selection[self._channel][
-                    self._lepton_flavor
-                ]["tau_dz_threshold"],
-                tau_vs_jet=ttbar_tau_selection[self._channel][self._lepton_flavor][
-                    "tau_vs_jet"
-                ],
-                tau_vs_ele=ttbar_tau_selection[self._channel][self._lepton_flavor][
-                    "tau_vs_ele"
-                ],
-                tau_vs_mu=ttbar_tau_selection[self._channel][self._lepton_flavor][
-                    "tau_vs_mu"
-                ],
-                prong=ttbar_tau_selection[self._channel][self._lepton_flavor]["prongs"],
-            )
-            good_taus = (
-                (good_taus)
-                & (delta_r_mask(corrected_taus, electrons, threshold=0.4))
-                & (delta_r_mask(corrected_taus, muons, threshold=0.4))
-            )
-            taus = corrected_taus[good_taus]
-            
-            # select good bjets
-            good_bjets = select_good_bjets(
-                jets=corrected_jets,
+            # object corrections
+            # -------------------------------------------------------------
+            # get JEC/JER and MET UnclusteredEnergy shifts
+            corrected_jets, met = jet_met_shift(nominal_jets, nominal_met, syst_var)
+
+            # apply MET phi corrections
+            met_pt, met_phi = met_phi_corrections(
+                met_pt=met.pt,
+                met_phi=met.phi,
+                npvs=events.PV.npvsGood,
+                run=events.run,
+                is_mc=self.is_mc,
                 year=self._year,
-                btag_working_point=ttbar_jet_selection[self._channel][
-                    self._lepton_flavor
-                ]["btag_working_point"],
-                jet_pt_threshold=ttbar_jet_selection[self._channel][
-                    self._lepton_flavor
-                ]["jet_pt_threshold"],
-                jet_id=ttbar_jet_selection[self._channel][self._lepton_flavor][
-                    "jet_id"
-                ],
-                jet_pileup_id=ttbar_jet_selection[self._channel][self._lepton_flavor][
-                    "jet_pileup_id"
-                ],
-            )
-            good_bjets = (
-                good_bjets
-                & (delta_r_mask(corrected_jets, electrons, threshold=0.4))
-                & (delta_r_mask(corrected_jets, muons, threshold=0.4))
-                & (delta_r_mask(corrected_jets, taus, threshold=0.4))
+                year_mod=self._yearmod,
             )
-            bjets = corrected_jets[good_bjets]
-            
-            
-            # -------------------------------------------------------------  
+            # propagate the tau energy and rochester corrections to MET
+            met["pt"], met["phi"] = propagate_met(met_pt, met_phi, met_shift)
+
+            # -------------------------------------------------------------
             # event selection
-            # -------------------------------------------------------------  
-            # make a PackedSelection object to store selection masks
-            self.selections = PackedSelection()
-            
-            # add luminosity calibration mask (only to data)
-            with importlib.resources.path(
-                "wprime_plus_b.data", "lumi_masks.pkl"
-            ) as path:
-                with open(path, "rb") as handle:
-                    self._lumi_mask = pickle.load(handle)
-            if not self.is_mc:
-                lumi_mask = self._lumi_mask[self._year](
-                    events.run, events.luminosityBlock
-                )
-            else:
-                lumi_mask = np.ones(len(events), dtype="bool")
-            self.selections.add("lumi", lumi_mask)
-
-            # add lepton triggers masks
-            self.selections.add("trigger_ele", trigger_mask["ele"])
-            self.selections.add("trigger_mu", trigger_mask["mu"])
-
-            # add MET filters mask
-            with importlib.resources.path(
-                "wprime_plus_b.data", "metfilters.json"
-            ) as path:
-                with open(path, "r") as handle:
-                    self._metfilters = json.load(handle)[self._year]
-            metfilters = np.ones(nevents, dtype="bool")
-            metfilterkey = "mc" if self.is_mc else "data"
-            for mf in self._metfilters[metfilterkey]:
-                if mf in events.Flag.fields:
-                    metfilters = metfilters & events.Flag[mf]
-            self.selections.add("metfilters", metfilters)
+            # -------------------------------------------------------------
+            # make a PackedSelection object to store the selection masks of every region
+            self.selections = PackedSelection(dtype="uint64")
+
+            # add shared selection masks
+            for selection_name, selection_mask in shared_selections.items():
+                self.selections.add(selection_name, selection_mask)
 
             # check that there be a minimum MET greater than 50 GeV
             self.selections.add("met_pt", met.pt > 50)
 
-            # add number of leptons and jets
-            self.selections.add("one_electron", ak.num(electrons) == 1)
-            self.selections.add("electron_veto", ak.num(electrons) == 0)
-            self.selections.add("one_muon", ak.num(muons) == 1)
-            self.selections.add("muon_veto", ak.num(muons) == 0)
-            self.selections.add("tau_veto", ak.num(taus) == 0)
-            self.selections.add("one_bjet", ak.num(bjets) == 1)
-            self.selections.add("two_bjets", ak.num(bjets) == 2)
-
-            # select events with at least one good vertex
-            self.selections.add("goodvertex", events.PV.npvsGood > 0)
-            
-            # select events with at least one matched trigger object
-            self.selections.add("trigger_match", ak.sum(trigger_match_mask, axis=-1) > 0)
-
-            # define selection regions for each channel
-            region_selection = {
-                "2b1l": {
-                    "ele": [
-                        "goodvertex",
-                        "lumi",
-                        "trigger_ele",
-                        "trigger_match",
-                        "metfilters",
-                        "met_pt",
-                        "two_bjets",
-                        "tau_veto",
-                        "muon_veto",
-                        "one_electron",
-                    ],
-                    "mu": [
-                        "goodvertex",
-                        "lumi",
-                        "trigger_mu",
-                        "trigger_match",
-                        "metfilters",
-                        "met_pt",
-                        "two_bjets",
-                        "tau_veto",
-                        "electron_veto",
-                        "one_muon",
-                    ],
-                },
-                "1b1e1mu": {
-                    "ele": [
-                        "goodvertex",
-                        "lumi",
-                        "trigger_mu",
-                        "trigger_match",
-                        "metfilters",
-                        "met_pt",
-                        "one_bjet",
-                        "tau_veto",
-                        "one_muon",
-                        "one_electron",
-                    ],
-                    "mu": [
-                        "goodvertex",
-                        "lumi",
-                        "trigger_ele",
-                        "trigger_match",
-                        "metfilters",
-                        "met_pt",
-                        "one_bjet",
-                        "tau_veto",
-                        "one_electron",
-                        "one_muon",
-                    ],
-                },
-                "1b1l": {
-                    "ele": [
-                        "goodvertex",
-                        "lumi",
-                        "trigger_ele",
-                        "trigger_match",
-                        "metfilters",
-                        "met_pt",
-                        "one_bjet",
-                        "tau_veto",
-                        "muon_veto",
-                        "one_electron",
-                    ],
-                    "mu": [
-                        "goodvertex",
-                        "lumi",
-                        "trigger_mu",
-                        "trigger_match",
-                        "metfilters",
-                        "met_pt",
-                        "one_bjet",
-                        "tau_veto",
-                        "electron_veto",
-                        "one_muon",
-                    ],
-                },
-            }
-            # save cutflow
-            if syst_var == "nominal":
-                cut_names = region_selection[self._channel][self._lepton_flavor]
-                output["metadata"].update({"cutflow": {}})
-                selections = []
-                for cut_name in cut_names:
-                    selections.append(cut_name)
-                    current_selection = self.selections.all(*selections)
-                    output["metadata"]["cutflow"][cut_name] = ak.sum(
-                        weights_container.weight()[current_selection]
+            for region, (channel, lepton_flavor) in regions.items():
+                electrons = selected_objects[object_keys[region]["electrons"]]
+                muons = selected_objects[object_keys[region]["muons"]]
+                taus = selected_objects[object_keys[region]["taus"]]
+
+                # -------------------------------------------------------------
+                # event SF/weights computation
+                # -------------------------------------------------------------
+                # start from the region weights and add the jet-dependent ones: pujetid, b-tagging
+                weights_container = copy.deepcopy(region_weights[region])
+                if self.is_mc:
+                    self.add_jet_weights(
+                        weights=weights_container,
+                        region=region,
+                        jets=corrected_jets,
+                        genjets=events.GenJet,
+                        variation=syst_var,
                     )
-                    
-            # -------------------------------------------------------------  
-            # event variables
-            # -------------------------------------------------------------  
-            self.selections.add(
-                self._region,
-                self.selections.all(
-                    *region_selection[self._channel][self._lepton_flavor]
-                ),
-            )
-            region_selection = self.selections.all(self._region)
-            # check that there are events left after selection
-            nevents_after = ak.sum(region_selection)
-            if nevents_after > 0:
-                # select region objects
-                region_bjets = bjets[region_selection]
-                region_electrons = electrons[region_selection]
-                region_muons = muons[region_selection]
-                region_met = met[region_selection]
-                
-                # define region leptons
-                region_leptons = (
-                    region_electrons if self._lepton_flavor == "ele" else region_muons
-                )
-                # lepton relative isolation
-                lepton_reliso = (
-                    region_leptons.pfRelIso04_all
-                    if hasattr(region_leptons, "pfRelIso04_all")
-                    else region_leptons.pfRelIso03_all
-                )
-                # leading bjets
-                leading_bjets = ak.firsts(region_bjets)
-                # lepton-bjet deltaR and invariant mass
-                lepton_bjet_dr = leading_bjets.delta_r(region_leptons)
-                lepton_bjet_mass = (region_leptons + leading_bjets).mass
-                # lepton-MET transverse mass and deltaPhi
-                lepton_met_mass = np.sqrt(
-                    2.0
-                    * region_leptons.pt
-                    * region_met.pt
-                    * (
-                        ak.ones_like(region_met.pt)
-                        - np.cos(region_leptons.delta_phi(region_met))
+
+                if syst_var == "nominal":
+                    # scatter the weights of the kept events to the whole chunk. The
+                    # rejected events keep the event-level weights (and their
+                    # variations) of the chunk
+                    full_weights = {}
+                    for variation, weight in get_weight_variations(
+                        weights_container
+                    ).items():
+                        full_weights[variation] = event_weights.weight(
+                            variation if variation in event_weights.variations else None
+                        ).copy()
+                        full_weights[variation][preselection] = weight
+                    store_weights[region] = full_weights["nominal"]
+                    # save sum of weights before selections
+                    region_metadata[region].update(
+                        {"sumw": ak.sum(full_weights["nominal"])}
                     )
+                    # memory footprint of the weights container of each chunk
+                    region_metadata[region].update(
+                        {"weights_nbytes": [weights_container.nbytes]}
+                    )
+                    # save weights statistics
+                    region_metadata[region].update({"weight_statistics": {}})
+                    for weight, statistics in weights_container.weightStatistics.items():
+                        # event-level weights cover the whole chunk, object-level SFs
+                        # only the events passing the pre-selection
+                        if weight in event_weights.weightStatistics:
+                            statistics = event_weights.weightStatistics[weight]
+                        region_metadata[region]["weight_statistics"][weight] = statistics
+
+                # -------------------------------------------------------------
+                # jet selection
+                # -------------------------------------------------------------
+                # select good bjets
+                jet_config = ttbar_jet_selection[channel][lepton_flavor]
+                bjet_key = (
+                    "bjets",
+                    syst_var,
+                    config_key(jet_config),
+                    object_keys[region]["electrons"],
+                    object_keys[region]["muons"],
+                    object_keys[region]["taus"],
                 )
-                lepton_met_delta_phi = np.abs(region_leptons.delta_phi(region_met))
-                # lepton-bJet-MET total transverse mass
-                lepton_met_bjet_mass = np.sqrt(
-                    (region_leptons.pt + leading_bjets.pt + region_met.pt) ** 2
-                    - (region_leptons + leading_bjets + region_met).pt ** 2
-                )
+                if bjet_key not in selected_objects:
+                    good_bjets = select_good_bjets(
+                        jets=corrected_jets,
+                        year=self._year,
+                        btag_working_point=jet_config["btag_working_point"],
+                        jet_pt_threshold=jet_config["jet_pt_threshold"],
+                        jet_id=jet_config["jet_id"],
+                        jet_pileup_id=jet_config["jet_pileup_id"],
+                    )
+                    good_bjets = (
+                        good_bjets
+                        & (delta_r_mask(corrected_jets, electrons, threshold=0.4))
+                        & (delta_r_mask(corrected_jets, muons, threshold=0.4))
+                        & (delta_r_mask(corrected_jets, taus, threshold=0.4))
+                    )
+                    selected_objects[bjet_key] = corrected_jets[good_bjets]
+                bjets = selected_objects[bjet_key]
 
-                self.add_feature("lepton_pt", region_leptons.pt)
-                self.add_feature("lepton_eta", region_leptons.eta)
-                self.add_feature("lepton_phi", region_leptons.phi)
-                self.add_feature("jet_pt", leading_bjets.pt)
-                self.add_feature("jet_eta", leading_bjets.eta)
-                self.add_feature("jet_phi", leading_bjets.phi)
-                self.add_feature("met", region_met.pt)
-                self.add_feature("met_phi", region_met.phi)
-                self.add_feature("lepton_bjet_dr", lepton_bjet_dr)
-                self.add_feature("lepton_bjet_mass", lepton_bjet_mass)
-                self.add_feature("lepton_met_mass", lepton_met_mass)
-                self.add_feature("lepton_met_delta_phi", lepton_met_delta_phi)
-                self.add_feature("lepton_met_bjet_mass", lepton_met_bjet_mass)
-                self.add_feature("njets", ak.num(corrected_jets)[region_selection])
-                self.add_feature("npvs", events.PV.npvsGood[region_selection])
+                # add number of jets
+                jet_selections = {
+                    "one_bjet": ak.num(bjets) == 1,
+                    "two_bjets": ak.num(bjets) == 2,
+                }
+                for cut_name, selection_mask in jet_selections.items():
+                    if cut_name in self._selection_names[region]:
+                        self.selections.add(
+                            self._selection_names[region][cut_name], selection_mask
+                        )
 
+                # save cutflow
                 if syst_var == "nominal":
-                # save weighted events to metadata
-                    output["metadata"].update(
-                        {
-                            "weighted_final_nevents": ak.sum(
-                                weights_container.weight()[region_selection]
-                            ),
-                            "raw_final_nevents": nevents_after,
-                        }
+                    self.add_cutflow(
+                        region_metadata[region],
+                        region,
+                        chunk_masks=chunk_event_masks,
+                        selections=self.selections,
+                        evaluated=preselection,
+                        weights=full_weights,
                     )
-                    
-                # -------------------------------------------------------------  
-                # histogram filling
-                # -------------------------------------------------------------  
-                if self._output_type == "hist":
-                    # break up the histogram filling for event-wise variations and object-wise variations
-                    # apply event-wise variations only for nominal
-                    if self.is_mc and syst_var == "nominal":
-                        # get event weight systematic variations for MC samples
-                        variations = ["nominal"] + list(weights_container.variations)
-                        for variation in variations:
-                            if variation == "nominal":
-                                region_weight = weights_container.weight()[
-                                    region_selection
-                                ]
-                            else:
-                                region_weight = weights_container.weight(
-                                    modifier=variation
-                                )[region_selection]
-                            for kin in hist_dict[self._region]:
-                                fill_args = {
-                                    feature: normalize(self.features[feature])
-                                    for feature in hist_dict[self._region][
-                                        kin
-                                    ].axes.name
-                                    if feature not in ["variation"]
-                                }
-                                hist_dict[self._region][kin].fill(
-                                    **fill_args,
-                                    variation=variation,
-                                    weight=region_weight,
+
+                # -------------------------------------------------------------
+                # event variables
+                # -------------------------------------------------------------
+                region_selection = self.selections.all(
+                    *self._selection_names[region].values()
+                )
+                # check that there are events left after selection
+                nevents_after = ak.sum(region_selection)
+                if nevents_after > 0:
+                    # select region objects
+                    region_bjets = bjets[region_selection]
+                    region_electrons = electrons[region_selection]
+                    region_muons = muons[region_selection]
+                    region_met = met[region_selection]
+
+                    # define region leptons
+                    region_leptons = (
+                        region_electrons if lepton_flavor == "ele" else region_muons
+                    )
+                    # lepton relative isolation
+                    lepton_reliso = (
+                        region_leptons.pfRelIso04_all
+                        if hasattr(region_leptons, "pfRelIso04_all")
+                        else region_leptons.pfRelIso03_all
+                    )
+                    # leading bjets
+                    leading_bjets = ak.firsts(region_bjets)
+                    # lepton-bjet deltaR and invariant mass
+                    lepton_bjet_dr = leading_bjets.delta_r(region_leptons)
+                    lepton_bjet_mass = (region_leptons + leading_bjets).mass
+                    # lepton-MET transverse mass and deltaPhi
+                    lepton_met_mass = np.sqrt(
+                        2.0
+                        * region_leptons.pt
+                        * region_met.pt
+                        * (
+                            ak.ones_like(region_met.pt)
+                            - np.cos(region_leptons.delta_phi(region_met))
+                        )
+                    )
+                    lepton_met_delta_phi = np.abs(region_leptons.delta_phi(region_met))
+                    # lepton-bJet-MET total transverse mass
+                    lepton_met_bjet_mass = np.sqrt(
+                        (region_leptons.pt + leading_bjets.pt + region_met.pt) ** 2
+                        - (region_leptons + leading_bjets + region_met).pt ** 2
+                    )
+
+                    self.features = {}
+                    self.add_feature("lepton_pt", region_leptons.pt)
+                    self.add_feature("lepton_eta", region_leptons.eta)
+                    self.add_feature("lepton_phi", region_leptons.phi)
+                    self.add_feature("jet_pt", leading_bjets.pt)
+                    self.add_feature("jet_eta", leading_bjets.eta)
+                    self.add_feature("jet_phi", leading_bjets.phi)
+                    self.add_feature("met", region_met.pt)
+                    self.add_feature("met_phi", region_met.phi)
+                    self.add_feature("lepton_bjet_dr", lepton_bjet_dr)
+                    self.add_feature("lepton_bjet_mass", lepton_bjet_mass)
+                    self.add_feature("lepton_met_mass", lepton_met_mass)
+                    self.add_feature("lepton_met_delta_phi", lepton_met_delta_phi)
+                    self.add_feature("lepton_met_bjet_mass", lepton_met_bjet_mass)
+                    self.add_feature("njets", ak.num(corrected_jets)[region_selection])
+                    self.add_feature("npvs", events.PV.npvsGood[region_selection])
+
+                    if syst_var == "nominal":
+                        # save weighted events to metadata
+                        region_metadata[region].update(
+                            {
+                                "weighted_final_nevents": ak.sum(
+                                    weights_container.weight()[region_selection]
+                                ),
+                                "raw_final_nevents": nevents_after,
+                            }
+                        )
+
+                    # -------------------------------------------------------------
+                    # histogram filling
+                    # -------------------------------------------------------------
+                    if self._output_type == "hist":
+                        # break up the histogram filling for event-wise variations and object-wise variations
+                        # apply event-wise variations only for nominal
+                        if self.is_mc and syst_var == "nominal":
+                            # get event weight systematic variations for MC samples
+                            variation_weights = {
+                                "nominal": weights_container.weight()[region_selection]
+                            }
+                            # variations are only computed for the selected events
+                            for variation in weights_container.variations:
+                                variation_weights[variation] = weights_container.weight(
+                                    modifier=variation, mask=region_selection
                                 )
-                    elif self.is_mc and syst_var != "nominal":
-                        # object-wise variations
-                        region_weight = weights_container.weight()[region_selection]
-                        for kin in hist_dict[self._region]:
-                            # get filling arguments
-
-                            fill_args = {
-                                feature: normalize(self.features[feature])
-                                for feature in hist_dict[self._region][kin].axes.name[
-                                    :-1
-                                ]
-                                if feature not in ["variation"]
+                        else:
+                            # object-wise variations
+                            variation_weights = {
+                                syst_var: weights_container.weight()[region_selection]
                             }
-                            # fill histograms
-                            hist_dict[self._region][kin].fill(
-                                **fill_args,
-                                variation=syst_var,
-                                weight=region_weight,
+                        # convert features once and fill every variation in a single pass
+                        fill_values = {
+                            feature_name: normalize(feature_array)
+                            for feature_name, feature_array in self.features.items()
+                        }
+                        for kin in hist_dict[region]:
+                            histograms.fill_variations(
+                                histogram=hist_dict[region][kin],
+                                values={
+                                    feature: fill_values[feature]
+                                    for feature in hist_dict[region][kin].axes.name
+                                    if feature not in ["variation"]
+                                },
+                                variation_weights=variation_weights,
                             )
-                    elif not self.is_mc and syst_var == "nominal":
-                        # object-wise variations
-                        region_weight = weights_container.weight()[region_selection]
-                        for kin in hist_dict[self._region]:
-                            # get filling arguments
-                            fill_args = {
-                                feature: normalize(self.features[feature])
-                                for feature in hist_dict[self._region][kin].axes.name[
-                                    :-1
-                                ]
-                                if feature not in ["variation"]
-                            }
-                            # fill histograms
-                            hist_dict[self._region][kin].fill(
-                                **fill_args,
-                                variation=syst_var,
-                                weight=region_weight,
+                    elif self._output_type == "array":
+                        self.add_feature(
+                            "weights", weights_container.weight()[region_selection]
+                        )
+                        # uncoment next two lines to save individual weights
+                        # for weight in weights_container.weightStatistics:
+                        #    self.add_feature(weight, weights_container.partial_weight(include=[weight]))
+                        if syst_var == "nominal":
+                            # write selected variables to parquet (one directory per region
+                            # when several regions are evaluated)
+                            output_location = (
+                                self._output_location
+                                if len(self._regions) == 1
+                                else f"{self._output_location}/{region}"
                             )
-                elif self._output_type == "array":
-                    array_dict = {}
-                    self.add_feature(
-                        "weights", weights_container.weight()[region_selection]
-                    )
-                    # uncoment next two lines to save individual weights
-                    # for weight in weights_container.weightStatistics:
-                    #    self.add_feature(weight, weights_container.partial_weight(include=[weight]))
-                    if syst_var == "nominal":
-                        # select variables and put them in column accumulators
-                        array_dict.update({
-                            feature_name: processor.column_accumulator(
-                                normalize(feature_array)
+                            manifest.extend(
+                                write_parquet_partition(
+                                    features={
+                                        feature_name: normalize(feature_array)
+                                        for feature_name, feature_array in self.features.items()
+                                    },
+                                    output_location=output_location,
+                                    dataset=dataset,
+                                    partition_key=get_partition_key(events),
+                                )
                             )
-                            for feature_name, feature_array in self.features.items()
-                        })
+            if syst_var == "nominal" and self._selection_location is not None:
+                self.write_selection_store(
+                    events=chunk_events,
+                    dataset=dataset,
+                    chunk_masks=chunk_event_masks,
+                    selections=self.selections,
+                    evaluated=preselection,
+                    weights=store_weights,
+                )
         # define output dictionary accumulator
-        if self._output_type == "hist":
-            output["histograms"] = hist_dict[f"{self._channel}_{self._lepton_flavor}"]
-        elif self._output_type == "array":
-            output["arrays"] = array_dict
-            
-        return {dataset: output}
+        return self.build_output(dataset, output, region_metadata, hist_dict, manifest)
 
     def postprocess(self, accumulator):
-        return accumulator
\ No newline at end of file
+        return accumulator
@@ -8,6 +8,7 @@ import pyarrow.parquet as pq
 from datetime import datetime
 from typing import List, Union
 from coffea.nanoevents.methods import candidate, vector
+from wprime_plus_b.processors.utils.delta_r import delta_r_match_count
 
 
 def normalize(var: ak.Array, cut: ak.Array = None) -> ak.Array:
@@ -83,6 +84,43 @@ def save_dfs_parquet(fname: str, dfs_dict: dict) -> None:
         pq.write_table(table, fname + ".parquet")
 
 
+def get_partition_key(events: ak.Array) -> str:
+    """
+    return a string that identifies the chunk of 'events' (file uuid, tree path and entry range)
+    """
+    return events.behavior["__events_factory__"]._partition_key.replace("/", "_")
+
+
+def write_parquet_partition(
+    features: dict, output_location: str, dataset: str, partition_key: str
+) -> list:
+    """
+    write the features of a single chunk to '<output_location>/<dataset>/<partition_key>.parquet'.
+    Returns the manifest of the chunk, a list with the path and number of rows of the written file
+
+    Parameters:
+    -----------
+        features:
+            dictionary of flat feature arrays
+        output_location:
+            parquet dataset directory
+        dataset:
+            dataset name, used as partition directory
+        partition_key:
+            chunk identifier, used as file name
+    """
+    table = pa.Table.from_pydict(
+        {name: np.asarray(array) for name, array in features.items()}
+    )
+    if table.num_rows == 0:  # skip chunks with empty entries
+        return []
+    output_directory = f"{output_location}/{dataset}"
+    os.makedirs(output_directory, exist_ok=True)
+    fname = f"{output_directory}/{partition_key}.parquet"
+    pq.write_table(table, fname)
+    return [{"path": fname, "nrows": table.num_rows}]
+
+
 def ak_to_pandas(output_collection: dict) -> pd.DataFrame:
     """
     cast awkward array into a pandas dataframe
@@ -108,9 +146,7 @@ def save_output(
     with open("wprime_plus_b/data/simplified_samples.json", "r") as f:
         simplified_samples = json.load(f)
     sample = simplified_samples[year][dataset]
-    partition_key = events.behavior["__events_factory__"]._partition_key.replace(
-        "/", "_"
-    )
+    partition_key = get_partition_key(events)
     date = datetime.today().strftime("%Y-%m-%d")
 
     # creating directories for each channel and sample
@@ -191,8 +227,7 @@ def delta_r_mask(first: ak.Array, second: ak.Array, threshold: float) -> ak.Arra
     -------
         boolean array of objects in objects1 which pass delta_R requirement
     """
-    mval = first.metric_table(second)
-    return ak.all(mval > threshold, axis=-1)
+    return delta_r_match_count(first, second, threshold, inclusive=True) == 0
 
 
 def trigger_match(leptons: ak.Array, trigobjs: ak.Array, trigger_path: str):
@@ -224,8 +259,11 @@ def trigger_match(leptons: ak.Array, trigobjs: ak.Array, trigger_path: str):
     pass_id = match_configs[trigger_path]["id"]
     pass_filterbit = match_configs[trigger_path]["filterbit"]
     trigger_cands = trigobjs[pass_pt & pass_id & pass_filterbit]
-    delta_r = leptons.metric_table(trigger_cands)
-    pass_delta_r = delta_r < 0.1
-    n_of_trigger_matches = ak.sum(pass_delta_r, axis=2)
+    n_of_trigger_matches = delta_r_match_count(leptons, trigger_cands, threshold=0.1)
     trig_matched_locs = n_of_trigger_matches >= 1
-    return trig_matched_locs
\ No newline at end of file
+    return trig_matched_locs
+
+
+def config_key(config: dict) -> tuple:
+    """return a hashable key of a selection config (used to share selected objects between regions)"""
+    return tuple(sorted(config.items()))
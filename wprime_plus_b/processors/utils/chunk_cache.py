@@ -0,0 +1,354 @@
+import copy
+import numpy as np
+import awkward as ak
+import importlib.resources
+from typing import Any, Callable, Tuple
+from contextlib import contextmanager
+from wprime_plus_b.corrections.utils import get_pog_json
+from wprime_plus_b.corrections.jec import jet_corrections
+from wprime_plus_b.corrections.pileup import add_pileup_weight
+from wprime_plus_b.corrections.l1prefiring import add_l1prefiring_weight
+from wprime_plus_b.corrections.tau_energy import tau_energy_scale
+from wprime_plus_b.corrections.rochester import (
+    rochester_files,
+    apply_rochester_corrections,
+)
+from wprime_plus_b.processors.utils.disk_cache import disk_cache
+from wprime_plus_b.processors.utils.weights import CompactWeights
+
+
+class ChunkCache:
+    """
+    Per-chunk store of the corrected objects and common weights, shared by the
+    analyses that 'MultiAnalysisProcessor' runs over the same chunk.
+
+    Values are only reused while a chunk is active (see 'activate') and for the
+    same events array the chunk was activated with. Outside an active chunk every
+    request is computed, so a processor running alone behaves as before. Values
+    with a codec are also read from (and written to) the persistent 'disk_cache'
+    when it is enabled.
+    """
+
+    def __init__(self) -> None:
+        self._events = None
+        self._values = {}
+        self._hits = {}
+        self._misses = {}
+
+    @contextmanager
+    def activate(self, events):
+        """share the values computed for 'events' until the context exits"""
+        self._events = events
+        try:
+            yield self
+        finally:
+            self._events = None
+            self._values.clear()
+
+    def is_active(self, events) -> bool:
+        return self._events is not None and events is self._events
+
+    def get(
+        self,
+        key: tuple,
+        events,
+        loader: Callable[[Any], Any],
+        mask: ak.Array = None,
+        codec: "Codec" = None,
+    ) -> Any:
+        """
+        return 'loader(events)' restricted to the events in 'mask'. For the active
+        events (or values kept in the disk cache), the loader runs once per chunk
+        over all events and the stored value is sliced; otherwise the loader runs
+        over the selected events only
+
+        Parameters:
+        -----------
+            key:
+                identifier of the value (name plus any loader argument)
+            events:
+                events collection
+            loader:
+                callable that takes the events and returns an array or a tuple of arrays
+            mask:
+                optional event mask
+            codec:
+                optional arrays encoding of the value, used to keep it in the disk cache
+        """
+        persistent = codec is not None and disk_cache.enabled
+        if not self.is_active(events):
+            if not persistent:
+                return loader(events if mask is None else events[mask])
+            return view(codec.get(key, events, loader), mask)
+        if key in self._values:
+            self._hits[key] = self._hits.get(key, 0) + 1
+        else:
+            self._misses[key] = self._misses.get(key, 0) + 1
+            self._values[key] = (
+                codec.get(key, events, loader) if persistent else loader(events)
+            )
+        return view(self._values[key], mask)
+
+    def stats(self) -> dict:
+        """return hit/miss counters of each value"""
+        return {
+            "_".join(str(k) for k in key): {
+                "hits": self._hits.get(key, 0),
+                "misses": self._misses.get(key, 0),
+            }
+            for key in {**self._hits, **self._misses}
+        }
+
+
+def view(value: Any, mask: ak.Array = None) -> Any:
+    """
+    return a new array (or tuple of arrays) over the same data, so that setting
+    fields on it does not modify the stored value. Weights containers are copied
+    """
+    if isinstance(value, tuple):
+        return tuple(view(v, mask) for v in value)
+    if isinstance(value, CompactWeights):
+        # weights containers are filled by each analysis, so a new one is returned
+        return copy.deepcopy(value) if mask is None else value.subset(mask)
+    if not isinstance(value, ak.Array):
+        return value
+    if mask is not None:
+        return value[mask]
+    return ak.Array(value.layout, behavior=value.behavior)
+
+
+chunk_cache = ChunkCache()
+
+
+class Codec:
+    """
+    Conversion of a cached value to and from the dictionary of arrays kept in the
+    disk cache, plus the correction payload files the value depends on
+    """
+
+    def __init__(
+        self,
+        encode: Callable[[Any], dict],
+        decode: Callable[[Any, dict], Any],
+        payloads: list,
+    ) -> None:
+        self.encode = encode
+        self.decode = decode
+        self.payloads = payloads
+
+    def get(self, key: tuple, events, loader: Callable[[Any], Any]) -> Any:
+        return disk_cache.get(
+            key=key,
+            events=events,
+            loader=loader,
+            encode=self.encode,
+            decode=self.decode,
+            payloads=self.payloads,
+        )
+
+
+def data_paths(*names: str) -> list:
+    """return the paths to the existing files of 'wprime_plus_b.data' among 'names'"""
+    paths = []
+    for name in names:
+        if importlib.resources.is_resource("wprime_plus_b.data", name):
+            with importlib.resources.path("wprime_plus_b.data", name) as path:
+                paths.append(str(path))
+    return paths
+
+
+def with_fields(array: ak.Array, **fields) -> ak.Array:
+    """return a new array with some fields replaced"""
+    array = ak.Array(array.layout, behavior=array.behavior)
+    for name, value in fields.items():
+        array[name] = value
+    return array
+
+
+def encode_jet_corrections(value: Tuple[ak.Array, ak.Array]) -> dict:
+    """keep the corrected kinematics of the jets and MET and their shifts"""
+    jets, met = value
+    arrays = {"jet_pt": jets.pt, "jet_mass": jets.mass}
+    for shift in ["JES_Total", "JER"]:
+        for direction in ["up", "down"]:
+            shifted = jets[shift][direction]
+            arrays[f"jet_{shift}_{direction}_pt"] = shifted.pt
+            arrays[f"jet_{shift}_{direction}_mass"] = shifted.mass
+    arrays.update({"met_pt": met.pt, "met_phi": met.phi})
+    for direction in ["up", "down"]:
+        shifted = met.MET_UnclusteredEnergy[direction]
+        arrays[f"met_UnclusteredEnergy_{direction}_pt"] = shifted.pt
+        arrays[f"met_UnclusteredEnergy_{direction}_phi"] = shifted.phi
+    return arrays
+
+
+def decode_jet_corrections(events, arrays: dict) -> Tuple[ak.Array, ak.Array]:
+    """rebuild the corrected jets and MET from the NanoAOD ones and the cached kinematics"""
+    jets = with_fields(events.Jet, pt=arrays["jet_pt"], mass=arrays["jet_mass"])
+    shifts = {
+        shift: ak.zip(
+            {
+                direction: with_fields(
+                    jets,
+                    pt=arrays[f"jet_{shift}_{direction}_pt"],
+                    mass=arrays[f"jet_{shift}_{direction}_mass"],
+                )
+                for direction in ["up", "down"]
+            }
+        )
+        for shift in ["JES_Total", "JER"]
+    }
+    jets = with_fields(jets, **shifts)
+    met = with_fields(events.MET, pt=arrays["met_pt"], phi=arrays["met_phi"])
+    unclustered = ak.zip(
+        {
+            direction: with_fields(
+                met,
+                pt=arrays[f"met_UnclusteredEnergy_{direction}_pt"],
+                phi=arrays[f"met_UnclusteredEnergy_{direction}_phi"],
+            )
+            for direction in ["up", "down"]
+        }
+    )
+    return jets, with_fields(met, MET_UnclusteredEnergy=unclustered)
+
+
+def encode_weights(weights: CompactWeights) -> dict:
+    """keep the nominal weights and the variation modifiers of a weights container"""
+    arrays = {
+        f"weight_{name}": weights.partial_weight(include=[name])
+        for name in weights.names
+    }
+    arrays.update(
+        {f"modifier_{name}": weights.ratio(name) for name in weights.modifiers}
+    )
+    return arrays
+
+
+def decode_weights(events, arrays: dict, dtype: str = "float64") -> CompactWeights:
+    """rebuild a weights container from the cached weights and modifiers"""
+    weights = CompactWeights(len(events), storeIndividual=True, dtype=dtype)
+    for key, array in arrays.items():
+        if not key.startswith("weight_"):
+            continue
+        name = key[len("weight_") :]
+        weight = ak.to_numpy(array)
+        variations = {}
+        for direction in ["Up", "Down"]:
+            modifier = arrays.get(f"modifier_{name}{direction}")
+            if modifier is not None:
+                # modifiers are relative to the weight, except where the weight is zero
+                modifier = ak.to_numpy(modifier)
+                variations[f"weight{direction}"] = np.where(
+                    weight != 0, modifier * weight, modifier
+                )
+        weights.add(name, weight, **variations)
+    return weights
+
+
+def get_jet_corrections(
+    events, year: str, mask: ak.Array = None
+) -> Tuple[ak.Array, ak.Array]:
+    """return the JEC/JER corrected jets and MET (see 'jet_corrections')"""
+    return chunk_cache.get(
+        key=("jet_corrections", year),
+        events=events,
+        loader=lambda events: jet_corrections(events, year),
+        mask=mask,
+        codec=Codec(
+            encode=encode_jet_corrections,
+            decode=decode_jet_corrections,
+            payloads=data_paths("mc_jec_compiled.pkl.gz"),
+        ),
+    )
+
+
+def get_rochester_pt(events, is_mc: bool, year: str, mask: ak.Array = None) -> ak.Array:
+    """return the Rochester corrected pT of 'events.Muon' (see 'apply_rochester_corrections')"""
+    return chunk_cache.get(
+        key=("rochester", year),
+        events=events,
+        loader=lambda events: apply_rochester_corrections(
+            events, events.Muon, is_mc, year
+        ),
+        mask=mask,
+        codec=Codec(
+            encode=lambda pt: {"pt": pt},
+            decode=lambda events, arrays: arrays["pt"],
+            payloads=data_paths(f"RoccoR{rochester_files[year]}UL.txt"),
+        ),
+    )
+
+
+def get_tau_energy_scale(
+    events,
+    year: str,
+    year_mod: str,
+    id: str,
+    sys: str,
+    mask: ak.Array = None,
+) -> Tuple[ak.Array, ak.Array]:
+    """return the corrected pT and mass of 'events.Tau' (see 'tau_energy_scale')"""
+    return chunk_cache.get(
+        key=("tau_energy_scale", year, year_mod, id, sys),
+        events=events,
+        loader=lambda events: tau_energy_scale(events, year, year_mod, id, sys),
+        mask=mask,
+        codec=Codec(
+            encode=lambda value: {"pt": value[0], "mass": value[1]},
+            decode=lambda events, arrays: (arrays["pt"], arrays["mass"]),
+            payloads=[get_pog_json(json_name="tau", year=year + year_mod)],
+        ),
+    )
+
+
+def get_common_weights(
+    events,
+    is_mc: bool,
+    year: str,
+    year_mod: str,
+    dtype: str = "float64",
+    mask: ak.Array = None,
+) -> CompactWeights:
+    """
+    return a new weights container with the weights shared by every analysis:
+    genweight, l1prefiring and pileup (only to MC)
+
+    Parameters:
+    -----------
+        events:
+            events collection
+        is_mc:
+            True for MC samples
+        year:
+            year of the dataset {'2016', '2017', '2018'}
+        year_mod:
+            year modifier {'', 'APV'}
+        dtype:
+            dtype of the stored weights {'float64', 'float32'} (see 'CompactWeights')
+        mask:
+            optional event mask. The weights are computed for the whole chunk and sliced
+    """
+
+    def loader(events):
+        weights = CompactWeights(len(events), storeIndividual=True, dtype=dtype)
+        if is_mc:
+            # add gen weigths
+            weights.add("genweight", events.genWeight)
+            # add l1prefiring weigths
+            add_l1prefiring_weight(events, weights, year, "nominal")
+            # add pileup weigths
+            add_pileup_weight(events, weights, year, year_mod, "nominal")
+        return weights
+
+    return chunk_cache.get(
+        key=("common_weights", is_mc, year, year_mod, dtype),
+        events=events,
+        loader=loader,
+        mask=mask,
+        codec=Codec(
+            encode=encode_weights,
+            decode=lambda events, arrays: decode_weights(events, arrays, dtype),
+            payloads=[get_pog_json(json_name="pileup", year=year + year_mod)],
+        ),
+    )
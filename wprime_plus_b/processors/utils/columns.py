@@ -0,0 +1,168 @@
+import json
+import importlib.resources
+from typing import Iterable, List
+
+
+def collection_columns(collection: str, fields: list) -> list:
+    """return the NanoAOD branches of some fields of a jagged collection (plus its counts branch)"""
+    return [f"n{collection}"] + [f"{collection}_{field}" for field in fields]
+
+
+def record_columns(record: str, fields: list) -> list:
+    """return the NanoAOD branches of some fields of a flat (one per event) record"""
+    return [f"{record}_{field}" for field in fields]
+
+
+# branches every processor reads (event identifiers, vertices and the MC weight)
+event_columns = [
+    "run",
+    "luminosityBlock",
+    "event",
+    "PV_npvs",
+    "PV_npvsGood",
+    "genWeight",
+]
+
+# branches read by the object selections. The ID and isolation working points
+# are looked up by name from the selection configs, so every working point the
+# configs can ask for is listed. Branches missing in a file (e.g. MC-only branches
+# in data or 'Electron_pfRelIso04_all') are skipped by the reader
+object_columns = {
+    "electrons": collection_columns(
+        "Electron",
+        [
+            "pt",
+            "eta",
+            "phi",
+            "mass",
+            "charge",
+            "pdgId",
+            "cutBased",
+            "cutBased_HEEP",
+            "mvaFall17V2Iso_WP80",
+            "mvaFall17V2Iso_WP90",
+            "mvaFall17V2noIso_WP80",
+            "mvaFall17V2noIso_WP90",
+            "pfRelIso03_all",
+            "pfRelIso04_all",
+        ],
+    ),
+    "muons": collection_columns(
+        "Muon",
+        [
+            "pt",
+            "eta",
+            "phi",
+            "mass",
+            "charge",
+            "pdgId",
+            "looseId",
+            "mediumId",
+            "tightId",
+            "pfRelIso04_all",
+        ],
+    ),
+    "taus": collection_columns(
+        "Tau",
+        [
+            "pt",
+            "eta",
+            "phi",
+            "mass",
+            "charge",
+            "dz",
+            "decayMode",
+            "idDeepTau2017v2p1VSjet",
+            "idDeepTau2017v2p1VSe",
+            "idDeepTau2017v2p1VSmu",
+        ],
+    ),
+    "jets": collection_columns(
+        "Jet", ["pt", "eta", "phi", "mass", "jetId", "puId", "btagDeepFlavB"]
+    ),
+    "met": record_columns("MET", ["pt", "phi"]),
+    "trigger_objects": collection_columns("TrigObj", ["pt", "eta", "phi", "id", "filterBits"]),
+}
+
+# branches read by each corrector (on top of the ones of the corrected objects)
+correction_columns = {
+    "jec": collection_columns("Jet", ["area", "rawFactor", "genJetIdx"])
+    + collection_columns("GenJet", ["pt", "eta", "phi", "mass"])
+    + record_columns("MET", ["MetUnclustEnUpDeltaX", "MetUnclustEnUpDeltaY"])
+    + ["fixedGridRhoFastjetAll"],
+    "met_phi": ["PV_npvsGood", "run"],
+    "rochester": collection_columns("Muon", ["nTrackerLayers", "genPartIdx"])
+    + collection_columns("GenPart", ["pt", "eta", "phi", "mass", "pdgId", "genPartIdxMother"])
+    + ["run", "luminosityBlock", "event"],
+    "tau_energy": collection_columns("Tau", ["genPartFlav"]),
+    "pileup": ["Pileup_nTrueInt"],
+    "l1prefiring": record_columns("L1PreFiringWeight", ["Nom", "Up", "Dn"]),
+    "pujetid": collection_columns("Jet", ["genJetIdx"])
+    + collection_columns("GenJet", ["pt", "eta", "phi", "mass"]),
+    "btag": collection_columns("Jet", ["hadronFlavour"]),
+    "electron_sf": [],
+    "muon_sf": [],
+    "tau_sf": collection_columns("Tau", ["genPartFlav"]),
+}
+
+
+def load_data_json(name: str, year: str) -> dict:
+    """return the entry of a given year in one of the 'wprime_plus_b.data' JSON files"""
+    with importlib.resources.path("wprime_plus_b.data", name) as path:
+        with open(path, "r") as handle:
+            return json.load(handle)[year]
+
+
+def trigger_columns(year: str, flavors: Iterable[str] = ("ele", "mu")) -> list:
+    """
+    return the HLT branches of the analysis triggers
+
+    Parameters:
+    -----------
+        year:
+            year of the dataset {'2016', '2017', '2018'}
+        flavors:
+            trigger flavors {'ele', 'mu'}
+    """
+    triggers = load_data_json("triggers.json", year)
+    return [f"HLT_{trigger}" for flavor in flavors for trigger in triggers[flavor]]
+
+
+def metfilter_columns(year: str) -> list:
+    """return the Flag branches of the MET filters (of both data and MC)"""
+    metfilters = load_data_json("metfilters.json", year)
+    return [f"Flag_{name}" for key in ("data", "mc") for name in metfilters[key]]
+
+
+def get_required_columns(
+    year: str,
+    objects: Iterable[str],
+    corrections: Iterable[str] = (),
+    trigger_flavors: Iterable[str] = (),
+    metfilters: bool = False,
+) -> List[str]:
+    """
+    return the sorted list of NanoAOD branches a processor reads
+
+    Parameters:
+    -----------
+        year:
+            year of the dataset {'2016', '2017', '2018'}
+        objects:
+            selected objects (keys of 'object_columns')
+        corrections:
+            applied corrections (keys of 'correction_columns')
+        trigger_flavors:
+            flavors of the HLT paths {'ele', 'mu'}
+        metfilters:
+            whether the MET filters are applied
+    """
+    columns = set(event_columns)
+    for name in objects:
+        columns.update(object_columns[name])
+    for name in corrections:
+        columns.update(correction_columns[name])
+    columns.update(trigger_columns(year, trigger_flavors))
+    if metfilters:
+        columns.update(metfilter_columns(year))
+    return sorted(columns)
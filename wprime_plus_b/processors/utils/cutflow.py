@@ -0,0 +1,103 @@
+import numpy as np
+from coffea.analysis_tools import Weights
+
+# yields computed for every cut of a cutflow
+CUTFLOW_CATEGORIES = ["cumulative", "n_minus_one", "individual"]
+
+
+def get_weight_variations(weights: Weights, variations: list = None) -> dict:
+    """
+    return a dictionary with the nominal event weights ('nominal') and their variations
+
+    Parameters:
+    -----------
+        weights:
+            Weights container
+        variations:
+            weight variations to include (default: every variation of the container)
+    """
+    if variations is None:
+        variations = sorted(weights.variations)
+    weight_variations = {"nominal": weights.weight()}
+    for variation in variations:
+        weight_variations[variation] = weights.weight(modifier=variation)
+    return weight_variations
+
+
+def compute_cutflow(bits: np.ndarray, cut_names: list, weights: dict = None) -> dict:
+    """
+    return the cumulative, N-1 and individual yields of each cut of a cutflow, computed
+    in a single pass over the packed selection bits. The output has the format:
+
+        {category: {cut_name: {"nevents": int, "sumw": {variation: float}, "sumw2": {...}}}}
+
+    with categories 'cumulative' (all cuts up to 'cut_name'), 'n_minus_one' (all cuts
+    but 'cut_name') and 'individual' ('cut_name' only)
+
+    Parameters:
+    -----------
+        bits:
+            uint64 per event with the bit 'i' set if the event passes 'cut_names[i]'
+            (see 'selection_store.pack_selection_bits')
+        cut_names:
+            cut names, in cutflow order
+        weights:
+            dictionary with variation names as keys and event weights as values
+            (see 'get_weight_variations'). Only raw yields are computed if None
+    """
+    bits = np.asarray(bits, dtype=np.uint64)
+    ncuts = len(cut_names)
+    one = np.uint64(1)
+    all_cuts = np.uint64((1 << ncuts) - 1)
+    # events with the same bits pass the same cuts, so the yields are accumulated
+    # for each distinct bit pattern and then summed over the patterns passing each cut
+    patterns, pattern_index = np.unique(bits, return_inverse=True)
+    # one column per (category, cut)
+    masks = np.empty((len(patterns), len(CUTFLOW_CATEGORIES) * ncuts), dtype=bool)
+    for i in range(ncuts):
+        cut_bit = one << np.uint64(i)
+        cumulative = np.uint64((1 << (i + 1)) - 1)
+        masks[:, i] = (patterns & cumulative) == cumulative
+        masks[:, ncuts + i] = (patterns | cut_bit) == all_cuts
+        masks[:, 2 * ncuts + i] = (patterns & cut_bit) != 0
+    pattern_nevents = np.bincount(pattern_index, minlength=len(patterns))
+    nevents = masks.T.astype(np.int64) @ pattern_nevents
+    if weights:
+        variations = list(weights)
+        pattern_sumw = np.empty((len(patterns), len(variations)))
+        pattern_sumw2 = np.empty((len(patterns), len(variations)))
+        for v, variation in enumerate(variations):
+            weight = np.asarray(weights[variation], dtype=np.float64)
+            pattern_sumw[:, v] = np.bincount(
+                pattern_index, weights=weight, minlength=len(patterns)
+            )
+            pattern_sumw2[:, v] = np.bincount(
+                pattern_index, weights=weight**2, minlength=len(patterns)
+            )
+        # weighted yields of every (category, cut) and variation at once
+        sumw = masks.T.astype(np.float64) @ pattern_sumw
+        sumw2 = masks.T.astype(np.float64) @ pattern_sumw2
+    cutflow = {}
+    for c, category in enumerate(CUTFLOW_CATEGORIES):
+        cutflow[category] = {}
+        for i, cut_name in enumerate(cut_names):
+            column = c * ncuts + i
+            cutflow[category][cut_name] = {"nevents": int(nevents[column])}
+            if weights:
+                cutflow[category][cut_name]["sumw"] = {
+                    variation: float(sumw[column, v])
+                    for v, variation in enumerate(variations)
+                }
+                cutflow[category][cut_name]["sumw2"] = {
+                    variation: float(sumw2[column, v])
+                    for v, variation in enumerate(variations)
+                }
+    return cutflow
+
+
+def cumulative_sumw(cutflow: dict, variation: str = "nominal") -> dict:
+    """return the cumulative weighted yields of a cutflow (see 'compute_cutflow')"""
+    return {
+        cut_name: yields["sumw"][variation]
+        for cut_name, yields in cutflow["cumulative"].items()
+    }
@@ -0,0 +1,74 @@
+import numba
+import numpy as np
+import awkward as ak
+
+
+@numba.njit(cache=True)
+def _delta_r_match_count(
+    offsets1: np.ndarray,
+    eta1: np.ndarray,
+    phi1: np.ndarray,
+    offsets2: np.ndarray,
+    eta2: np.ndarray,
+    phi2: np.ndarray,
+    threshold: float,
+    inclusive: bool,
+) -> np.ndarray:
+    """
+    count, for each object of the first collection, the objects of the second collection
+    of the same event with delta R below 'threshold' (or equal to it, if 'inclusive')
+    """
+    counts = np.zeros(len(eta1), dtype=np.int32)
+    for event in range(len(offsets1) - 1):
+        start2, stop2 = offsets2[event], offsets2[event + 1]
+        if start2 == stop2:
+            continue
+        for i in range(offsets1[event], offsets1[event + 1]):
+            for j in range(start2, stop2):
+                deta = eta1[i] - eta2[j]
+                # same convention as coffea's 'delta_phi'
+                dphi = (phi1[i] - phi2[j] + np.pi) % (2 * np.pi) - np.pi
+                delta_r = np.sqrt(deta * deta + dphi * dphi)
+                if delta_r < threshold or (inclusive and delta_r == threshold):
+                    counts[i] += 1
+    return counts
+
+
+def flat_eta_phi(objects: ak.Array) -> tuple:
+    """return the offsets and the flat eta and phi buffers of a jagged collection"""
+    counts = ak.to_numpy(ak.num(objects, axis=1))
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    eta = ak.to_numpy(ak.flatten(objects.eta))
+    phi = ak.to_numpy(ak.flatten(objects.phi))
+    return counts, offsets, eta, phi
+
+
+def delta_r_match_count(
+    first: ak.Array, second: ak.Array, threshold: float, inclusive: bool = False
+) -> ak.Array:
+    """
+    Return the number of objects in 'second' with delta R below 'threshold' from each
+    object in 'first', with the same shape as 'first'. Equivalent to
+    'ak.sum(first.metric_table(second) < threshold, axis=-1)', without building the
+    object pairs of each event.
+
+    Parameters:
+    -----------
+        first:
+            objects to be matched
+        second:
+            objects to match to (same number of events as 'first')
+        threshold:
+            delta R threshold
+        inclusive:
+            if True, also count the objects at exactly 'threshold'
+    """
+    counts1, offsets1, eta1, phi1 = flat_eta_phi(first)
+    _, offsets2, eta2, phi2 = flat_eta_phi(second)
+    if len(offsets1) != len(offsets2):
+        raise ValueError("'first' and 'second' must have the same number of events")
+    matches = _delta_r_match_count(
+        offsets1, eta1, phi1, offsets2, eta2, phi2, threshold, inclusive
+    )
+    return ak.unflatten(matches, counts1)
@@ -0,0 +1,215 @@
+import os
+import json
+import glob
+import hashlib
+import numpy as np
+import awkward as ak
+from pathlib import Path
+from typing import Any, Callable, Iterable
+from wprime_plus_b.corrections import registry
+from wprime_plus_b.processors.utils.analysis_utils import get_partition_key
+
+# bump when the layout of the stored entries changes
+CACHE_FORMAT_VERSION = 1
+
+# modules whose code determines the cached values (see 'code_version')
+CACHED_CODE = [
+    "wprime_plus_b/corrections/jec.py",
+    "wprime_plus_b/corrections/rochester.py",
+    "wprime_plus_b/corrections/tau_energy.py",
+    "wprime_plus_b/corrections/pileup.py",
+    "wprime_plus_b/corrections/l1prefiring.py",
+    "wprime_plus_b/corrections/utils.py",
+    "wprime_plus_b/corrections/sf_table.py",
+    "wprime_plus_b/processors/utils/chunk_cache.py",
+    "wprime_plus_b/processors/utils/disk_cache.py",
+    "wprime_plus_b/processors/utils/weights.py",
+]
+
+
+def hash_files(paths: Iterable[str]) -> str:
+    """return the sha256 of the contents of some files (missing files are hashed by name)"""
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(str(path).encode())
+        if os.path.isfile(path):
+            with open(path, "rb") as handle:
+                for block in iter(lambda: handle.read(1 << 20), b""):
+                    digest.update(block)
+    return digest.hexdigest()
+
+
+def payload_hash(paths: Iterable[str]) -> str:
+    """return the hash of some correction payload files (once per worker process)"""
+    paths = tuple(str(path) for path in paths)
+    return registry.get(
+        payload=f"payload_hash_{hashlib.sha256(repr(paths).encode()).hexdigest()}",
+        year="",
+        loader=lambda: hash_files(paths),
+    )
+
+
+def code_version() -> str:
+    """return the hash of the code that computes the cached values (once per worker process)"""
+    root = Path(__file__).resolve().parents[3]
+    return registry.get(
+        payload="cache_code_version",
+        year="",
+        loader=lambda: hash_files([root / module for module in CACHED_CODE]),
+    )
+
+
+def save_arrays(path: str, arrays: dict) -> None:
+    """write a dictionary of awkward (or numpy) arrays to a single .npz file"""
+    contents, metadata = {}, {}
+    for name, array in arrays.items():
+        form, length, container = ak.to_buffers(
+            ak.packed(ak.Array(array)), form_key=f"{name}-node{{id}}"
+        )
+        metadata[name] = {"form": form.tojson(), "length": length}
+        contents.update(container)
+    # write to a temporary file first, so concurrent readers never see partial entries
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as handle:
+        np.savez(
+            handle,
+            __metadata__=np.frombuffer(json.dumps(metadata).encode(), dtype=np.uint8),
+            **contents,
+        )
+    os.replace(tmp_path, path)
+
+
+def load_arrays(path: str, behavior: dict = None) -> dict:
+    """read a dictionary of awkward arrays written by 'save_arrays'"""
+    with np.load(path) as data:
+        metadata = json.loads(data["__metadata__"].tobytes().decode())
+        container = {key: data[key] for key in data.files if key != "__metadata__"}
+    return {
+        name: ak.from_buffers(
+            ak.forms.Form.fromjson(entry["form"]),
+            entry["length"],
+            container,
+            behavior=behavior,
+        )
+        for name, entry in metadata.items()
+    }
+
+
+class DiskCache:
+    """
+    Persistent cache of corrected object collections and event weights
+
+    Entries hold the arrays computed over a whole chunk and are keyed by the chunk
+    (input file UUID and entry range), the value name and arguments, the hashes of
+    the correction payloads it depends on and the version of the correction code, so
+    changing any of them leads to a new entry. Least recently used entries are removed
+    once the cache directory exceeds its disk budget. The cache is disabled until a
+    directory is set with 'configure'.
+    """
+
+    def __init__(self) -> None:
+        self._directory = None
+        self._budget = 0
+        self._hits = 0
+        self._misses = 0
+
+    def configure(self, directory: str = None, budget: float = 10) -> None:
+        """
+        set the cache directory (None disables the cache) and its disk budget in GB
+        """
+        self._directory = directory
+        self._budget = budget * 1024**3
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self._directory is not None
+
+    def entry_path(self, key: tuple, events, payloads: Iterable[str]) -> str:
+        """return the path of the entry of 'key' for the chunk of 'events'"""
+        digest = hashlib.sha256(
+            json.dumps(
+                [
+                    CACHE_FORMAT_VERSION,
+                    code_version(),
+                    get_partition_key(events),
+                    # a subset of the chunk shares its partition key
+                    len(events),
+                    [str(k) for k in key],
+                    payload_hash(payloads),
+                ]
+            ).encode()
+        ).hexdigest()
+        return f"{self._directory}/{digest}.npz"
+
+    def get(
+        self,
+        key: tuple,
+        events,
+        loader: Callable[[Any], Any],
+        encode: Callable[[Any], dict],
+        decode: Callable[[Any, dict], Any],
+        payloads: Iterable[str] = (),
+    ) -> Any:
+        """
+        return 'loader(events)', read from the cache if the entry exists
+
+        Parameters:
+        -----------
+            key:
+                identifier of the value (name plus any loader argument)
+            events:
+                events collection of the whole chunk
+            loader:
+                callable that takes the events and computes the value
+            encode:
+                callable that takes the value and returns the dictionary of arrays to store
+            decode:
+                callable that takes the events and the stored arrays and returns the value
+            payloads:
+                paths to the correction payload files used by the loader
+        """
+        path = self.entry_path(key, events, payloads)
+        if os.path.isfile(path):
+            try:
+                arrays = load_arrays(path, behavior=events.behavior)
+            except (OSError, ValueError, KeyError):
+                # unreadable entry (e.g. removed while reading): compute it again
+                arrays = None
+            if arrays is not None:
+                self._hits += 1
+                # mark the entry as recently used
+                os.utime(path)
+                return decode(events, arrays)
+        self._misses += 1
+        value = loader(events)
+        save_arrays(path, encode(value))
+        self.evict()
+        return value
+
+    def evict(self) -> None:
+        """remove the least recently used entries until the cache fits its disk budget"""
+        entries = []
+        for path in glob.glob(f"{self._directory}/*.npz"):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self._budget:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
+
+    def stats(self) -> dict:
+        """return hit/miss counters of the worker process"""
+        return {"hits": self._hits, "misses": self._misses}
+
+
+disk_cache = DiskCache()
@@ -1,6 +1,214 @@
 import hist
 import numpy as np
 
+
+def make_histogram(*axes: hist.axis.AxesMixin) -> hist.Hist:
+    """
+    build an empty histogram with weight storage.
+    The module-level axes are shared by every histogram and must not be modified,
+    hist copies them into each new histogram so growth axes are filled independently
+
+    Parameters:
+    -----------
+        axes:
+            histogram axes
+    """
+    return hist.Hist(*axes, hist.storage.Weight())
+
+
+def build_histograms(hist_specs: dict) -> dict:
+    """
+    build a dictionary of empty histograms from a {name: axes} dictionary of histogram specs
+
+    Parameters:
+    -----------
+        hist_specs:
+            dictionary with histogram names as keys and tuples of axes as values
+    """
+    return {name: make_histogram(*axes) for name, axes in hist_specs.items()}
+
+
+def fill_variations_hist(
+    histogram: hist.Hist, values: dict, variation_weights: dict
+) -> None:
+    """
+    fill a histogram with a 'variation' category axis for several variations with a
+    single 'hist.fill' call. The feature values are broadcast across the variations
+
+    Parameters:
+    -----------
+        histogram:
+            histogram with a 'variation' axis
+        values:
+            dictionary with axis names as keys and flat numpy arrays as values
+        variation_weights:
+            dictionary with variation names as keys and event weights as values
+    """
+    nvariations = len(variation_weights)
+    nentries = len(next(iter(variation_weights.values())))
+    histogram.fill(
+        **{name: np.tile(value, nvariations) for name, value in values.items()},
+        variation=np.repeat(list(variation_weights), nentries),
+        weight=np.concatenate(list(variation_weights.values())),
+    )
+
+
+def supports_fast_fill(histogram: hist.Hist, values: dict) -> bool:
+    """
+    check if a histogram can be filled with 'fast_fill': weight storage, Regular or
+    Variable axes, and StrCategory axes filled with a single category per call
+    """
+    if not isinstance(histogram.storage_type(), hist.storage.Weight):
+        return False
+    for axis in histogram.axes:
+        if isinstance(axis, hist.axis.StrCategory):
+            if not isinstance(values.get(axis.name), str):
+                return False
+        elif not isinstance(axis, (hist.axis.Regular, hist.axis.Variable)):
+            return False
+    return True
+
+
+def flow_index(axis: hist.axis.AxesMixin, value: np.ndarray) -> np.ndarray:
+    """return the bin index of each value in the flow view of 'axis' (-1 if dropped)"""
+    index = np.asarray(axis.index(value), dtype=np.int64)
+    if axis.traits.underflow:
+        index += 1
+    return np.where((index >= 0) & (index < axis.extent), index, -1)
+
+
+def fast_fill(histogram: hist.Hist, values: dict, blocks: list) -> None:
+    """
+    fill a histogram with several blocks of weights that share the same entries and
+    differ in their categories (e.g. one block per weight variation). The bin of each
+    entry is found once, and the weights and squared weights of every block are added
+    to the histogram storage with a single 'np.bincount'
+
+    Parameters:
+    -----------
+        histogram:
+            histogram with weight storage (see 'supports_fast_fill')
+        values:
+            dictionary with the names of the Regular/Variable axes as keys and flat
+            numpy arrays as values
+        blocks:
+            list of ({category axis name: category}, weights) tuples, with distinct
+            categories
+    """
+    category_axes = [
+        axis for axis in histogram.axes if isinstance(axis, hist.axis.StrCategory)
+    ]
+    category_names = [axis.name for axis in category_axes]
+    # add new categories to growth axes with an empty fill
+    missing = [
+        categories
+        for categories, _ in blocks
+        if any(categories[axis.name] not in list(axis) for axis in category_axes)
+    ]
+    if missing:
+        histogram.fill(
+            **{
+                axis.name: (
+                    [categories[axis.name] for categories in missing]
+                    if axis.name in category_names
+                    else np.full(len(missing), axis.edges[0])
+                )
+                for axis in histogram.axes
+            },
+            weight=np.zeros(len(missing)),
+        )
+    # linear bin index of each entry in the flow view of the Regular/Variable axes
+    feature_axes = [axis for axis in histogram.axes if axis.name not in category_names]
+    feature_shape = tuple(axis.extent for axis in feature_axes)
+    nbins = int(np.prod(feature_shape))
+    nentries = len(blocks[0][1])
+    index = np.zeros(nentries, dtype=np.int64)
+    valid = np.ones(nentries, dtype=bool)
+    for axis, extent in zip(feature_axes, feature_shape):
+        axis_index = flow_index(axis, np.asarray(values[axis.name]))
+        valid &= axis_index >= 0
+        index = index * extent + axis_index
+    index = index[valid]
+    # one block of 'nbins' bins per block of weights
+    weights = np.stack([np.asarray(w, dtype=np.float64)[valid] for _, w in blocks])
+    index = (index + nbins * np.arange(len(blocks))[:, None]).ravel()
+    size = nbins * len(blocks)
+    sumw = np.bincount(index, weights=weights.ravel(), minlength=size)
+    sumw2 = np.bincount(index, weights=(weights**2).ravel(), minlength=size)
+    # scatter the blocks into the storage view, with the category axes first
+    view = histogram.view(flow=True)
+    positions = [histogram.axes.name.index(name) for name in category_names]
+    categories = tuple(
+        [axis.index(block_categories[axis.name]) for block_categories, _ in blocks]
+        for axis in category_axes
+    )
+    for field, counts in [("value", sumw), ("variance", sumw2)]:
+        counts = counts.reshape((len(blocks),) + feature_shape)
+        if not category_axes:
+            # without category axes every block goes to the same bins
+            view[field] += counts.sum(axis=0)
+            continue
+        target = np.moveaxis(view[field], positions, list(range(len(positions))))
+        target[categories] += counts
+
+
+def fill(histogram: hist.Hist, values: dict, weight: np.ndarray) -> None:
+    """
+    fill a histogram with 'fast_fill', or with 'hist.fill' if it is not supported
+
+    Parameters:
+    -----------
+        histogram:
+            histogram to fill
+        values:
+            dictionary with axis names as keys and flat numpy arrays (or a single
+            category for category axes) as values
+        weight:
+            event weights
+    """
+    if not supports_fast_fill(histogram, values):
+        histogram.fill(**values, weight=weight)
+        return
+    categories = {name: value for name, value in values.items() if isinstance(value, str)}
+    fast_fill(histogram, values, [(categories, weight)])
+
+
+def fill_variations(
+    histogram: hist.Hist, values: dict, variation_weights: dict
+) -> None:
+    """
+    fill a histogram with a 'variation' category axis for several variations in a single
+    pass (see 'fast_fill'), or with 'hist.fill' if it is not supported
+    (see 'fill_variations_hist')
+
+    Parameters:
+    -----------
+        histogram:
+            histogram with a 'variation' axis
+        values:
+            dictionary with axis names as keys and flat numpy arrays as values
+        variation_weights:
+            dictionary with variation names as keys and event weights as values
+    """
+    variations = list(variation_weights)
+    if not supports_fast_fill(histogram, {**values, "variation": variations[0]}):
+        fill_variations_hist(histogram, values, variation_weights)
+        return
+    categories = {name: value for name, value in values.items() if isinstance(value, str)}
+    fast_fill(
+        histogram,
+        values,
+        [
+            ({**categories, "variation": variation}, weight)
+            for variation, weight in variation_weights.items()
+        ],
+    )
+
+
+def empty_like(histogram: hist.Hist) -> hist.Hist:
+    """build an empty histogram with the same axes and storage of 'histogram'"""
+    return hist.Hist(*histogram.axes, storage=histogram.storage_type())
+
 # --------------------------
 # histogram axes definition
 # --------------------------
@@ -90,47 +298,41 @@ lepton_met_bjet_mass_axis = hist.axis.Variable(
 # ttbar analysis histograms
 # --------------------------
 # jet histogram
-ttbar_jet_hist = hist.Hist(
+ttbar_jet_hist_axes = (
     jet_pt_axis,
     jet_eta_axis,
     jet_phi_axis,
     syst_axis,
-    hist.storage.Weight(),
 )
 # met histogram
-ttbar_met_hist = hist.Hist(
+ttbar_met_hist_axes = (
     ttbar_met_axis,
     met_phi_axis,
     syst_axis,
-    hist.storage.Weight(),
 )
 # lepton histogram
-ttbar_lepton_hist = hist.Hist(
+ttbar_lepton_hist_axes = (
     lepton_pt_axis,
     lepton_eta_axis,
     lepton_phi_axis,
     syst_axis,
-    hist.storage.Weight(),
 )
 # lepton + bjet histogram
-ttbar_lepton_bjet_hist = hist.Hist(
+ttbar_lepton_bjet_hist_axes = (
     lepton_bjet_dr_axis,
     lepton_bjet_mass_axis,
     syst_axis,
-    hist.storage.Weight(),
 )
 # lepton + missing energy histogram
-ttbar_lepton_met_hist = hist.Hist(
+ttbar_lepton_met_hist_axes = (
     lepton_met_mass_axis,
     lepton_met_delta_phi_axis,
     syst_axis,
-    hist.storage.Weight(),
 )
 # lepton + missing energy + bjet histogram
-ttbar_lepton_met_bjet_hist = hist.Hist(
+ttbar_lepton_met_bjet_hist_axes = (
     lepton_met_bjet_mass_axis,
     syst_axis,
-    hist.storage.Weight(),
 )
 
 # number of jets and primary vertices
@@ -146,11 +348,10 @@ n_vertices_axis = hist.axis.Regular(
     stop=60,
     name="npvs",
 )
-ttbar_n_hist = hist.Hist(
+ttbar_n_hist_axes = (
     n_jets_axis,
     n_vertices_axis,
     syst_axis,
-    hist.storage.Weight(),
 )
 
 # -------------------------------
@@ -163,9 +364,8 @@ ptl1_axis = hist.axis.Regular(
     stop=200, 
     name="ptl1",
 )
-ptl1_histogram = hist.Hist(
+ptl1_hist_axes = (
     ptl1_axis,
-    hist.storage.Weight(), 
 )
 ptl2_axis = hist.axis.Regular(
     bins=30, 
@@ -173,9 +373,8 @@ ptl2_axis = hist.axis.Regular(
     stop=200, 
     name="ptl2",
 )
-ptl2_histogram = hist.Hist(
+ptl2_hist_axes = (
     ptl2_axis,
-    hist.storage.Weight(), 
 )
 # ptll 
 ptll_axis = hist.axis.Regular(
@@ -185,17 +384,15 @@ ptll_axis = hist.axis.Regular(
     name="ptll", 
     label="$p_T(ll)$ [GeV]"
 )
-ptll_histogram = hist.Hist(
+ptll_hist_axes = (
     ptll_axis,
-    hist.storage.Weight(), 
 )
 
 mll_axis = hist.axis.Regular(
     40, 30, 500.0, name="mll", label="$m_{ll}$ [GeV]"
 )
-mll_histogram = hist.Hist(
+mll_hist_axes = (
     mll_axis,
-    hist.storage.Weight(), 
 )
 
 # ------------------------
@@ -212,33 +409,55 @@ qcd_met_axis = hist.axis.Variable(
 region_axis = hist.axis.StrCategory(["A", "B", "C", "D"], name="region")
 
 # met histogram
-qcd_met_hist = hist.Hist(
+qcd_met_hist_axes = (
     qcd_met_axis,
     region_axis,
-    hist.storage.Weight(),
 )
 # lepton + MET mass histogram
-qcd_lepton_met_hist = hist.Hist(
+qcd_lepton_met_hist_axes = (
     lepton_met_mass_axis,
     region_axis,
-    hist.storage.Weight(),
 )
 
 # lepton + missing energy + bjet histogram
-qcd_lepton_met_bjet_hist = hist.Hist(
+qcd_lepton_met_bjet_hist_axes = (
     lepton_met_bjet_mass_axis,
     region_axis,
-    hist.storage.Weight(),
 )
 
 # lepton + bjet histogram
-qcd_lepton_bjet_hist = hist.Hist(
+qcd_lepton_bjet_hist_axes = (
     lepton_bjet_mass_axis,
     region_axis,
-    hist.storage.Weight(),
 )
 
 
+# ---------------------------------------
+# histogram specs for each processor
+# ---------------------------------------
+ttbar_hist_specs = {
+    "n_kin": ttbar_n_hist_axes,
+    "jet_kin": ttbar_jet_hist_axes,
+    "met_kin": ttbar_met_hist_axes,
+    "lepton_kin": ttbar_lepton_hist_axes,
+    "lepton_bjet_kin": ttbar_lepton_bjet_hist_axes,
+    "lepton_met_kin": ttbar_lepton_met_hist_axes,
+    "lepton_met_bjet_kin": ttbar_lepton_met_bjet_hist_axes,
+}
+ztoll_hist_specs = {
+    "ptl1": ptl1_hist_axes,
+    "ptl2": ptl2_hist_axes,
+    "ptll": ptll_hist_axes,
+    "mll": mll_hist_axes,
+}
+qcd_hist_specs = {
+    "met_kin": qcd_met_hist_axes,
+    "lepton_bjet_kin": qcd_lepton_bjet_hist_axes,
+    "lepton_met_kin": qcd_lepton_met_hist_axes,
+    "lepton_met_bjet_kin": qcd_lepton_met_bjet_hist_axes,
+}
+
+
 # -----------------------------
 # trigger efficiency histograms
 # ------------------------------
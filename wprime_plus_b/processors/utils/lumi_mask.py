@@ -0,0 +1,87 @@
+import json
+import numpy as np
+import awkward as ak
+import importlib.resources
+from wprime_plus_b.corrections import registry
+
+# golden JSON files for each year
+# https://twiki.cern.ch/twiki/bin/view/CMS/LumiRecommendationsRun2
+golden_jsons = {
+    "2016": "Cert_271036-284044_13TeV_Legacy2016_Collisions16_JSON.txt",
+    "2017": "Cert_294927-306462_13TeV_UL2017_Collisions17_GoldenJSON.txt",
+    "2018": "Cert_314472-325175_13TeV_Legacy2018_Collisions18_JSON.txt",
+}
+
+
+def encode_run_lumi(run: np.ndarray, lumi: np.ndarray) -> np.ndarray:
+    """combine run and lumi block numbers into a single sortable uint64 key"""
+    return (np.asarray(run, dtype=np.uint64) << np.uint64(32)) | np.asarray(
+        lumi, dtype=np.uint64
+    )
+
+
+def build_lumi_mask_index(golden_json: dict) -> np.ndarray:
+    """
+    build a (2, n) array with the first (row 0) and last (row 1) (run, lumi) keys of
+    each certified lumi block range, sorted by the first key
+
+    Parameters:
+    -----------
+        golden_json:
+            dictionary with runs as keys and lists of [first, last] lumi block ranges as values
+    """
+    ranges = np.array(
+        [
+            (int(run), first, last)
+            for run, lumi_ranges in golden_json.items()
+            for first, last in lumi_ranges
+        ],
+        dtype=np.uint64,
+    ).reshape(-1, 3)
+    index = np.stack(
+        [
+            encode_run_lumi(ranges[:, 0], ranges[:, 1]),
+            encode_run_lumi(ranges[:, 0], ranges[:, 2]),
+        ],
+        axis=0,
+    )
+    return np.ascontiguousarray(index[:, np.argsort(index[0])])
+
+
+def load_lumi_mask_index(year: str) -> np.ndarray:
+    """
+    build the lumi mask index of a given year from its golden JSON (once per
+    worker process)
+
+    Parameters:
+    -----------
+        year:
+            year of the dataset {'2016', '2017', '2018'}
+    """
+
+    def loader():
+        with importlib.resources.open_text("wprime_plus_b.data", golden_jsons[year]) as handle:
+            return build_lumi_mask_index(json.load(handle))
+
+    return registry.get(payload="lumi_mask", year=year, loader=loader)
+
+
+def get_lumi_mask(year: str, run: ak.Array, lumi: ak.Array) -> np.ndarray:
+    """
+    return a mask of the events in certified lumi blocks (only to be used with data)
+
+    Parameters:
+    -----------
+        year:
+            year of the dataset {'2016', '2017', '2018'}
+        run:
+            run number of each event
+        lumi:
+            luminosity block of each event
+    """
+    index = load_lumi_mask_index(year)
+    keys = encode_run_lumi(ak.to_numpy(run), ak.to_numpy(lumi))
+    # position of the last range starting at or before each key
+    position = np.searchsorted(index[0], keys, side="right") - 1
+    in_range = keys <= index[1][np.clip(position, 0, None)]
+    return (position >= 0) & in_range
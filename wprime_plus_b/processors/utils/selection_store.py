@@ -0,0 +1,105 @@
+import os
+import json
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from coffea.analysis_tools import PackedSelection
+
+# key of the store metadata in the parquet schema
+STORE_METADATA_KEY = b"wprime_plus_b.selection_store"
+
+
+def pack_selection_bits(
+    selection_names: list,
+    chunk_masks: dict = None,
+    selections: PackedSelection = None,
+    evaluated: np.ndarray = None,
+) -> np.ndarray:
+    """
+    return one uint64 per event with the bit 'i' set if the event passes 'selection_names[i]'
+
+    Parameters:
+    -----------
+        selection_names:
+            selection names, in bit order (at most 64)
+        chunk_masks:
+            masks evaluated on every event of the chunk
+        selections:
+            PackedSelection with the selection masks. If 'evaluated' is given, the
+            masks are only evaluated on those events
+        evaluated:
+            mask of the events where 'selections' was evaluated
+    """
+    if len(selection_names) > 64:
+        raise ValueError("At most 64 selections can be packed in a uint64")
+    chunk_masks = {} if chunk_masks is None else chunk_masks
+    if evaluated is not None:
+        nevents = len(evaluated)
+    elif chunk_masks:
+        nevents = len(next(iter(chunk_masks.values())))
+    else:
+        nevents = len(selections.all())
+    bits = np.zeros(nevents, dtype=np.uint64)
+    for i, name in enumerate(selection_names):
+        if name in chunk_masks:
+            mask = np.asarray(chunk_masks[name], dtype=bool)
+        elif selections is not None and name in selections.names:
+            if evaluated is None:
+                mask = np.asarray(selections.all(name), dtype=bool)
+            else:
+                mask = np.zeros(nevents, dtype=bool)
+                mask[evaluated] = selections.all(name)
+        else:
+            # selections not evaluated in this chunk are failed by every event
+            continue
+        bits |= mask.astype(np.uint64) << np.uint64(i)
+    return bits
+
+
+def write_selection_partition(
+    bits: np.ndarray,
+    evaluated: np.ndarray,
+    weights: dict,
+    metadata: dict,
+    output_location: str,
+    dataset: str,
+    partition_key: str,
+) -> list:
+    """
+    write the selection bits, nominal weights and evaluation flag of every event of a chunk
+    to '<output_location>/<dataset>/<partition_key>.parquet'. Returns the manifest of the
+    chunk, a list with the path and number of rows of the written file
+
+    Parameters:
+    -----------
+        bits:
+            packed selection bits (see 'pack_selection_bits')
+        evaluated:
+            mask of the events where every selection was evaluated. The other events
+            only have the bits of the selections in 'metadata["chunk_selections"]'
+        weights:
+            dictionary with region names as keys and nominal event weights as values
+        metadata:
+            store metadata: 'selection_names' (bit order), 'chunk_selections' (selections
+            evaluated on every event) and 'regions' (cut name -> selection name of each region)
+        output_location:
+            selection store directory
+        dataset:
+            dataset name, used as partition directory
+        partition_key:
+            chunk identifier, used as file name
+    """
+    columns = {"selection": bits, "evaluated": np.asarray(evaluated, dtype=bool)}
+    for region, weight in weights.items():
+        columns[f"weight_{region}"] = np.asarray(weight, dtype=np.float64)
+    table = pa.Table.from_pydict(columns)
+    if table.num_rows == 0:  # skip chunks with empty entries
+        return []
+    table = table.replace_schema_metadata(
+        {STORE_METADATA_KEY: json.dumps(metadata).encode()}
+    )
+    output_directory = f"{output_location}/{dataset}"
+    os.makedirs(output_directory, exist_ok=True)
+    fname = f"{output_directory}/{partition_key}.parquet"
+    pq.write_table(table, fname)
+    return [{"path": fname, "nrows": table.num_rows}]
@@ -0,0 +1,220 @@
+import copy
+import numpy as np
+import awkward as ak
+from coffea.analysis_tools import WeightStatistics
+
+# rows of each weight in the factors buffer
+NOMINAL, UP, DOWN = 0, 1, 2
+
+
+def flat_weight(weight) -> np.ndarray:
+    """return a float64 copy of a flat weight array"""
+    if isinstance(weight, ak.Array):
+        weight = ak.to_numpy(weight)
+    return np.array(weight, dtype=np.float64)
+
+
+def weight_statistics(weight: np.ndarray) -> WeightStatistics:
+    """return the sum, sum of squares, minimum, maximum and size of a weight array"""
+    weight = np.asarray(weight, dtype=np.float64)
+    return WeightStatistics(
+        weight.sum(),
+        (weight**2).sum(),
+        np.min(weight, initial=np.inf),
+        np.max(weight, initial=-np.inf),
+        weight.size,
+    )
+
+
+class CompactWeights:
+    """
+    Drop-in replacement of coffea's 'Weights' container. The weights and the up/down
+    variations (stored as ratios to the weight) are kept in a single contiguous buffer
+    of shape (number of weights, 3, number of events), optionally in float32. The
+    nominal product is updated on each 'add', so a variation is obtained with one
+    multiplication by its ratio, and only for the requested events if a mask is given.
+
+    Parameters:
+    -----------
+        size:
+            number of events
+        storeIndividual:
+            if False, 'partial_weight' is not available (as in 'Weights'). The
+            individual weights are stored anyway, since the variations refer to them
+        dtype:
+            dtype of the stored weights and ratios {'float64', 'float32'}. The nominal
+            product is always float64
+    """
+
+    def __init__(self, size: int, storeIndividual: bool = False, dtype: str = "float64") -> None:
+        self._size = size
+        self._storeIndividual = storeIndividual
+        self._dtype = np.dtype(dtype)
+        self._factors = np.empty((0, 3, size), dtype=self._dtype)
+        self._names = []
+        self._modifiers = []
+        self._weight = np.ones(size, dtype=np.float64)
+        self._weightStats = {}
+
+    def __deepcopy__(self, memo):
+        new = copy.copy(self)
+        # unused rows of the buffer are not copied
+        new._factors = self._factors[: len(self._names)].copy()
+        new._names = list(self._names)
+        new._modifiers = list(self._modifiers)
+        new._weight = self._weight.copy()
+        new._weightStats = copy.deepcopy(self._weightStats, memo)
+        return new
+
+    def subset(self, mask: np.ndarray) -> "CompactWeights":
+        """return a new container with the weights of the events in 'mask'"""
+        mask = np.asarray(mask)
+        new = copy.copy(self)
+        new._factors = self._factors[: len(self._names), :, mask]
+        new._size = new._factors.shape[-1]
+        new._names = list(self._names)
+        new._modifiers = list(self._modifiers)
+        new._weight = self._weight[mask]
+        new._weightStats = {
+            name: weight_statistics(new._factors[row, NOMINAL])
+            for row, name in enumerate(new._names)
+        }
+        return new
+
+    def _new_row(self, name: str) -> int:
+        """return the buffer row of a new weight, growing the buffer if it is full"""
+        if name in self._names:
+            raise ValueError(f"Weight '{name}' has already been added")
+        row = len(self._names)
+        if row == len(self._factors):
+            factors = np.empty(
+                (max(4, 2 * len(self._factors)), 3, self._size), dtype=self._dtype
+            )
+            factors[:row] = self._factors
+            self._factors = factors
+        self._names.append(name)
+        return row
+
+    def add(
+        self,
+        name: str,
+        weight,
+        weightUp=None,
+        weightDown=None,
+        shift: bool = False,
+    ) -> None:
+        """
+        add a new weight (same arguments as 'Weights.add')
+
+        Parameters:
+        -----------
+            name:
+                name of the weight
+            weight:
+                per-event weight
+            weightUp:
+                weight with the up variation
+            weightDown:
+                weight with the down variation
+            shift:
+                if True, 'weightUp' and 'weightDown' are shifts with respect to 'weight'
+        """
+        if name.endswith("Up") or name.endswith("Down"):
+            raise ValueError(
+                "Avoid using 'Up' and 'Down' in weight names, instead pass appropriate shifts to add() call"
+            )
+        weight = flat_weight(weight)
+        row = self._new_row(name)
+        self._factors[row, NOMINAL] = weight
+        self._weight *= weight
+        nonzero = weight != 0
+        for direction, index, variation in [
+            ("Up", UP, weightUp),
+            ("Down", DOWN, weightDown),
+        ]:
+            if variation is None:
+                continue
+            variation = flat_weight(variation)
+            if shift:
+                variation = weight + variation if direction == "Up" else weight - variation
+            # ratios to the weight, except where the weight is zero
+            variation[nonzero] /= weight[nonzero]
+            self._factors[row, index] = variation
+            self._modifiers.append(f"{name}{direction}")
+        self._weightStats[name] = weight_statistics(weight)
+
+    def ratio(self, modifier: str, mask: np.ndarray = None) -> np.ndarray:
+        """
+        return the ratio of the 'modifier' variation to the nominal weight. As in
+        'Weights', a missing down variation is the inverse of the up one
+        """
+        if modifier in self._modifiers:
+            name, index = (
+                (modifier[:-2], UP) if modifier.endswith("Up") else (modifier[:-4], DOWN)
+            )
+            ratio = self._factors[self._names.index(name), index]
+            return ratio if mask is None else ratio[mask]
+        if modifier.endswith("Down") and f"{modifier[:-4]}Up" in self._modifiers:
+            return 1 / self.ratio(f"{modifier[:-4]}Up", mask)
+        raise KeyError(f"Modifier '{modifier}' not found")
+
+    def weight(self, modifier: str = None, mask: np.ndarray = None) -> np.ndarray:
+        """
+        return the nominal weight, or its 'modifier' variation
+
+        Parameters:
+        -----------
+            modifier:
+                variation name (see 'variations'). Nominal weight if None
+            mask:
+                if given, only the weights of the events in the mask are computed
+        """
+        weight = self._weight if mask is None else self._weight[mask]
+        if modifier is None:
+            return weight
+        return weight * self.ratio(modifier, mask)
+
+    def partial_weight(self, include: list = [], exclude: list = []) -> np.ndarray:
+        """return the product of the weights in 'include' or of all but 'exclude'"""
+        if not self._storeIndividual:
+            raise ValueError(
+                "To be able to request weight exclusion, need to store individual weights with storeIndividual=True"
+            )
+        if len(include) > 0 and len(exclude) > 0:
+            raise ValueError("Need to pass include or exclude, not both")
+        rows = [
+            row
+            for row, name in enumerate(self._names)
+            if (not include or name in include) and name not in exclude
+        ]
+        if not rows:
+            return np.ones(self._size, dtype=np.float64)
+        return np.prod(self._factors[rows, NOMINAL], axis=0, dtype=np.float64)
+
+    @property
+    def names(self) -> list:
+        """names of the added weights"""
+        return list(self._names)
+
+    @property
+    def modifiers(self) -> list:
+        """stored variations (a missing down variation is not included)"""
+        return list(self._modifiers)
+
+    @property
+    def variations(self) -> set:
+        """variation names, to be used as 'modifier' in 'weight'"""
+        variations = set(self._modifiers)
+        for modifier in self._modifiers:
+            if modifier.endswith("Up"):
+                variations.add(f"{modifier[:-2]}Down")
+        return variations
+
+    @property
+    def weightStatistics(self) -> dict:
+        return self._weightStats
+
+    @property
+    def nbytes(self) -> int:
+        """memory footprint of the container in bytes"""
+        return self._factors.nbytes + self._weight.nbytes
@@ -1,22 +1,36 @@
 import json
-import copy
-import pickle
 import numpy as np
 import awkward as ak
 import importlib.resources
 from coffea import processor
 from coffea.nanoevents.methods import candidate
-from coffea.analysis_tools import Weights, PackedSelection
+from coffea.analysis_tools import PackedSelection
 from wprime_plus_b.processors.utils import histograms
-from wprime_plus_b.corrections.jec import jet_corrections
+from wprime_plus_b.processors.utils.lumi_mask import get_lumi_mask
+from wprime_plus_b.processors.utils.columns import get_required_columns
+from wprime_plus_b.processors.utils.disk_cache import disk_cache
+from wprime_plus_b.processors.utils.cutflow import (
+    compute_cutflow,
+    cumulative_sumw,
+    get_weight_variations,
+)
+from wprime_plus_b.processors.utils.selection_store import pack_selection_bits
 from wprime_plus_b.corrections.met import met_phi_corrections
 from wprime_plus_b.corrections.btag import BTagCorrector
-from wprime_plus_b.corrections.pileup import add_pileup_weight
 from wprime_plus_b.corrections.pujetid import add_pujetid_weight
-from wprime_plus_b.corrections.l1prefiring import add_l1prefiring_weight
-from wprime_plus_b.corrections.rochester import apply_rochester_corrections
 from wprime_plus_b.corrections.lepton import ElectronCorrector, MuonCorrector
-from wprime_plus_b.processors.utils.analysis_utils import delta_r_mask, normalize
+from wprime_plus_b.processors.utils.chunk_cache import (
+    chunk_cache,
+    get_common_weights,
+    get_jet_corrections,
+    get_rochester_pt,
+)
+from wprime_plus_b.processors.utils.analysis_utils import (
+    delta_r_mask,
+    normalize,
+    get_partition_key,
+    write_parquet_partition,
+)
 from wprime_plus_b.selections.ztoll.jet_selection import select_good_bjets
 from wprime_plus_b.selections.ztoll.config import (
     ztoll_electron_selection,
@@ -36,24 +50,45 @@ class ZToLLProcessor(processor.ProcessorABC):
         year: str = "2017",
         yearmod: str = "",
         lepton_flavor: str = "ele",
-        output_type="array",
+        output_type: str = "hist",
+        output_location: str = None,
+        cache_location: str = None,
+        cache_budget: float = 10,
+        weights_dtype: str = "float64",
     ):
         self._year = year
+        self._cache_location = cache_location
+        self._cache_budget = cache_budget
+        self._weights_dtype = weights_dtype
         self._yearmod = yearmod
         self._lepton_flavor = lepton_flavor
         self._output_type = output_type
+        self._output_location = output_location
+        if self._output_type == "array" and self._output_location is None:
+            raise ValueError("'output_location' is required for 'array' output")
 
-        # initialize output histogram
-        self.hist_dict = {
-            "ptl1": histograms.ptl1_histogram,
-            "ptl2": histograms.ptl2_histogram,
-            "ptll": histograms.ptll_histogram,
-            "mll": histograms.mll_histogram,
-        }
+        # histogram specs
+        self.hist_specs = histograms.ztoll_hist_specs
         # define dictionary to store analysis variables
         self.features = {}
-        # initialize dictionary of arrays
-        self.array_dict = {}
+        # NanoAOD branches read by the processor
+        self.columns = get_required_columns(
+            year=self._year,
+            objects=["electrons", "muons", "jets", "met"],
+            corrections=[
+                "jec",
+                "met_phi",
+                "rochester",
+                "pileup",
+                "l1prefiring",
+                "pujetid",
+                "btag",
+                "electron_sf",
+                "muon_sf",
+            ],
+            trigger_flavors=["ele", "mu"],
+            metfilters=True,
+        )
 
     def add_feature(self, name: str, var: ak.Array) -> None:
         """add a variable array to the out dictionary"""
@@ -65,6 +100,10 @@ class ZToLLProcessor(processor.ProcessorABC):
 
         # get dataset name
         dataset = events.metadata["dataset"]
+        # read (and keep) the corrected objects in the disk cache, if any. Within
+        # 'MultiAnalysisProcessor' the cache is configured by the wrapper
+        if not chunk_cache.is_active(events):
+            disk_cache.configure(self._cache_location, self._cache_budget)
 
         # check if sample is MC
         self.is_mc = hasattr(events, "genWeight")
@@ -72,10 +111,10 @@ class ZToLLProcessor(processor.ProcessorABC):
         # get number of events before selection
         nevents = len(events)
 
-        # create copies of histogram objects
-        hist_dict = copy.deepcopy(self.hist_dict)
-        # create copy of array dictionary
-        array_dict = copy.deepcopy(self.array_dict)
+        # build empty histograms
+        hist_dict = histograms.build_histograms(self.hist_specs)
+        # list of parquet files written by this chunk (array output)
+        manifest = []
         
         # dictionary to store output data and metadata
         output = {}
@@ -107,9 +146,7 @@ class ZToLLProcessor(processor.ProcessorABC):
         
         # correct muons
         corrected_muons = events.Muon 
-        muon_pt = apply_rochester_corrections(
-            corrected_muons, self.is_mc, self._year + self._yearmod
-        )
+        muon_pt = get_rochester_pt(events, self.is_mc, self._year + self._yearmod)
         corrected_muons["pt"] = muon_pt
         
         good_muons = select_good_muons(
@@ -141,7 +178,7 @@ class ZToLLProcessor(processor.ProcessorABC):
         # apply JEC/JER corrections to MC jets (propagate corrections to MET)
         # in data, the corrections are already applied
         if self.is_mc:
-            corrected_jets, met = jet_corrections(events, self._year + self._yearmod)
+            corrected_jets, met = get_jet_corrections(events, self._year + self._yearmod)
         else:
             corrected_jets, met = events.Jet, events.MET
             
@@ -171,19 +208,11 @@ class ZToLLProcessor(processor.ProcessorABC):
         # --------------------
         # event weights vector
         # --------------------
-        weights_container = Weights(len(events), storeIndividual=True)
+        # genweight, l1prefiring and pileup (shared with other analyses, see 'chunk_cache')
+        weights_container = get_common_weights(
+            events, self.is_mc, self._year, self._yearmod, self._weights_dtype
+        )
         if self.is_mc:
-            # add gen weigths
-            weights_container.add("genweight", events.genWeight)
-
-            # add l1prefiring weigths
-            add_l1prefiring_weight(events, weights_container, self._year, "nominal")
-
-            # add pileup weigths
-            add_pileup_weight(
-                events, weights_container, self._year, self._yearmod, "nominal"
-            )
-
             # add pujetid weigths
             add_pujetid_weight(
                 jets=corrected_jets,
@@ -244,6 +273,8 @@ class ZToLLProcessor(processor.ProcessorABC):
             
         # save sum of weights before selections
         output["metadata"].update({"sumw": ak.sum(weights_container.weight())})
+        # memory footprint of the weights container of each chunk
+        output["metadata"].update({"weights_nbytes": [weights_container.nbytes]})
         # save weights statistics
         output["metadata"].update({"weight_statistics": {}})
         for weight, statistics in weights_container.weightStatistics.items():
@@ -282,11 +313,8 @@ class ZToLLProcessor(processor.ProcessorABC):
         self.selections = PackedSelection()
 
         # add luminosity calibration mask (only to data)
-        with importlib.resources.path("wprime_plus_b.data", "lumi_masks.pkl") as path:
-            with open(path, "rb") as handle:
-                self._lumi_mask = pickle.load(handle)
         if not self.is_mc:
-            lumi_mask = self._lumi_mask[self._year](events.run, events.luminosityBlock)
+            lumi_mask = get_lumi_mask(self._year, events.run, events.luminosityBlock)
         else:
             lumi_mask = np.ones(len(events), dtype="bool")
         self.selections.add("lumi", lumi_mask)
@@ -354,14 +382,13 @@ class ZToLLProcessor(processor.ProcessorABC):
         # cutflow
         # --------------
         cut_names = regions[self._lepton_flavor]
-        output["metadata"].update({"cutflow": {}})
-        selections = []
-        for cut_name in cut_names:
-            selections.append(cut_name)
-            current_selection = self.selections.all(*selections)
-            output["metadata"]["cutflow"][cut_name] = ak.sum(
-                weights_container.weight()[current_selection]
-            )
+        cutflow = compute_cutflow(
+            pack_selection_bits(cut_names, selections=self.selections),
+            cut_names,
+            get_weight_variations(weights_container),
+        )
+        output["metadata"].update({"cutflow": cumulative_sumw(cutflow)})
+        output["metadata"].update({"cutflow_yields": cutflow})
 
         # ------------
         # event variables
@@ -392,8 +419,11 @@ class ZToLLProcessor(processor.ProcessorABC):
             # fill histograms or process arrays
             if self._output_type == "hist":
                 for feature in hist_dict:
-                    hist_args = {feature: normalize(self.features[feature]), "weight": region_weight}
-                    hist_dict[feature].fill(**hist_args)
+                    histograms.fill(
+                        hist_dict[feature],
+                        values={feature: normalize(self.features[feature])},
+                        weight=region_weight,
+                    )
                     #hist_dict[feature].fill(
                     #    feature=normalize(self.features[feature]),
                     #    weight=region_weight,
@@ -402,16 +432,21 @@ class ZToLLProcessor(processor.ProcessorABC):
             elif self._output_type == "array":
                 self.add_feature("weights", region_weight)
 
-                # select variables and put them in column accumulators
-                array_dict = {
-                    feature_name: processor.column_accumulator(normalize(feature_array))
-                    for feature_name, feature_array in self.features.items()
-                }
+                # write selected variables to parquet
+                manifest = write_parquet_partition(
+                    features={
+                        feature_name: normalize(feature_array)
+                        for feature_name, feature_array in self.features.items()
+                    },
+                    output_location=self._output_location,
+                    dataset=dataset,
+                    partition_key=get_partition_key(events),
+                )
         
         if self._output_type == "hist":
             output["histograms"] = hist_dict
         elif self._output_type == "array":
-            output["arrays"] = array_dict
+            output["manifest"] = manifest
 
         return {dataset: output}
 
@@ -0,0 +1,134 @@
+import os
+import time
+import tracemalloc
+from coffea.nanoevents import NanoEventsFactory, NanoAODSchema
+
+# per-chunk budgets for each condor job flavour. 'chunk_time' is the target
+# duration of a single chunk (seconds) and 'chunk_memory' the memory ceiling (MB)
+condor_flavor_budgets = {
+    "microcentury": {"chunk_time": 60, "chunk_memory": 1800},
+    "longlunch": {"chunk_time": 300, "chunk_memory": 1800},
+}
+
+
+def get_rss() -> float:
+    """return the current resident set size of the process in MB (linux only)"""
+    with open("/proc/self/statm") as handle:
+        resident_pages = int(handle.read().split()[1])
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / 1024**2
+
+
+def load_probe_events(
+    fname: str, dataset: str, entry_stop: int, treename: str = "Events"
+):
+    """read the first 'entry_stop' events of a file as a probe chunk"""
+    return NanoEventsFactory.from_root(
+        fname,
+        treename=treename,
+        entry_stop=entry_stop,
+        schemaclass=NanoAODSchema,
+        metadata={"dataset": dataset},
+    ).events()
+
+
+def probe_chunk(
+    processor_instance,
+    fname: str,
+    dataset: str,
+    probe_size: int = 10000,
+    treename: str = "Events",
+    warmup_size: int = 1000,
+) -> dict:
+    """
+    run a processor over a short probe chunk and measure its throughput and memory usage.
+    A first untimed run over a few events loads the correction payloads and compiles
+    the kernels, so the measurements only include the per-chunk work. The memory per
+    event is the peak of the memory allocated while processing the probe chunk
+
+    Parameters:
+    -----------
+        processor_instance:
+            coffea processor instance
+        fname:
+            path to the .root file used for the probe
+        dataset:
+            dataset name passed to the processor via the events metadata
+        probe_size:
+            number of events in the probe chunk
+        treename:
+            name of the events tree
+        warmup_size:
+            number of events of the untimed warm-up run
+    """
+    # warm-up run (correction registry, numba kernels)
+    processor_instance.process(load_probe_events(fname, dataset, warmup_size, treename))
+    # timed run
+    t0 = time.perf_counter()
+    events = load_probe_events(fname, dataset, probe_size, treename)
+    nevents = len(events)
+    processor_instance.process(events)
+    elapsed = time.perf_counter() - t0
+    # memory run. tracemalloc slows down the processor, so it is not timed
+    rss = get_rss()
+    tracemalloc.start()
+    try:
+        processor_instance.process(
+            load_probe_events(fname, dataset, probe_size, treename)
+        )
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "nevents": nevents,
+        "events_per_second": nevents / max(elapsed, 1e-6),
+        "memory_per_event": max(peak_memory / 1024**2, 1.0) / max(nevents, 1),
+        "rss": rss,
+    }
+
+
+def adaptive_chunksize(
+    processor_instance,
+    fname: str,
+    dataset: str,
+    chunk_time: float = 60,
+    chunk_memory: float = 1800,
+    probe_size: int = 10000,
+    min_chunksize: int = 10000,
+    max_chunksize: int = 500000,
+) -> int:
+    """
+    return the chunk size that keeps each chunk within a target duration and memory ceiling.
+    The events/s and memory per event are measured with a short probe chunk
+
+    Parameters:
+    -----------
+        processor_instance:
+            coffea processor instance
+        fname:
+            path to the .root file used for the probe
+        dataset:
+            dataset name passed to the processor via the events metadata
+        chunk_time:
+            target duration of a single chunk in seconds
+        chunk_memory:
+            memory ceiling of the process in MB
+        probe_size:
+            number of events in the probe chunk
+        min_chunksize:
+            lower bound of the chunk size
+        max_chunksize:
+            upper bound of the chunk size
+    """
+    probe = probe_chunk(processor_instance, fname, dataset, probe_size)
+    time_limited = chunk_time * probe["events_per_second"]
+    # the memory already in use by the process (with the payloads loaded) is not
+    # available to the chunk
+    memory_available = max(chunk_memory - probe["rss"], 0)
+    memory_limited = memory_available / probe["memory_per_event"]
+    chunksize = int(min(time_limited, memory_limited))
+    print(
+        f"probe: {probe['events_per_second']:.0f} events/s, "
+        f"{probe['memory_per_event'] * 1e3:.3f} kB/event, "
+        f"RSS {probe['rss']:.0f} MB -> chunksize {chunksize}"
+    )
+    return min(max(chunksize, min_chunksize), max_chunksize)
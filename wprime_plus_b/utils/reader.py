@@ -0,0 +1,109 @@
+import uproot
+from typing import Tuple
+from coffea.nanoevents import NanoEventsFactory, NanoAODSchema
+from coffea.nanoevents.mapping import SimplePreloadedColumnSource
+
+
+def read_columns(
+    fname: str,
+    columns: list,
+    entry_start: int = None,
+    entry_stop: int = None,
+    treename: str = "Events",
+) -> Tuple[dict, dict]:
+    """
+    read a whitelist of branches in bulk. The baskets of every branch are requested
+    together, so the file source can coalesce them into a few vector reads instead
+    of one request per branch. Branches missing in the file are skipped
+
+    Parameters:
+    -----------
+        fname:
+            path to the .root file
+        columns:
+            branch names to read (e.g. the 'columns' attribute of a processor)
+        entry_start:
+            first entry to read
+        entry_stop:
+            entry after the last one to read
+        treename:
+            name of the events tree
+
+    Returns:
+    --------
+        arrays and read metadata: number of entries, file uuid, bytes read, number of
+        requests, read and missing branches
+    """
+    with uproot.open(fname) as file:
+        tree = file[treename]
+        available = [column for column in columns if column in tree]
+        arrays = tree.arrays(
+            available,
+            entry_start=entry_start,
+            entry_stop=entry_stop,
+            how=dict,
+        )
+        metadata = {
+            "entries": len(arrays[available[0]]) if available else 0,
+            "uuid": str(file.file.uuid),
+            "bytesread": file.file.source.num_requested_bytes,
+            "requests": file.file.source.num_requests,
+            "columns": available,
+            "missing": sorted(set(columns) - set(available)),
+        }
+    return arrays, metadata
+
+
+def load_events(
+    fname: str,
+    columns: list,
+    dataset: str,
+    entry_start: int = None,
+    entry_stop: int = None,
+    treename: str = "Events",
+):
+    """
+    return NanoEvents built from a bulk read of a branch whitelist, plus the read
+    metadata (see 'read_columns'). Accessing a branch outside of the whitelist raises
+    a KeyError, so the whitelist can be checked by running the processor over them
+
+    Parameters:
+    -----------
+        fname:
+            path to the .root file
+        columns:
+            branch names to read (e.g. the 'columns' attribute of a processor)
+        dataset:
+            dataset name passed to the processor via the events metadata
+        entry_start:
+            first entry to read
+        entry_stop:
+            entry after the last one to read
+        treename:
+            name of the events tree
+    """
+    arrays, metadata = read_columns(
+        fname,
+        columns,
+        entry_start=entry_start,
+        entry_stop=entry_stop,
+        treename=treename,
+    )
+    source = SimplePreloadedColumnSource(
+        arrays,
+        metadata["uuid"],
+        metadata["entries"],
+        object_path=f"/{treename}",
+    )
+    events = NanoEventsFactory.from_preloaded(
+        source,
+        metadata={
+            "dataset": dataset,
+            "filename": fname,
+            "treename": treename,
+            "entrystart": entry_start,
+            "entrystop": entry_stop,
+        },
+        schemaclass=NanoAODSchema,
+    ).events()
+    return events, metadata